@@ -211,6 +211,12 @@ class PythonExtractionService
                 'amount' => $amount,
                 'sender_name' => $data['sender_name'] ?? null,
                 'account_number' => $data['account_number'] ?? null,
+                // Parsed in the same pass as the amount (no second DescriptionFieldExtractor scan needed)
+                'payer_account_number' => $data['payer_account_number'] ?? null,
+                'description_field' => $data['description_field'] ?? null,
+                'extracted_date' => $data['extracted_date'] ?? null,
+                'value_date' => $data['value_date'] ?? null,
+                'narration' => $data['narration'] ?? null,
                 'currency' => $data['currency'] ?? 'NGN',
                 'direction' => $data['direction'] ?? 'credit',
                 'email_subject' => $emailData['subject'] ?? '',
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the payment email extractor.
+Run from the python-extractor directory, e.g. `python -m benchmarks.bench_parsers`.
+"""
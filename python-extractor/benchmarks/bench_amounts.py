@@ -0,0 +1,119 @@
+"""
+Amount conversion: the old float(group.replace(',', '')) path versus
+extractor.amounts.
+
+The spans are the amount candidates the scanner collects from every corpus
+body (plus a set of well-formed and malformed edge cases), converted two
+ways:
+
+  float        float(body[start:end].replace(',', '')), what every strategy did
+  parse_minor  one parse_minor(body, start, end) call per candidate
+
+Also reports how many candidates the two paths disagree on: spans the float
+path accepted with misplaced commas, and amounts whose float value times 100
+is not the exact number of kobo.
+
+Usage:
+  python -m benchmarks.bench_amounts
+  python -m benchmarks.bench_amounts --repeat 200
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, List, Optional, Tuple
+
+from extractor.amounts import parse_minor
+from extractor.scanner import AMOUNT_GROUPS, AMOUNT_TIERS, amount_tier_matches, lowercased
+
+from benchmarks.corpus import build_corpus
+
+EDGE_CASES = [
+    "NGN 1,000.00", "NGN 5,000, credited", "NGN 1,2,,3", "NGN 12,345,678.905", "NGN 5,0000",
+    "NGN 0.29", "NGN 1234567.1", "NGN ,,", "NGN 100,000.", "NGN 19,999,999.99",
+]
+
+Spans = List[Tuple[str, List[Tuple[int, int]]]]
+
+
+def candidate_spans(bodies: List[str]) -> Spans:
+    """(body, amount spans) for every body, as scanner.scan finds them."""
+    result = []
+    for body in bodies:
+        text = lowercased(body)
+        spans = sorted(
+            match.span(AMOUNT_GROUPS[tier][0]) for tier in AMOUNT_TIERS for match in amount_tier_matches(text, tier)
+        )
+        result.append((body, spans))
+    return result
+
+
+def float_path(body: str, spans: List[Tuple[int, int]]) -> List[Optional[float]]:
+    amounts = []
+    for start, end in spans:
+        try:
+            amounts.append(float(body[start:end].replace(',', '')))
+        except ValueError:
+            amounts.append(None)
+    return amounts
+
+
+def single_path(body: str, spans: List[Tuple[int, int]]) -> List[Optional[int]]:
+    return [parse_minor(body, start, end) for start, end in spans]
+
+
+PATHS: List[Tuple[str, Callable]] = [
+    ("float", float_path),
+    ("parse_minor", single_path),
+]
+
+
+def time_path(convert: Callable, corpus: Spans, repeat: int) -> List[float]:
+    """Nanoseconds per candidate, one sample per repeat."""
+    count = sum(len(spans) for _, spans in corpus)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for body, spans in corpus:
+            convert(body, spans)
+        samples.append((time.perf_counter_ns() - started) / count)
+    return samples
+
+
+def disagreements(corpus: Spans) -> Tuple[int, int]:
+    """(candidates only the float path accepted, candidates whose float is not exact in kobo)."""
+    rejected = inexact = 0
+    for body, spans in corpus:
+        for value, minor in zip(float_path(body, spans), single_path(body, spans)):
+            if value is not None and minor is None:
+                rejected += 1
+            elif value is not None and value * 100 != minor:
+                inexact += 1
+    return rejected, inexact
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    bodies = []
+    for entry in build_corpus(seed=args.seed):
+        bodies.extend(body for body in (entry["request"]["html_body"], entry["request"]["text_body"]) if body)
+    corpus = candidate_spans(bodies + EDGE_CASES)
+    count = sum(len(spans) for _, spans in corpus)
+    print(f"{count} amount candidates in {len(corpus)} bodies\n")
+
+    print(f"{'path':<14} {'median ns':>10} {'min ns':>10}")
+    for name, convert in PATHS:
+        samples = time_path(convert, corpus, args.repeat)
+        print(f"{name:<14} {statistics.median(samples):>10.0f} {min(samples):>10.0f}")
+
+    rejected, inexact = disagreements(corpus)
+    print(f"\nMalformed spans the float path accepted: {rejected}")
+    print(f"Float amounts not exact in minor units:  {inexact}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,122 @@
+"""
+Per-request cost of full versus lean /extract responses.
+
+For every corpus email the work around one extraction is timed in stages, in
+one process:
+
+  cascade  run_extraction (diagnostics, pydantic models, model_dump) versus
+           run_extraction_lean (plain dicts)
+  ipc      pickling the (response, outcome) pair to and from a pool worker
+  render   response_model validation plus stdlib JSON (what FastAPI does for
+           full responses) versus extractor.fastjson (orjson when installed)
+
+--http also times whole requests through the ASGI app (result cache off).
+
+Usage:
+  python -m benchmarks.bench_lean
+  python -m benchmarks.bench_lean --repeat 20 --http
+"""
+
+import argparse
+import json
+import os
+import pickle
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+# Every request must run the cascade, not come from the result cache
+os.environ.setdefault("EXTRACTOR_CACHE_SIZE", "0")
+
+import main
+from extractor import fastjson
+from pydantic import TypeAdapter
+
+from benchmarks.corpus import build_corpus
+
+RESPONSE_ADAPTER = TypeAdapter(main.ExtractionResponse)
+
+
+def render_full(response: Dict[str, Any]) -> bytes:
+    """Serialize like FastAPI does for a response_model endpoint (pydantic v2)."""
+    response = main.with_cache_status(response, "miss")
+    content = RESPONSE_ADAPTER.dump_python(RESPONSE_ADAPTER.validate_python(response), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def full_cascade(request: Dict[str, Any]) -> Dict[str, Any]:
+    return main.run_extraction(main.ExtractionRequest(**request), {}).model_dump()
+
+
+def lean_cascade(request: Dict[str, Any]) -> Dict[str, Any]:
+    return main.run_extraction_lean(main.ExtractionRequest.model_construct(**request), {})
+
+
+MODES: Dict[str, Dict[str, Callable]] = {
+    "full": {"cascade": full_cascade, "render": render_full},
+    "lean": {"cascade": lean_cascade, "render": fastjson.dumps},
+}
+
+
+def time_stages(mode: Dict[str, Callable], corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, List[float]]:
+    """Milliseconds per stage (and in total) for every email and repeat."""
+    timings: Dict[str, List[float]] = {"cascade": [], "ipc": [], "render": [], "total": []}
+    for entry in corpus:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = mode["cascade"](entry["request"])
+            cascaded = time.perf_counter()
+            response = pickle.loads(pickle.dumps((response, {})))[0]
+            transferred = time.perf_counter()
+            body = mode["render"](response)
+            rendered = time.perf_counter()
+            assert body
+            timings["cascade"].append((cascaded - started) * 1000)
+            timings["ipc"].append((transferred - cascaded) * 1000)
+            timings["render"].append((rendered - transferred) * 1000)
+            timings["total"].append((rendered - started) * 1000)
+    return timings
+
+
+def time_http(corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, List[float]]:
+    """Milliseconds per whole /extract request, full and lean."""
+    from fastapi.testclient import TestClient
+
+    timings: Dict[str, List[float]] = {"full": [], "lean": []}
+    with TestClient(main.app) as client:
+        for entry in corpus:
+            for mode, url in (("full", "/extract"), ("lean", "/extract?lean=true")):
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    client.post(url, json=entry["request"]).raise_for_status()
+                    timings[mode].append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--sizes", default="2,30", help="Body sizes in KB")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per email and mode")
+    parser.add_argument("--http", action="store_true", help="Also time whole requests through the app")
+    args = parser.parse_args()
+
+    corpus = build_corpus(seed=args.seed, sizes_kb=[int(size) for size in args.sizes.split(",")])
+    print(f"{len(corpus)} emails x {args.repeat} runs, lean JSON encoder: {fastjson.BACKEND}\n")
+
+    results = {name: time_stages(mode, corpus, args.repeat) for name, mode in MODES.items()}
+    print(f"{'stage':<10} {'full p50 ms':>12} {'lean p50 ms':>12} {'saved ms':>10}")
+    for stage in ("cascade", "ipc", "render", "total"):
+        full = statistics.median(results["full"][stage])
+        lean = statistics.median(results["lean"][stage])
+        print(f"{stage:<10} {full:>12.4f} {lean:>12.4f} {full - lean:>10.4f}")
+
+    if args.http:
+        http = time_http(corpus, args.repeat)
+        full = statistics.median(http["full"])
+        lean = statistics.median(http["lean"])
+        print(f"\n{'http':<10} {full:>12.4f} {lean:>12.4f} {full - lean:>10.4f}")
+
+
+if __name__ == "__main__":
+    main_cli()
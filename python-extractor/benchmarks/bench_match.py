@@ -0,0 +1,83 @@
+"""
+/match lookup cost as the number of pending payments grows.
+
+For each snapshot size the index lookup (extractor.matching.PaymentIndex) is
+timed against a linear scan that scores every pending payment, like the PHP
+loop over candidate payments does. With the index the cost should follow the
+number of payments within the amount tolerance, not the snapshot size.
+
+Usage:
+  python -m benchmarks.bench_match
+  python -m benchmarks.bench_match --sizes 1000,10000,100000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from extractor.matching import AMOUNT_TOLERANCE, PaymentIndex, normalize_name, similar_text
+
+from benchmarks.corpus import FIRST_NAMES, LAST_NAMES
+
+
+def build_payments(count: int, rnd: random.Random) -> List[Dict[str, Any]]:
+    """Pending payments with amounts spread like checkout totals (100 to 500,000 Naira)."""
+    return [
+        {
+            "id": i,
+            "amount": round(10 ** rnd.uniform(2, 5.7), 2),
+            "payer_name": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+        }
+        for i in range(count)
+    ]
+
+
+def linear_match(payments: List[Dict[str, Any]], amount: float, sender_name: str) -> int:
+    """Score every payment; returns how many were within tolerance."""
+    name = normalize_name(sender_name)
+    window = max(amount * AMOUNT_TOLERANCE, 1.0)
+    hits = 0
+    for payment in payments:
+        similar_text(normalize_name(payment["payer_name"]), name)
+        if abs(payment["amount"] - amount) <= window:
+            hits += 1
+    return hits
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Pending payments per snapshot")
+    parser.add_argument("--queries", type=int, default=100, help="Lookups timed per size")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    print(f"{'pending':>8} {'index ms':>10} {'scored':>7} {'linear ms':>10} {'speedup':>8}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        rnd = random.Random(args.seed)
+        payments = build_payments(size, rnd)
+        index = PaymentIndex()
+        index.replace(payments)
+        queries = [(p["amount"], p["payer_name"].upper()) for p in rnd.sample(payments, min(args.queries, size))]
+
+        index_ms, scored = [], []
+        for amount, name in queries:
+            started = time.perf_counter()
+            result = index.match(amount=amount, sender_name=name)
+            index_ms.append((time.perf_counter() - started) * 1000)
+            scored.append(result["considered"])
+
+        # The linear scan is slow on large snapshots; a few lookups are enough
+        linear_ms = []
+        for amount, name in queries[:max(1, 200000 // size)]:
+            started = time.perf_counter()
+            linear_match(payments, amount, name)
+            linear_ms.append((time.perf_counter() - started) * 1000)
+
+        index_p50, linear_p50 = statistics.median(index_ms), statistics.median(linear_ms)
+        print(f"{size:>8} {index_p50:>10.3f} {statistics.median(scored):>7.0f} {linear_p50:>10.3f} {linear_p50 / index_p50:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
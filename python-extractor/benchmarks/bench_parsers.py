@@ -0,0 +1,56 @@
+"""
+Compare HTML parser backends on bank-alert sized HTML bodies.
+
+Usage: python -m benchmarks.bench_parsers [--sizes 30,50,80] [--repeat 20]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from extractor.document import BACKENDS, ParsedDocument, backend_available
+
+from benchmarks.corpus import gtbank_table
+
+
+def build_html(size_kb: int) -> str:
+    """GTBank-style alert padded with newsletter markup to roughly size_kb kilobytes."""
+    return gtbank_table(random.Random(size_kb), size_kb)["html_body"]
+
+
+def time_backend(backend: str, html: str, repeat: int) -> list:
+    """Time parse + cell walk + text rendering for one backend, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        document = ParsedDocument(html, backend)
+        document.cells()
+        document.text()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="30,50,80", help="Comma-separated body sizes in KB")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per backend and size")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = [backend for backend in BACKENDS if backend_available(backend)]
+    skipped = [backend for backend in BACKENDS if backend not in backends]
+
+    print(f"{'backend':<12} {'size':>6} {'median ms':>10} {'min ms':>8} {'cells':>6}")
+    for size in sizes:
+        html = build_html(size)
+        for backend in backends:
+            timings = time_backend(backend, html, args.repeat)
+            cells = len(list(ParsedDocument(html, backend).cells()))
+            print(f"{backend:<12} {str(size) + 'KB':>6} {statistics.median(timings):>10.2f} {min(timings):>8.2f} {cells:>6}")
+    if skipped:
+        print(f"Skipped (not installed): {', '.join(skipped)}")
+
+
+if __name__ == "__main__":
+    main()
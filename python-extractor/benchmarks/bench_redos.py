@@ -0,0 +1,159 @@
+"""
+Adversarial-input fuzz benchmark for every registered extractor regex.
+
+Each pattern in extractor.patterns.REGISTRY (plus every bank template pattern)
+is run over inputs built to trigger backtracking: long uppercase runs after
+"from", digit runs without a currency, whitespace floods after labels, unclosed
+<td> tags, and so on, each at two sizes. The report lists the worst-case
+latency per pattern, the input that caused it and the growth exponent between
+the two sizes (about 1 for linear, 2 for quadratic).
+
+Usage:
+  python -m benchmarks.bench_redos                  # report
+  python -m benchmarks.bench_redos --sizes 2,20     # input sizes in KB
+  python -m benchmarks.bench_redos --max-ms 50      # exit 1 when any pattern is slower
+  EXTRACTOR_REGEX_ENGINE=re2 python -m benchmarks.bench_redos
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import extract_simple
+import main
+import extractor.stream  # noqa: F401  (registers its patterns)
+from extractor import core
+from extractor.patterns import ENGINES, REGISTRY, RegexBudgetExceeded, regex_budget
+
+# name -> builder of an adversarial string of roughly n characters
+FAMILIES: Dict[str, Callable[[int], str]] = {
+    "from_uppercase_run": lambda n: "from " + "AB " * (n // 3),
+    "from_repeated": lambda n: "from " * (n // 5),
+    "description_whitespace": lambda n: "description:" + " " * n + "x",
+    "description_code_run": lambda n: "description: " + "1- " * (n // 3),
+    "code_dash_run": lambda n: "1-" * (n // 2),
+    "code_name_run": lambda n: "123 - " + "A " * (n // 2),
+    "digit_run": lambda n: "1" * n,
+    "comma_digit_run": lambda n: "1," * (n // 2),
+    "currency_digit_run": lambda n: "ngn " + "1," * (n // 2),
+    "keyword_run": lambda n: "amount " * (n // 7),
+    "label_whitespace": lambda n: "amount" + " " * n + "x",
+    "field_label_run": lambda n: "description account value date " * (n // 31),
+    "field_cell_gap": lambda n: "account number</td>" + " " * n + "<td>1",
+    "unclosed_td": lambda n: "<td" * (n // 3),
+    "unclosed_td_attr": lambda n: "<td " + "a" * n,
+    "td_label_whitespace": lambda n: "<td>amount" + " " * n,
+    "unclosed_style": lambda n: "<style>" * (n // 7),
+    "unclosed_script": lambda n: "<script>" + "x" * n,
+    "data_uri_run": lambda n: '="data:' * (n // 7),
+    "tag_soup": lambda n: "<" * n,
+    "whitespace": lambda n: " \t\n" * (n // 3),
+    "number_word_run": lambda n: "one " * (n // 4),
+    "number_word_and_run": lambda n: "hundred and " * (n // 12) + "naira",
+    "number_words_terminated": lambda n: "twenty five naira only " * (n // 23),
+    "dollar_run": lambda n: "$" * n,
+}
+
+
+def mutated_corpus(n: int, seed: int) -> Dict[str, str]:
+    """Corpus emails with an adversarial block spliced in at a random position."""
+    from benchmarks.corpus import build_corpus
+
+    rnd = random.Random(seed)
+    inputs = {}
+    for entry in build_corpus(seed=seed, sizes_kb=[max(1, n // 1024)]):
+        body = entry["request"]["html_body"] or entry["request"]["text_body"]
+        family = rnd.choice(sorted(FAMILIES))
+        # random() draws the same bits at every size, so both sizes get the same families
+        position = int(rnd.random() * (len(body) + 1))
+        inputs[f"{entry['kind']}+{family}"] = body[:position] + FAMILIES[family](n) + body[position:]
+    return inputs
+
+
+def template_patterns() -> Dict[str, object]:
+    patterns = {}
+    for template in set(core.bank_templates._by_domain.values()):
+        for i, pattern in enumerate(template.amount_patterns):
+            patterns[f"template:{template.name}:amount{i}"] = pattern.regex
+        for i, regex in enumerate(template.name_patterns):
+            patterns[f"template:{template.name}:name{i}"] = regex
+    return patterns
+
+
+def time_call(call: Callable[[], object], cap_ms: float) -> float:
+    """Milliseconds for one call; cap_ms when the call had to be interrupted (0 = no cap)."""
+    start = time.perf_counter()
+    try:
+        with regex_budget(cap_ms):
+            call()
+    except RegexBudgetExceeded:
+        return cap_ms
+    return (time.perf_counter() - start) * 1000
+
+
+def growth(small_ms: float, large_ms: float, ratio: float) -> float:
+    if small_ms <= 0.01 or large_ms <= 0:
+        return 0.0
+    return math.log(large_ms / small_ms) / math.log(ratio)
+
+
+def run(sizes: List[int], cap_ms: float, seed: int) -> List[Tuple[str, str, float, str, float]]:
+    """(pattern, engine, worst ms, worst input, growth exponent) per pattern, slowest first."""
+    inputs = {size: {name: build(size * 1024) for name, build in FAMILIES.items()} for size in sizes}
+    for size in sizes:
+        inputs[size].update(mutated_corpus(size * 1024, seed))
+
+    # name -> (engine, target, cap in ms)
+    targets: Dict[str, Tuple[str, Callable[[str], object], float]] = {}
+    for name, pattern in {**REGISTRY, **template_patterns()}.items():
+        engine = ENGINES.get(name, "template")
+        targets[name] = (engine, lambda body, pattern=pattern: sum(1 for _ in pattern.finditer(body)), cap_ms)
+    # End to end, uncapped here so the configured per-request budget is what stops them
+    targets["e2e_main"] = ("-", lambda body: main.run_extraction(
+        main.ExtractionRequest(email_id=1, subject="", from_email="fuzz@example.com", html_body=body, text_body=body)), 0)
+    targets["e2e_simple"] = ("-", lambda body: extract_simple.extract({"html_body": body, "text_body": body}), 0)
+
+    rows = []
+    small, large = sizes[0], sizes[-1]
+    for name, (engine, target, cap) in targets.items():
+        worst = (0.0, "", 0.0)
+        for family in inputs[large]:
+            timings = {}
+            for size in (small, large):
+                timings[size] = time_call(lambda: target(inputs[size][family]), cap)
+            if timings[large] >= worst[0]:
+                worst = (timings[large], family, growth(timings[small], timings[large], large / small))
+        rows.append((name, engine, worst[0], worst[1], worst[2]))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4,40", help="Small and large input sizes in KB")
+    parser.add_argument("--cap-ms", type=float, default=5000, help="Interrupt a single run after this long")
+    parser.add_argument("--max-ms", type=float, default=0, help="Exit 1 when any pattern's worst case is slower")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rows = run(sizes, args.cap_ms, args.seed)
+
+    print(f"{'pattern':<36} {'engine':>8} {'worst ms':>10} {'growth':>7}  worst input ({sizes[-1]} KB)")
+    for name, engine, worst_ms, family, exponent in rows:
+        capped = ">" if worst_ms >= args.cap_ms else " "
+        print(f"{name:<36} {engine:>8} {capped}{worst_ms:>9.2f} {exponent:>7.2f}  {family}")
+
+    if args.max_ms:
+        slow = [row for row in rows if row[2] > args.max_ms and not row[0].startswith("e2e_")]
+        if slow:
+            print(f"\n{len(slow)} pattern(s) slower than {args.max_ms} ms", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,126 @@
+"""
+extractor.scanner against the per-pattern regexes it replaced.
+
+The baseline is what main.py did before the scanner existed, pattern for
+pattern: the amount patterns of extract_from_html_text / extract_from_text_body
+run with re.finditer (re.IGNORECASE) until the first amount of 10 or more, then
+the sender-name patterns with re.search. The scan side asks a fresh scan() of
+the body for the same two things:
+
+  baseline  the old amount + sender-name searches on the body
+  scan      scan(body).best_amount(), then first_name() tier by tier
+
+When the amount and name sit in the first line of a body, the baseline's first
+re.search returns within microseconds, under scan's fixed setup (lowercasing
+the body, the first str.find of each keyword). --check therefore allows scan
+--slack-ms more per body and fails on anything beyond that.
+
+Usage:
+  python -m benchmarks.bench_scanner
+  python -m benchmarks.bench_scanner --sizes 4,32,256 --repeat 10
+  python -m benchmarks.bench_scanner --check      # exit 1 when scan is slower on any body (beyond --slack-ms)
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from extractor.scanner import NAME_TIER_CELL, NAME_TIER_FROM, scan
+
+from benchmarks.corpus import build_corpus
+
+# Verbatim from main.py before extractor.scanner
+_AMOUNT_PATTERNS = [
+    r'(?:amount|sum|value|total|paid|payment|deposit|transfer|credit)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
+    r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
+]
+BASELINE_AMOUNT = {
+    "html_body": _AMOUNT_PATTERNS + [r'([\d,]+\.?\d*)\s*(?:naira|ngn)'],
+    "text_body": _AMOUNT_PATTERNS + [r'([\d,]+\.?\d*)\s*(?:naira|ngn|usd|dollar)'],
+}
+BASELINE_NAME = {
+    "html_body": [
+        r'<td[^>]*>[\s]*(?:description|remarks)[\s:]*</td>\s*<td[^>]*>[\s]*from\s+([A-Z][A-Z\s]+?)\s+to',
+        r'from\s+([A-Z][A-Z\s]+?)\s+to',
+    ],
+    "text_body": [r'from\s+([A-Z][A-Z\s]+?)\s+to'],
+}
+SUFFIX_CURRENCIES = {"html_body": ("naira", "ngn"), "text_body": ("naira", "ngn", "usd", "dollar")}
+NAME_TIERS = {"html_body": (NAME_TIER_CELL, NAME_TIER_FROM), "text_body": (NAME_TIER_FROM,)}
+
+
+def baseline(body: str, part: str) -> None:
+    """The old first-hit amount search, then the sender-name search."""
+    for pattern in BASELINE_AMOUNT[part]:
+        found = False
+        for match in re.finditer(pattern, body, re.IGNORECASE):
+            try:
+                if float(match.group(1).replace(',', '')) >= 10:
+                    found = True
+                    break
+            except ValueError:
+                continue
+        if found:
+            break
+    for pattern in BASELINE_NAME[part]:
+        if re.search(pattern, body, re.IGNORECASE):
+            break
+
+
+def scanned(body: str, part: str) -> None:
+    """The same amount and sender-name lookups through the scanner."""
+    result = scan(body)
+    result.best_amount(suffix_currencies=SUFFIX_CURRENCIES[part])
+    for tier in NAME_TIERS[part]:
+        if result.first_name(tier):
+            break
+
+
+def time_ms(target: Callable[[], object], repeat: int) -> float:
+    """Median milliseconds of `repeat` calls."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        target()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4,32,256", help="Comma-separated body sizes in KB")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="Exit 1 when scan is slower than the baseline on any body")
+    parser.add_argument("--slack-ms", type=float, default=0.1, help="Per-body time scan may exceed the baseline by under --check")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rows: List[Tuple[str, str, int, float, float]] = []
+    for entry in build_corpus(seed=args.seed, sizes_kb=sizes):
+        for part in ("html_body", "text_body"):
+            body = entry["request"][part]
+            if not body:
+                continue
+            rows.append((
+                entry["kind"],
+                part,
+                len(body) // 1024,
+                time_ms(lambda: baseline(body, part), args.repeat),
+                time_ms(lambda: scanned(body, part), args.repeat),
+            ))
+
+    print(f"{'kind':<18} {'part':<10} {'KB':>4} {'baseline ms':>12} {'scan ms':>9} {'speedup':>8}")
+    for kind, part, size, old_ms, new_ms in rows:
+        print(f"{kind:<18} {part:<10} {size:>4} {old_ms:>12.2f} {new_ms:>9.2f} {old_ms / max(new_ms, 1e-6):>7.1f}x")
+    slower = [row for row in rows if row[4] > row[3] + args.slack_ms]
+    if slower:
+        print(f"\nscan is over {args.slack_ms:g} ms slower than the baseline on {len(slower)} bod{'y' if len(slower) == 1 else 'ies'}")
+    return 1 if args.check and slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,147 @@
+"""
+Cold-start cost of the two entry points.
+
+Script mode (extract_simple.py) is started once per email by PHP, so its import
+time is paid on every extraction. Each entry point is imported in a fresh
+interpreter under `python -X importtime`; the interpreter's own startup (site)
+is left out. The one-shot script is also timed end to end, next to a bare
+interpreter, with one corpus email on stdin.
+
+Exits 1 when a median is over its budget, or when script mode imports a
+module that only the API needs (FastAPI, pydantic, BeautifulSoup...).
+
+Usage:
+  python -m benchmarks.bench_startup
+  python -m benchmarks.bench_startup --repeat 10 --top 15
+  python -m benchmarks.bench_startup --simple-import-ms 60 --oneshot-ms 120
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.corpus import build_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds, generous enough for a loaded CI machine
+BUDGETS = {
+    "simple_import": 100.0,
+    "main_import": 2000.0,
+    "oneshot_overhead": 150.0,
+}
+
+# Must never be imported by script mode (shared hosting has none of them)
+API_ONLY_MODULES = ("fastapi", "pydantic", "starlette", "bs4", "lxml", "selectolax", "orjson", "yaml")
+
+
+def run_python(args: List[str], stdin: bytes = b"") -> Tuple[float, bytes]:
+    """(wall milliseconds, stderr) of one fresh interpreter run from the python-extractor directory."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable] + args, input=stdin, cwd=ROOT, env=env, capture_output=True, check=True)
+    return (time.perf_counter() - started) * 1000, completed.stderr
+
+
+def import_profile(module: str) -> Dict[str, Tuple[float, float]]:
+    """module -> (self ms, cumulative ms) for everything `import module` loads, site excluded."""
+    _, stderr = run_python(["-X", "importtime", "-c", f"import {module}"])
+    profile: Dict[str, Tuple[float, float]] = {}
+    after_site = False
+    for line in stderr.decode("utf-8", "replace").splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        if name.strip() == "site" and not name.startswith("  "):
+            after_site = True
+            continue
+        if after_site:
+            profile[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return profile
+
+
+def median_import_ms(module: str, repeat: int) -> Tuple[float, Dict[str, Tuple[float, float]]]:
+    """Median cumulative import time of a module, and the profile of the last run."""
+    timings = []
+    for _ in range(repeat):
+        profile = import_profile(module)
+        timings.append(profile[module][1])
+    return statistics.median(timings), profile
+
+
+def modules_after_extraction(request: bytes) -> List[str]:
+    """Top-level packages loaded once script mode has extracted one email (lazy imports included)."""
+    code = (
+        "import json, sys, extract_simple; extract_simple.extract(json.loads(sys.stdin.read())); "
+        "sys.stderr.write(' '.join(sys.modules))"
+    )
+    _, stderr = run_python(["-c", code], request)
+    return sorted({name.split(".")[0] for name in stderr.decode("utf-8", "replace").split()})
+
+
+def oneshot_ms(request: bytes, repeat: int) -> Tuple[float, float]:
+    """Median wall time of a bare interpreter and of one extract_simple.py run."""
+    bare = [run_python(["-c", "pass"])[0] for _ in range(repeat)]
+    script = [run_python([os.path.join(ROOT, "extract_simple.py")], request)[0] for _ in range(repeat)]
+    return statistics.median(bare), statistics.median(script)
+
+
+def print_top(title: str, profile: Dict[str, Tuple[float, float]], top: int) -> None:
+    print(f"\n{title}: slowest modules by self time")
+    rows = sorted(profile.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for name, (self_ms, cumulative_ms) in rows:
+        print(f"  {name:<40} {self_ms:>8.2f} ms self {cumulative_ms:>9.2f} ms cumulative")
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="Modules listed per entry point")
+    parser.add_argument("--simple-import-ms", type=float, default=BUDGETS["simple_import"])
+    parser.add_argument("--main-import-ms", type=float, default=BUDGETS["main_import"])
+    parser.add_argument("--oneshot-ms", type=float, default=BUDGETS["oneshot_overhead"],
+                        help="Budget for a one-shot run beyond bare interpreter startup")
+    parser.add_argument("--skip-main", action="store_true", help="Only measure script mode (no FastAPI needed)")
+    args = parser.parse_args()
+
+    request = json.dumps(build_corpus(seed=1234, sizes_kb=[4])[0]["request"]).encode("utf-8")
+    checks = []
+
+    simple_ms, simple_profile = median_import_ms("extract_simple", args.repeat)
+    checks.append(("import extract_simple", simple_ms, args.simple_import_ms))
+    bare_ms, script_ms = oneshot_ms(request, args.repeat)
+    checks.append(("one-shot extract_simple.py", script_ms - bare_ms, args.oneshot_ms))
+    if not args.skip_main:
+        main_ms, main_profile = median_import_ms("main", args.repeat)
+        checks.append(("import main", main_ms, args.main_import_ms))
+
+    print(f"{'measurement (median of ' + str(args.repeat) + ')':<32} {'ms':>9} {'budget':>9}")
+    for name, value, budget in checks:
+        print(f"{name:<32} {value:>9.2f} {budget:>9.0f}{'  OVER' if value > budget else ''}")
+    print(f"{'(bare interpreter)':<32} {bare_ms:>9.2f}")
+
+    print_top("import extract_simple", simple_profile, args.top)
+    if not args.skip_main:
+        print_top("import main", main_profile, args.top)
+
+    failed = False
+    leaked = [name for name in modules_after_extraction(request) if name in API_ONLY_MODULES]
+    if leaked:
+        print(f"\nscript mode imports API-only module(s): {', '.join(leaked)}", file=sys.stderr)
+        failed = True
+    over = [name for name, value, budget in checks if value > budget]
+    if over:
+        print(f"\n{len(over)} measurement(s) over budget: {', '.join(over)}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,190 @@
+"""
+Deterministic synthetic corpus of bank emails for the benchmarks.
+
+Every email is generated from a seeded random.Random, so the same seed and
+sizes always produce byte-identical requests.
+"""
+
+import random
+from typing import Any, Dict, List, Sequence
+
+FIRST_NAMES = ["JOHN", "ADEWALE", "CHIOMA", "IBRAHIM", "NGOZI", "OLUWASEUN", "FATIMA", "EMEKA", "AISHA", "TUNDE"]
+LAST_NAMES = ["DOE", "OKAFOR", "BELLO", "ADEYEMI", "EZE", "MUSA", "OGUNDIPE", "NWOSU", "ABUBAKAR", "ADEBAYO"]
+
+KINDS = ("gtbank_table", "access_table", "quoted_printable", "newsletter", "no_amount", "inline_images")
+DEFAULT_SIZES_KB = (4, 32, 256)
+
+NEWSLETTER_BLOCK = """
+<table width="600" align="center" style="border:0;background:#f4f4f4">
+  <tr>
+    <td style="padding:12px;color:#333333;font-size:13px;line-height:18px">
+      <p>Protect your account: never share your PIN, password or OTP with anyone.
+      Our staff will never ask for your card details by phone or email.</p>
+      <a href="https://www.example-bank.com/security" style="color:#dd4f05">Learn more</a>
+    </td>
+    <td style="padding:12px"><img src="https://www.example-bank.com/img/banner.png" width="200" alt=""></td>
+  </tr>
+</table>
+"""
+
+
+def _name(rnd: random.Random) -> str:
+    return f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+
+
+def _amount(rnd: random.Random) -> str:
+    return f"{rnd.randint(1000, 2500000):,}.{rnd.randint(0, 99):02d}"
+
+
+def _account(rnd: random.Random) -> str:
+    return "".join(str(rnd.randint(0, 9)) for _ in range(10))
+
+
+def _pad_html(head: str, body: str, size_kb: int, rnd: random.Random) -> str:
+    """Surround body with newsletter blocks until the document is about size_kb kilobytes."""
+    target = size_kb * 1024
+    before = []
+    after = []
+    length = len(head) + len(body)
+    while length < target:
+        block = NEWSLETTER_BLOCK.replace("banner.png", f"banner{rnd.randint(1, 999)}.png")
+        (before if rnd.random() < 0.3 else after).append(block)
+        length += len(block)
+    return f"<html><head>{head}</head><body>{''.join(before)}{body}{''.join(after)}</body></html>"
+
+
+def _pad_text(text: str, size_kb: int) -> str:
+    footer = "\nThank you for banking with us. This is an automated message, please do not reply.\n"
+    repeats = max(0, (size_kb * 1024 - len(text)) // len(footer))
+    return text + footer * repeats
+
+
+def gtbank_table(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """GTBank-style alert: label/value table rows, amount in its own cell."""
+    name = _name(rnd)
+    amount = _amount(rnd)
+    table = f"""
+<table width="100%" cellpadding="4" style="font-family:Arial;font-size:12px">
+  <tr><td style="font-weight:bold">Account Number</td><td>{_account(rnd)}</td></tr>
+  <tr><td style="font-weight:bold">Transaction Location</td><td>205</td></tr>
+  <tr><td style="font-weight:bold">Description</td><td>FROM {name} TO CHECKOUT NOW</td></tr>
+  <tr><td style="font-weight:bold">Amount</td><td>NGN {amount}</td></tr>
+  <tr><td style="font-weight:bold">Value Date</td><td>2024-01-{rnd.randint(1, 28):02d}</td></tr>
+</table>
+"""
+    return {
+        "subject": "GeNS Transaction Alert [Credit: NGN " + amount + "]",
+        "from_email": "GeNS@gtbank.com",
+        "text_body": "",
+        "html_body": _pad_html("<style>td{font-family:Arial}</style>", table, size_kb, rnd),
+    }
+
+
+def access_table(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """Access-style alert: "Amount: NGN x" inside single cells, name in remarks."""
+    name = _name(rnd)
+    amount = _amount(rnd)
+    table = f"""
+<table cellspacing="0" style="width:100%">
+  <tr><td>Credit Alert</td></tr>
+  <tr><td>Account: {_account(rnd)[:3]}****{_account(rnd)[:3]}</td></tr>
+  <tr><td>Amount: NGN {amount}</td></tr>
+  <tr><td>Remarks: TRANSFER FROM {name} TO CHECKOUT</td></tr>
+  <tr><td>Balance: NGN {_amount(rnd)}</td></tr>
+</table>
+"""
+    text = f"Credit Alert\nAmount: NGN {amount}\nRemarks: TRANSFER FROM {name} TO CHECKOUT\n"
+    return {
+        "subject": "Access Bank Credit Alert",
+        "from_email": "alerts@accessbank.com",
+        "text_body": _pad_text(text, max(1, size_kb // 8)),
+        "html_body": _pad_html("", table, size_kb, rnd),
+    }
+
+
+def quoted_printable(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """Plain-text alert with quoted-printable leftovers (=20, soft line breaks)."""
+    name = _name(rnd)
+    amount = _amount(rnd)
+    code = rnd.randint(100000000, 999999999)
+    text = (
+        f"Dear Customer,=20\n\nYour account has been credited.=20\n"
+        f"Description :=20{code}-{name} TRF FOR CHECKOUT=\nNOW\n"
+        f"Amount :=20NGN {amount}\n"
+        f"Value Date :=202024-01-{rnd.randint(1, 28):02d}\n"
+    )
+    return {
+        "subject": "Transaction Notification",
+        "from_email": "noreply@bank.example.ng",
+        "text_body": _pad_text(text, size_kb),
+        "html_body": "",
+    }
+
+
+def newsletter(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """Large marketing-style HTML with the amount buried in a paragraph near the end."""
+    name = _name(rnd)
+    amount = _amount(rnd)
+    body = "".join(NEWSLETTER_BLOCK for _ in range(max(1, size_kb * 1024 // len(NEWSLETTER_BLOCK))))
+    body += f"<p>You received a transfer of NGN {amount} from {name} to your wallet.</p>"
+    return {
+        "subject": "Your monthly update",
+        "from_email": "news@bank.example.ng",
+        "text_body": "",
+        "html_body": f"<html><head><style>p{{margin:0}}</style></head><body>{body}</body></html>",
+    }
+
+
+def no_amount(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """Newsletter with no amount at all: every strategy runs and fails."""
+    return {
+        "subject": "Security tips",
+        "from_email": "news@bank.example.ng",
+        "text_body": _pad_text("Keep your account safe.\n", max(1, size_kb // 8)),
+        "html_body": _pad_html("", "<p>Keep your account safe.</p>", size_kb, rnd),
+    }
+
+
+def inline_images(rnd: random.Random, size_kb: int) -> Dict[str, Any]:
+    """Alert table first, then marketing blocks with inline base64 images and a large stylesheet."""
+    alert = gtbank_table(rnd, 1)
+    table = alert["html_body"].split("<body>", 1)[1].rsplit("</body>", 1)[0]
+    target = size_kb * 1024
+    blocks = []
+    length = len(table)
+    while length < target:
+        payload = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/") for _ in range(4096))
+        block = f'<p><img alt="promo" src="data:image/png;base64,{payload}"></p>{NEWSLETTER_BLOCK}'
+        blocks.append(block)
+        length += len(block)
+    style = "<style>" + "".join(f".c{i}{{color:#{i:06x}}}" for i in range(200)) + "</style>"
+    alert["html_body"] = f"<html><head>{style}</head><body>{table}{''.join(blocks)}</body></html>"
+    return alert
+
+
+GENERATORS = {
+    "gtbank_table": gtbank_table,
+    "access_table": access_table,
+    "quoted_printable": quoted_printable,
+    "newsletter": newsletter,
+    "no_amount": no_amount,
+    "inline_images": inline_images,
+}
+
+
+def build_corpus(
+    seed: int = 1234,
+    sizes_kb: Sequence[int] = DEFAULT_SIZES_KB,
+    kinds: Sequence[str] = KINDS,
+) -> List[Dict[str, Any]]:
+    """Build one email per (kind, size) as {"kind", "size_kb", "request"} entries."""
+    rnd = random.Random(seed)
+    corpus = []
+    email_id = 1
+    for kind in kinds:
+        for size_kb in sizes_kb:
+            request = GENERATORS[kind](rnd, size_kb)
+            request["email_id"] = email_id
+            corpus.append({"kind": kind, "size_kb": size_kb, "request": request})
+            email_id += 1
+    return corpus
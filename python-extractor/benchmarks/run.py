@@ -0,0 +1,199 @@
+"""
+Extraction micro-benchmarks over the synthetic corpus.
+
+Times each strategy of extractor.core and the end-to-end cascade of main.py
+and extract_simple.py, reports p50/p95/p99 latency and peak traced memory, and
+optionally saves or checks against a baseline.
+
+Usage:
+  python -m benchmarks.run                      # print the report
+  python -m benchmarks.run --by-kind            # also break results down per email kind
+  python -m benchmarks.run --save-baseline      # write benchmarks/baseline.json
+  python -m benchmarks.run --check              # exit 1 when slower than the baseline
+  python -m benchmarks.run --spool DIR          # also replay the slow requests captured in DIR
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import extract_simple
+import main
+from extractor import core
+from extractor.document import ParsedDocument
+from extractor.profiling import load_spool
+
+from benchmarks.corpus import DEFAULT_SIZES_KB, KINDS, build_corpus
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+STRATEGIES: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "html_table": lambda req: core.extract_from_html_table(req["html_body"], ParsedDocument(req["html_body"])),
+    "html_table_stream": lambda req: core.extract_from_html_table(req["html_body"], ParsedDocument(req["html_body"], "stream")),
+    "html_text": lambda req: core.extract_from_html_text(req["html_body"]),
+    "text_body": lambda req: core.extract_from_text_body(req["text_body"]),
+    "sender_name": lambda req: core.extract_sender_name(req["html_body"], req["text_body"]),
+    "detect_currency": lambda req: core.detect_currency(req["text_body"], req["html_body"]),
+}
+
+
+END_TO_END: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "e2e_main": lambda req: main.run_extraction(main.ExtractionRequest(**req)),
+    "e2e_simple": extract_simple.extract,
+}
+
+
+def spool_corpus(directory: str) -> List[Dict[str, Any]]:
+    """Corpus entries for the redacted requests of a slow-request spool."""
+    entries = []
+    for request in load_spool(directory):
+        size = len(request.get("html_body") or "") + len(request.get("text_body") or "")
+        entries.append({"kind": "spool", "size_kb": max(1, size // 1024), "request": request})
+    return entries
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def time_target(target: Callable, corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, List[float]]:
+    """Latencies in milliseconds per email kind."""
+    timings: Dict[str, List[float]] = {}
+    for entry in corpus:
+        samples = timings.setdefault(entry["kind"], [])
+        for _ in range(repeat):
+            start = time.perf_counter()
+            target(entry["request"])
+            samples.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def peak_memory_kb(target: Callable, corpus: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Peak traced allocation in KB per email kind (one untimed pass)."""
+    peaks: Dict[str, float] = {}
+    tracemalloc.start()
+    try:
+        for entry in corpus:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            target(entry["request"])
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[entry["kind"]] = max(peaks.get(entry["kind"], 0.0), (peak - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def summarize(samples: List[float], peak_kb: float) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 50), 4),
+        "p95": round(percentile(ordered, 95), 4),
+        "p99": round(percentile(ordered, 99), 4),
+        "peak_kb": round(peak_kb, 1),
+        "samples": len(ordered),
+    }
+
+
+def run_benchmarks(corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Results keyed "target" (whole corpus) and "target[kind]"."""
+    results = {}
+    for name, target in {**STRATEGIES, **END_TO_END}.items():
+        timings = time_target(target, corpus, repeat)
+        peaks = peak_memory_kb(target, corpus)
+        all_samples = [sample for samples in timings.values() for sample in samples]
+        results[name] = summarize(all_samples, max(peaks.values(), default=0.0))
+        for kind, samples in timings.items():
+            results[f"{name}[{kind}]"] = summarize(samples, peaks.get(kind, 0.0))
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, float]], by_kind: bool) -> None:
+    print(f"{'target':<36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KB':>9}")
+    for key, row in results.items():
+        if "[" in key and not by_kind:
+            continue
+        print(f"{key:<36} {row['p50']:>9.3f} {row['p95']:>9.3f} {row['p99']:>9.3f} {row['peak_kb']:>9.1f}")
+    main_p50 = results["e2e_main"]["p50"]
+    if main_p50:
+        print(f"\nextract_simple.py vs main.py end-to-end p50: {results['e2e_simple']['p50'] / main_p50:.2f}x")
+
+
+def check_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """Describe every p50/p95 that got slower than the baseline by more than the tolerance."""
+    regressions = []
+    for key, base in baseline.items():
+        current = results.get(key)
+        if current is None:
+            continue
+        for metric in ("p50", "p95"):
+            allowed = base[metric] * (1 + tolerance)
+            if current[metric] > allowed and current[metric] - base[metric] > min_delta_ms:
+                regressions.append(
+                    f"{key} {metric}: {current[metric]:.3f} ms vs baseline {base[metric]:.3f} ms"
+                )
+    return regressions
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES_KB), help="Body sizes in KB")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="Email kinds to generate")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per email and target")
+    parser.add_argument("--by-kind", action="store_true", help="Print one row per email kind as well")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Fail when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown as a fraction (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--spool", help="Slow-request spool directory (EXTRACTOR_SPOOL_DIR) to add as kind \"spool\"")
+    args = parser.parse_args()
+
+    corpus = build_corpus(
+        seed=args.seed,
+        sizes_kb=[int(size) for size in args.sizes.split(",")],
+        kinds=args.kinds.split(","),
+    )
+    if args.spool:
+        corpus.extend(spool_corpus(args.spool))
+    results = run_benchmarks(corpus, args.repeat)
+    print_report(results, args.by_kind)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
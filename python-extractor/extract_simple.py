@@ -3,267 +3,135 @@
 Simple Python extraction script for shared hosting.
 No external dependencies - uses only standard library.
 Called from PHP via shell_exec().
+
+Runs the same cascade as the API (extractor.core), without FastAPI or pydantic.
+
+Modes:
+  extract_simple.py                  one JSON request on stdin, one JSON result on stdout
+  extract_simple.py --serve          long-lived worker: one JSON request per stdin line,
+                                     one JSON result per stdout line
+  extract_simple.py --socket PATH    long-lived worker answering the same line protocol
+                                     on a Unix socket, one forked process per connection
+  extract_simple.py --transactions   one JSON request on stdin, one JSON line per
+                                     statement transaction on stdout, then a done line
 """
 
+import argparse
+import os
 import sys
 import json
-import re
-from html.parser import HTMLParser
 
-def strip_html(html):
-    """Simple HTML tag removal (no external dependencies)."""
-    if not html:
-        return ""
-    # Remove script and style tags
-    html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    # Remove all HTML tags
-    text = re.sub(r'<[^>]+>', ' ', html)
-    # Clean whitespace
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+from extractor import core
 
-def extract_amount_from_html_table(html):
-    """Extract amount from HTML table structures."""
-    if not html:
-        return None
-    
-    # Pattern 1: <td>Amount</td><td>NGN 1000</td>
-    pattern1 = r'<td[^>]*>[\s]*(?:amount|sum|value|total|paid|payment)[\s:]*</td>\s*<td[^>]*>[\s]*(?:ngn|naira|₦)[\s&nbsp;]*([\d,]+\.?\d*)[\s]*</td>'
-    match = re.search(pattern1, html, re.IGNORECASE)
-    if match:
-        try:
-            amount = float(match.group(1).replace(',', ''))
-            if amount >= 10:
-                return amount, 0.95  # High confidence
-        except (ValueError, IndexError):
-            pass
-    
-    # Pattern 2: <td>Amount: NGN 1000</td>
-    pattern2 = r'<td[^>]*>[\s]*(?:amount|sum|value|total|paid|payment)[\s:]+(?:ngn|naira|₦)[\s&nbsp;]*([\d,]+\.?\d*)[\s]*</td>'
-    match = re.search(pattern2, html, re.IGNORECASE)
-    if match:
-        try:
-            amount = float(match.group(1).replace(',', ''))
-            if amount >= 10:
-                return amount, 0.95
-        except (ValueError, IndexError):
-            pass
-    
-    # Pattern 3: Any <td> with NGN amount
-    pattern3 = r'<td[^>]*>[\s]*(?:ngn|naira|₦)\s*([\d,]+\.?\d*)[\s]*</td>'
-    match = re.search(pattern3, html, re.IGNORECASE)
-    if match:
-        try:
-            amount = float(match.group(1).replace(',', ''))
-            if amount >= 10:
-                return amount, 0.90
-        except (ValueError, IndexError):
-            pass
-    
-    return None
+# The stdlib-only stream parser, unless EXTRACTOR_HTML_PARSER picks another
+# backend (BeautifulSoup would cost more to import than most extractions take)
+HTML_BACKEND = os.getenv("EXTRACTOR_HTML_PARSER", "stream")
 
-def extract_amount_from_html_text(html):
-    """Extract amount from HTML text (not table-based)."""
-    if not html:
-        return None
-    
-    patterns = [
-        r'(?:amount|sum|value|total|paid|payment|deposit|transfer|credit)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, html, re.IGNORECASE)
-        for match in matches:
-            try:
-                amount = float(match.group(1).replace(',', ''))
-                if amount >= 10:
-                    return amount, 0.85
-            except (ValueError, IndexError):
-                continue
-    
-    return None
+def extract(input_data):
+    """Run the extraction cascade on one decoded request and return the result dict."""
+    # Same cascade and response shape as main.py's /extract
+    return core.extract(core.email_from_dict(input_data), backend=HTML_BACKEND)
 
-def extract_amount_from_text(text):
-    """Extract amount from plain text."""
-    if not text:
-        return None
-    
-    patterns = [
-        r'(?:amount|sum|value|total|paid|payment|deposit|transfer|credit)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'([\d,]+\.?\d*)\s*(?:naira|ngn)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            try:
-                amount = float(match.group(1).replace(',', ''))
-                if amount >= 10:
-                    return amount, 0.80
-            except (ValueError, IndexError):
-                continue
-    
-    return None
+def error_output(e):
+    """Result returned when a request cannot be processed."""
+    return {
+        "success": False,
+        "errors": [f"Extraction exception: {str(e)}"],
+        "diagnostics": {
+            "steps": [],
+            "errors": [str(e)],
+        },
+    }
 
-def extract_sender_name(html, text):
-    """Extract sender name from email content."""
-    content = (html or "") + " " + (text or "")
-    
-    # Pattern 1: FROM NAME TO
-    match = re.search(r'from\s+([A-Z][A-Z\s]+?)\s+to', content, re.IGNORECASE)
-    if match:
-        name = match.group(1).strip().lower()
-        if len(name) >= 3:
-            return name
-    
-    # Pattern 2: CODE-NAME TRF FOR (handles quoted-printable =20 spaces)
-    match = re.search(r'description[\s:]+(?:=\d+)?\s*(?:[\d\-\s]+-)?([A-Z][A-Z\s]{2,}?)\s+(?:TRF|TRANSFER|FOR|TO)', content, re.IGNORECASE)
-    if match:
-        name = match.group(1).strip().lower()
-        # Remove leading numbers, dashes, spaces, and quoted-printable codes
-        name = re.sub(r'^(?:=\d+|\d+[\-\s])+', '', name)
-        name = re.sub(r'^[\d\-\s]+', '', name)
-        if len(name) >= 3:
-            return name
-    # Pattern 2b: Direct format "CODE-NAME TRF FOR" (handles quoted-printable)
-    match = re.search(r'(?:[\d\-]+=?\d*\s*-)\s*([A-Z][A-Z\s]{2,}?)\s+(?:TRF|TRANSFER|FOR|TO)', content, re.IGNORECASE)
-    if match:
-        name = match.group(1).strip().lower()
-        name = re.sub(r'^(?:=\d+|\d+[\-\s])+', '', name)
-        if len(name) >= 3:
-            return name
-    
-    return None
+def handle_line(line):
+    """Decode one request line and return its JSON-encoded result line."""
+    try:
+        output = extract(json.loads(line))
+    except Exception as e:
+        output = error_output(e)
+    return json.dumps(output) + "\n"
+
+def serve_stream(infile, outfile):
+    """Answer newline-delimited JSON requests until the input is closed."""
+    for line in infile:
+        if not line.strip():
+            continue
+        outfile.write(handle_line(line))
+        outfile.flush()
+
+def stream_transactions(input_data, outfile):
+    """Write every transaction of one statement email as an NDJSON line, then a done line."""
+    # Imported here: one-shot runs (the common case from PHP) never need it
+    from extractor.statement import transactions
+    from extractor.stream import SkimStats
+
+    stats = SkimStats()
+    count = 0
+    for transaction in transactions(core.email_from_dict(input_data), stats):
+        outfile.write(json.dumps(transaction) + "\n")
+        outfile.flush()
+        count += 1
+    outfile.write(json.dumps({"done": True, "transactions": count, "truncated": stats.truncated}) + "\n")
+    outfile.flush()
+
+def serve_socket(path):
+    """Accept connections on a Unix socket until interrupted, each served by a forked process."""
+    # Imported here: one-shot runs (the common case from PHP) never need it
+    import socketserver
+
+    # Not threads: the regex budget's SIGALRM only reaches a process's main thread,
+    # so a connection served from a thread would run without a budget
+    class ForkingUnixStreamServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    class LineRequestHandler(socketserver.StreamRequestHandler):
+        """Serve the --serve line protocol on one socket connection."""
+
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                self.wfile.write(handle_line(line.decode('utf-8')).encode('utf-8'))
+                self.wfile.flush()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with ForkingUnixStreamServer(path, LineRequestHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
 
 def main():
     """Main extraction function."""
+    parser = argparse.ArgumentParser(description="Extract payment information from bank emails.")
+    parser.add_argument('--serve', action='store_true', help="Read one JSON request per stdin line until EOF")
+    parser.add_argument('--socket', metavar='PATH', help="Serve the line protocol on a Unix socket")
+    parser.add_argument('--transactions', action='store_true', help="Write one JSON line per statement transaction")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve_stream(sys.stdin, sys.stdout)
+        return
+    if args.socket:
+        serve_socket(args.socket)
+        return
+    if args.transactions:
+        try:
+            stream_transactions(json.loads(sys.stdin.read()), sys.stdout)
+        except Exception as e:
+            print(json.dumps(error_output(e)))
+            sys.exit(1)
+        return
+    
     try:
         # Read input from stdin (called from PHP)
         input_data = json.loads(sys.stdin.read())
-        
-        text_body = input_data.get('text_body', '')
-        html_body = input_data.get('html_body', '')
-        from_email = input_data.get('from_email', '').lower()
-        
-        diagnostics = {
-            "steps": [],
-            "errors": [],
-            "text_length": len(text_body or ""),
-            "html_length": len(html_body or ""),
-        }
-        
-        # Strategy 1: Try HTML table extraction (highest confidence)
-        if html_body:
-            diagnostics["steps"].append("Attempting HTML table extraction")
-            result = extract_amount_from_html_table(html_body)
-            if result:
-                amount, confidence = result
-                diagnostics["steps"].append(f"Extraction successful: html_table (confidence: {confidence})")
-                output = {
-                    "success": True,
-                    "data": {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "direction": "credit",
-                        "confidence": confidence,
-                        "source": "html_table",
-                        "sender_name": extract_sender_name(html_body, text_body),
-                    },
-                    "diagnostics": diagnostics,
-                }
-                print(json.dumps(output))
-                return
-        
-        # Strategy 2: Try HTML text extraction
-        if html_body:
-            diagnostics["steps"].append("Attempting HTML text extraction")
-            result = extract_amount_from_html_text(html_body)
-            if result:
-                amount, confidence = result
-                diagnostics["steps"].append(f"Extraction successful: html_text (confidence: {confidence})")
-                output = {
-                    "success": True,
-                    "data": {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "direction": "credit",
-                        "confidence": confidence,
-                        "source": "html_text",
-                        "sender_name": extract_sender_name(html_body, text_body),
-                    },
-                    "diagnostics": diagnostics,
-                }
-                print(json.dumps(output))
-                return
-        
-        # Strategy 3: Try text body extraction
-        if text_body:
-            diagnostics["steps"].append("Attempting text body extraction")
-            result = extract_amount_from_text(text_body)
-            if result:
-                amount, confidence = result
-                diagnostics["steps"].append(f"Extraction successful: text_body (confidence: {confidence})")
-                output = {
-                    "success": True,
-                    "data": {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "direction": "credit",
-                        "confidence": confidence,
-                        "source": "text_body",
-                        "sender_name": extract_sender_name(html_body, text_body),
-                    },
-                    "diagnostics": diagnostics,
-                }
-                print(json.dumps(output))
-                return
-        
-        # Strategy 4: Convert HTML to text and try again
-        if html_body:
-            rendered_text = strip_html(html_body)
-            if rendered_text:
-                diagnostics["steps"].append("Attempting HTML-to-text conversion extraction")
-                result = extract_amount_from_text(rendered_text)
-                if result:
-                    amount, confidence = result
-                    diagnostics["steps"].append(f"Extraction successful: html_rendered_text (confidence: {confidence})")
-                    output = {
-                        "success": True,
-                        "data": {
-                            "amount": amount,
-                            "currency": "NGN",
-                            "direction": "credit",
-                            "confidence": confidence * 0.9,  # Lower confidence for converted text
-                            "source": "html_rendered_text",
-                            "sender_name": extract_sender_name(html_body, text_body),
-                        },
-                        "diagnostics": diagnostics,
-                    }
-                    print(json.dumps(output))
-                    return
-        
-        # All strategies failed
-        diagnostics["errors"].append("All extraction strategies failed")
-        output = {
-            "success": False,
-            "errors": diagnostics["errors"],
-            "diagnostics": diagnostics,
-        }
-        print(json.dumps(output))
-        
+        print(json.dumps(extract(input_data)))
     except Exception as e:
-        error_output = {
-            "success": False,
-            "errors": [f"Extraction exception: {str(e)}"],
-            "diagnostics": {
-                "steps": [],
-                "errors": [str(e)],
-            },
-        }
-        print(json.dumps(error_output))
+        print(json.dumps(error_output(e)))
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+"""
+Shared building blocks for the payment email extractor.
+Modules here must only need the standard library at import time; optional
+accelerators (BeautifulSoup, lxml, selectolax) are loaded on first use.
+"""
@@ -0,0 +1,276 @@
+"""
+Per-sender-domain strategy ordering learned from observed hit rates and cost.
+
+For every sender domain the process that records outcomes (the API's main
+process) counts, per strategy, how often it ran, how often it found an amount
+and how long it took. Once a domain has enough runs its cascade is ordered by
+expected cost to a result, mean seconds / hit rate ascending, which is the
+order that minimizes the expected time of a sequential search.
+
+Modes (EXTRACTOR_ADAPTIVE_ORDER):
+
+  off     the fixed order, nothing sampled (default)
+  shadow  the fixed order is served; a sample of requests runs every strategy
+          to learn unbiased hit rates and to check the learned order
+  on      the learned order is served; the sample keeps checking it
+
+A checked request compares the amount the fixed order would return with the
+amount of the learned order. A domain whose learned order disagrees more often
+than EXTRACTOR_ADAPTIVE_MAX_DISAGREEMENT goes back to the fixed order.
+
+Stats are saved as JSON to EXTRACTOR_STRATEGY_STATS_PATH, which the extraction
+workers re-read, so a new worker starts with the learned order. The workers
+only ever see the learned order through that file, so shadow and on need the
+path; without it the mode falls back to off. Each recording process adds the
+counts it gathered since its last save to the file's (under a lock file), so
+several server processes can share one stats file.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "shadow", "on")
+
+# Runs a domain needs before its order is learned, and checks before it can be pinned
+MIN_RUNS = 50
+MIN_CHECKS = 20
+# Counts are halved past this many runs per strategy, so old behaviour fades out
+MAX_RUNS = 10000
+
+
+def _new_entry() -> Dict[str, Any]:
+    return {"strategies": {}, "checks": 0, "disagreements": 0}
+
+
+def merge_counts(domains: Dict[str, Dict[str, Any]], deltas: Dict[str, Dict[str, Any]], trim: bool = True) -> None:
+    """Add the per-domain counts of `deltas` to `domains`; with trim, halve counts past MAX_RUNS."""
+    for domain, delta in deltas.items():
+        entry = domains.setdefault(domain, _new_entry())
+        for name, (runs, hits, seconds) in delta["strategies"].items():
+            old_runs, old_hits, old_seconds = entry["strategies"].get(name, (0, 0, 0.0))
+            counts = [old_runs + runs, old_hits + hits, old_seconds + seconds]
+            if trim and counts[0] > MAX_RUNS:
+                counts = [count / 2 for count in counts]
+            entry["strategies"][name] = counts
+        entry["checks"] += delta["checks"]
+        entry["disagreements"] += delta["disagreements"]
+        if trim and entry["checks"] > MAX_RUNS:
+            entry["checks"] /= 2
+            entry["disagreements"] /= 2
+
+
+class AdaptiveOrder:
+    """Strategy stats per sender domain and the cascade order they imply."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: str = "off",
+        sample_rate: float = 0.05,
+        max_disagreement: float = 0.01,
+        reload_interval: float = 30.0,
+        save_interval: float = 30.0,
+    ):
+        if mode not in MODES:
+            logger.warning(f"Unknown adaptive order mode '{mode}', using off")
+            mode = "off"
+        if mode != "off" and not path:
+            # Extraction workers would never see what the recording process learns
+            logger.warning(f"Adaptive order mode '{mode}' needs EXTRACTOR_STRATEGY_STATS_PATH, using off")
+            mode = "off"
+        self.path = path
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_disagreement = max_disagreement
+        self.reload_interval = reload_interval
+        self.save_interval = save_interval
+        # domain -> {"strategies": {name: [runs, hits, seconds]}, "checks": n, "disagreements": n}
+        self._domains: Dict[str, Dict[str, Any]] = {}
+        # Counts recorded since the last save, in the same shape
+        self._deltas: Dict[str, Dict[str, Any]] = {}
+        self._orders: Dict[str, Tuple[str, ...]] = {}
+        self._recorder_pid: Optional[int] = None
+        self._signature: Tuple = ()
+        self._checked_at = 0.0
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        if path and mode != "off":
+            self.reload(force=True)
+
+    def start_recording(self) -> None:
+        """Make this process the one that records outcomes and saves the stats (it stops re-reading them)."""
+        self._recorder_pid = os.getpid()
+
+    def _recording(self) -> bool:
+        return self._recorder_pid == os.getpid()
+
+    def plan(self, domain: str, default: Sequence[str]) -> Tuple[Sequence[str], Sequence[str], bool]:
+        """
+        (order to serve, learned order, check) for one request.
+
+        With check set every strategy should be run, so the stats see each
+        strategy's unconditional hit rate and the learned order can be compared
+        with the fixed one.
+        """
+        if self.mode == "off" or not domain:
+            return default, default, False
+        self.maybe_reload()
+        learned = self.order(domain, default)
+        check = random.random() < self.sample_rate
+        return (learned if self.mode == "on" else default), learned, check
+
+    def order(self, domain: str, default: Sequence[str]) -> Sequence[str]:
+        """The learned order for a domain, or `default` while unlearned or pinned."""
+        cached = self._orders.get(domain)
+        if cached is not None:
+            return cached
+        entry = self._domains.get(domain)
+        order: Sequence[str] = default
+        if entry is not None and not self._pinned(entry):
+            stats = entry["strategies"]
+            if sum(stats.get(name, (0, 0, 0.0))[0] for name in default) >= MIN_RUNS:
+                order = tuple(sorted(default, key=lambda name: (self._expected_cost(stats.get(name)), default.index(name))))
+        self._orders[domain] = tuple(order)
+        return self._orders[domain]
+
+    @staticmethod
+    def _expected_cost(counts: Optional[List[float]]) -> float:
+        """Mean seconds per run over the (smoothed) hit rate; unknown strategies go last."""
+        if not counts or not counts[0]:
+            return float("inf")
+        runs, hits, seconds = counts
+        return (seconds / runs) / ((hits + 1) / (runs + 2))
+
+    def _pinned(self, entry: Dict[str, Any]) -> bool:
+        return entry["checks"] >= MIN_CHECKS and entry["disagreements"] > self.max_disagreement * entry["checks"]
+
+    def record(self, outcome: Dict[str, Any]) -> None:
+        """Add one extraction's strategy runs, hits and check result (see core.run) to the stats."""
+        domain = outcome.get("domain")
+        if self.mode == "off" or not domain or not outcome.get("strategy_seconds"):
+            return
+        hits = set(outcome.get("strategy_hits") or ())
+        delta = _new_entry()
+        for name, seconds in outcome["strategy_seconds"].items():
+            if name != "template":
+                delta["strategies"][name] = [1, int(name in hits), seconds]
+        if outcome.get("order_agreed") is not None:
+            delta["checks"] = 1
+            delta["disagreements"] = int(not outcome["order_agreed"])
+        with self._lock:
+            merge_counts(self._domains, {domain: delta})
+            merge_counts(self._deltas, {domain: delta}, trim=False)
+            self._orders.pop(domain, None)
+        self.save()
+
+    def save(self, force: bool = False) -> None:
+        """
+        Add the counts recorded since the last save to the stats file when
+        save_interval has passed.
+
+        The file is re-read, merged and replaced atomically under an exclusive
+        lock on PATH.lock, so processes sharing the file never drop each
+        other's counts. This process then serves the merged stats.
+        """
+        if not self.path or not self._deltas:
+            return
+        if not force and time.monotonic() - self._saved_at < self.save_interval:
+            return
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._saved_at = time.monotonic()
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(f"{self.path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                domains = self._read_for_merge()
+                merge_counts(domains, deltas)
+                with open(temporary, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"version": 1, "domains": domains}, sort_keys=True))
+                os.replace(temporary, self.path)
+                signature = self._scan()
+        except OSError as e:
+            logger.error(f"Could not save strategy stats to {self.path}: {e}")
+            with self._lock:
+                # Kept for the next save
+                merge_counts(self._deltas, deltas, trim=False)
+            return
+        with self._lock:
+            # Counts recorded during the save are in _deltas but not yet in the file
+            merge_counts(domains, self._deltas)
+            self._domains = domains
+            self._orders = {}
+            self._signature = signature
+
+    def _scan(self) -> Tuple:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return ()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)["domains"]
+
+    def _read_for_merge(self) -> Dict[str, Dict[str, Any]]:
+        """The file's stats to add new counts to; a missing or unreadable file starts over."""
+        if not self._scan():
+            return {}
+        try:
+            return self._read()
+        except (ValueError, KeyError) as e:
+            logger.error(f"Replacing unreadable strategy stats in {self.path}: {e}")
+            return {}
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the stats file if it changed. Returns True when reloaded."""
+        if not self.path:
+            return False
+        signature = self._scan()
+        self._checked_at = time.monotonic()
+        if not signature or (not force and signature == self._signature):
+            return False
+        try:
+            domains = self._read()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not read strategy stats from {self.path}: {e}")
+            return False
+        with self._lock:
+            self._domains = domains
+            self._orders = {}
+            self._signature = signature
+        return True
+
+    def maybe_reload(self) -> None:
+        """Cheap per-request check in extraction workers; the recording process keeps its own stats."""
+        if self.path and not self._recording() and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+    def summary(self, default: Sequence[str]) -> Dict[str, Any]:
+        """Learned order and stats per domain."""
+        domains = {}
+        for domain, entry in sorted(self._domains.items()):
+            domains[domain] = {
+                "order": list(self.order(domain, default)),
+                "pinned": self._pinned(entry),
+                "checks": entry["checks"],
+                "disagreements": entry["disagreements"],
+                "strategies": {
+                    name: {
+                        "runs": runs,
+                        "hits": hits,
+                        "mean_ms": round(seconds / runs * 1000, 3) if runs else None,
+                    }
+                    for name, (runs, hits, seconds) in entry["strategies"].items()
+                },
+            }
+        return {"mode": self.mode, "path": self.path, "domains": domains}
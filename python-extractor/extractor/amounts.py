@@ -0,0 +1,73 @@
+"""
+Exact amounts in integer minor units (kobo, cents) from matched digit spans.
+
+Strategies used to convert a match with float(group.replace(',', '')), which
+copies the digits twice, is inexact for kobo and accepts any comma placement
+("1,2,,3" became 123). parse_minor() reads the span in place (pattern
+fullmatch with pos/endpos), accepts commas only as thousand separators and
+returns minor units, rounding a third decimal half up. A minimum ("amounts of
+at least 10") is checked against the amount before rounding, so 9.999 is not
+taken for 10.00. Commas around the number (the "," of "NGN 5,000, credited"
+that the scanner's [\\d,] class also takes) are punctuation, not part of the
+amount.
+"""
+
+import re
+from typing import Optional, Tuple
+
+from extractor.patterns import compile_pattern
+
+# Every currency in extractor.currency has two decimal places
+MINOR_PER_MAJOR = 100
+
+# Whole part with valid thousand separators (or none), optional fraction
+AMOUNT_RE = compile_pattern(r',*(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d*))?,*', name="amount_digits")
+
+
+def parse_minor_parts(text: str, start: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    (rounded, truncated) minor units of the amount in text[start:end]
+    ("1,000.505" -> (100051, 100050)), or None when malformed. Compare a
+    minimum with the truncated value: it is below the minimum exactly when the
+    amount is.
+    """
+    if end is None:
+        end = len(text)
+    # Fast path: plain digits ("5000") need no pattern
+    if 0 < end - start <= 18 and text[start:end].isdecimal():
+        minor = int(text[start:end]) * MINOR_PER_MAJOR
+        return minor, minor
+    match = AMOUNT_RE.fullmatch(text, start, end)
+    if match is None:
+        return None
+    start, end = match.span(1)
+    if text.find(",", start, end) == -1:
+        minor = int(text[start:end]) * MINOR_PER_MAJOR
+    else:
+        minor = int(text[start:end].replace(",", "")) * MINOR_PER_MAJOR
+    start, end = match.span(2)
+    digits = end - start
+    if digits >= 2:
+        minor += int(text[start:start + 2])
+        # Half up on the third decimal, the way a bank rounds 1,000.505 to 1,000.51
+        if digits > 2 and text[start + 2] >= "5":
+            return minor + 1, minor
+    elif digits == 1:
+        minor += int(text[start]) * 10
+    return minor, minor
+
+
+def parse_minor(text: str, start: int = 0, end: Optional[int] = None, minimum: int = 0) -> Optional[int]:
+    """
+    Minor units of the amount in text[start:end] ("1,000.50" -> 100050), or
+    None when malformed or when the amount is below `minimum` minor units.
+    """
+    parts = parse_minor_parts(text, start, end)
+    if parts is None or parts[1] < minimum:
+        return None
+    return parts[0]
+
+
+def to_major(minor: Optional[int]) -> Optional[float]:
+    """Amount in major units (Naira, dollars) for the float `amount` field."""
+    return minor / MINOR_PER_MAJOR if minor is not None else None
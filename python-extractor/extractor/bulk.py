@@ -0,0 +1,357 @@
+"""
+Offline bulk re-extraction over JSONL exports, Maildir folders or mbox files.
+
+Usage (from the python-extractor directory):
+  python -m extractor.bulk processed_emails.jsonl -o results.jsonl
+  python -m extractor.bulk ~/Maildir -o results.csv
+  python -m extractor.bulk processed_emails.jsonl -o changed.jsonl --diff
+
+JSONL input is one processed_emails row per line: id (or email_id), subject,
+from_email, text_body, html_body and email_date. The row's amount, sender_name
+and extraction_method are the previous results that --diff compares against;
+with --diff only rows whose amount, sender or source changed are written.
+
+Records are extracted in input order by a process pool running the API's
+cascade (extractor.core). A checkpoint file (OUTPUT.checkpoint by default) stores how many
+records were done and how large the output was at that point, so an
+interrupted run picks up where it stopped; --restart starts over.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import mailbox
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import takewhile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from extractor import core
+from extractor.mime import decode_message
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "maildir", "mbox")
+RESULT_FIELDS = ["email_id", "message_id", "success", "amount", "amount_minor", "currency", "sender_name", "source", "confidence", "errors"]
+DIFF_FIELDS = ["previous_amount", "previous_sender_name", "previous_source", "changed"]
+
+# (position in the input, "json" or "rfc822", raw line or (mailbox key, message bytes))
+Record = Tuple[int, str, Any]
+
+
+def detect_format(path: str) -> str:
+    if os.path.isdir(path):
+        return "maildir"
+    if path.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "mbox"
+
+
+def read_records(path: str, input_format: str, skip: int = 0) -> Iterator[Record]:
+    """Raw records in a stable order, starting after the first `skip`."""
+    if input_format == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            position = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                if position >= skip:
+                    yield position, "json", line
+                position += 1
+        return
+
+    if input_format == "maildir":
+        box = mailbox.Maildir(path, factory=None, create=False)
+    else:
+        box = mailbox.mbox(path, create=False)
+    try:
+        keys = sorted(box.keys()) if input_format == "maildir" else list(box.keys())
+        for position, key in enumerate(keys[skip:], start=skip):
+            try:
+                raw = box.get_bytes(key)
+            except (KeyError, OSError) as e:
+                # Message moved or deleted while we were running
+                logger.warning(f"Skipping {key}: {e}")
+                raw = b""
+            yield position, "rfc822", (str(key), raw)
+    finally:
+        box.close()
+
+
+def _previous_values(row: Dict[str, Any]) -> Dict[str, Any]:
+    extracted = row.get("extracted_data")
+    if isinstance(extracted, str):
+        try:
+            extracted = json.loads(extracted)
+        except ValueError:
+            extracted = None
+    if not isinstance(extracted, dict):
+        extracted = {}
+    return {
+        "amount": row.get("amount", extracted.get("amount")),
+        "sender_name": row.get("sender_name", extracted.get("sender_name")),
+        "source": row.get("extraction_method") or extracted.get("source"),
+    }
+
+
+def _parse_record(record: Record) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """(request payload, extra output fields, previous values) for one raw record."""
+    position, kind, payload = record
+    if kind == "json":
+        row = json.loads(payload)
+        email_id = row.get("email_id", row.get("id"))
+        request = {
+            "email_id": int(email_id) if email_id is not None else position,
+            "subject": row.get("subject") or "",
+            "from_email": row.get("from_email") or "",
+            "text_body": row.get("text_body"),
+            "html_body": row.get("html_body"),
+            "email_date": str(row["email_date"]) if row.get("email_date") else None,
+        }
+        return request, {"message_id": row.get("message_id")}, _previous_values(row)
+
+    key, raw = payload
+    fields = decode_message(raw)
+    request = {
+        "email_id": position,
+        "subject": fields["subject"],
+        "from_email": fields["from_email"],
+        "text_body": fields["text_body"],
+        "html_body": fields["html_body"],
+        "email_date": fields["email_date"],
+    }
+    return request, {"message_id": fields["message_id"] or key}, None
+
+
+def _same_amount(new: Any, old: Any) -> bool:
+    if new is None or old is None or old == "":
+        return new is None and (old is None or old == "")
+    try:
+        return round(float(new), 2) == round(float(old), 2)
+    except (TypeError, ValueError):
+        return False
+
+
+def _same_name(new: Optional[str], old: Optional[str]) -> bool:
+    return " ".join((new or "").lower().split()) == " ".join((old or "").lower().split())
+
+
+def changed_fields(row: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """Which of amount, sender_name and source differ from the previous extraction."""
+    changed = []
+    if not _same_amount(row["amount"], previous["amount"]):
+        changed.append("amount")
+    if not _same_name(row["sender_name"], previous["sender_name"]):
+        changed.append("sender_name")
+    if (row["source"] or None) != (previous["source"] or None):
+        changed.append("source")
+    return changed
+
+
+def process_record(record: Record, diff: bool) -> Dict[str, Any]:
+    """Extract one record into a flat output row."""
+    row: Dict[str, Any] = dict.fromkeys(RESULT_FIELDS)
+    row["email_id"] = record[0]
+    previous = None
+    try:
+        request, extra, previous = _parse_record(record)
+        row.update(extra)
+        row["email_id"] = request["email_id"]
+        response = core.extract(core.Email(**request))
+        row["success"] = response["success"]
+        row["errors"] = response["errors"]
+        if response["data"] is not None:
+            for field in ("amount", "amount_minor", "currency", "sender_name", "source", "confidence"):
+                row[field] = response["data"][field]
+    except Exception as e:
+        row["success"] = False
+        row["errors"] = [f"Record {record[0]} failed: {e}"]
+
+    if diff:
+        previous = previous or dict.fromkeys(("amount", "sender_name", "source"))
+        row["previous_amount"] = previous["amount"]
+        row["previous_sender_name"] = previous["sender_name"]
+        row["previous_source"] = previous["source"]
+        row["changed"] = changed_fields(row, previous)
+    return row
+
+
+def process_chunk(records: List[Record], diff: bool) -> List[Dict[str, Any]]:
+    """Worker entry point."""
+    return [process_record(record, diff) for record in records]
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ResultWriter:
+    """Appends rows as JSONL or CSV and reports the flushed file size for checkpoints."""
+
+    def __init__(self, path: str, output_format: str, fields: List[str]):
+        self.output_format = output_format
+        self.fields = fields
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        self.csv = None
+        if output_format == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=fields, extrasaction="ignore")
+            if self.size() == 0:
+                self.csv.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self.csv is not None:
+            flat = dict(row)
+            for key in ("errors", "changed"):
+                if isinstance(flat.get(key), list):
+                    flat[key] = "; ".join(flat[key]) if key == "errors" else ",".join(flat[key])
+            self.csv.writerow(flat)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def size(self) -> int:
+        self.file.flush()
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def load_checkpoint(path: str, input_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('input')}; use --restart to start over")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Write atomically so a crash never leaves a half-written checkpoint."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def run(args: argparse.Namespace) -> int:
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path, args.input)
+    if checkpoint is None:
+        checkpoint = {"input": os.path.abspath(args.input), "processed": 0, "written": 0, "output_bytes": 0}
+        open(args.output, "w").close()
+    else:
+        # Drop anything written after the last checkpoint so resumed rows are not duplicated
+        with open(args.output, "a") as f:
+            f.truncate(checkpoint["output_bytes"])
+        print(f"Resuming after {checkpoint['processed']} records", file=sys.stderr)
+
+    fields = RESULT_FIELDS + (DIFF_FIELDS if args.diff else [])
+    writer = ResultWriter(args.output, output_format, fields)
+    records = read_records(args.input, input_format, skip=checkpoint["processed"])
+    if args.limit:
+        records = takewhile(lambda record: record[0] < args.limit, records)
+
+    started = time.monotonic()
+    last_report = started
+    done = 0
+    failed = 0
+    since_checkpoint = 0
+    # False while a chunk is half written; the checkpoint is then left at its last saved state
+    consistent = True
+
+    def report(final: bool = False) -> None:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        label = "Done" if final else "Progress"
+        print(
+            f"{label}: {done} records in {elapsed:.1f}s ({done / elapsed:.0f}/s), "
+            f"{failed} failed, {checkpoint['written']} rows written",
+            file=sys.stderr,
+        )
+
+    workers = args.workers or (os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        def collect() -> None:
+            nonlocal done, failed, since_checkpoint, last_report, consistent
+            rows = pending.popleft().result()
+            consistent = False
+            for row in rows:
+                if not row["success"]:
+                    failed += 1
+                if args.diff and not row["changed"]:
+                    continue
+                writer.write(row)
+                checkpoint["written"] += 1
+            done += len(rows)
+            since_checkpoint += len(rows)
+            checkpoint["processed"] += len(rows)
+            consistent = True
+            if since_checkpoint >= args.checkpoint_every:
+                checkpoint["output_bytes"] = writer.size()
+                save_checkpoint(checkpoint_path, checkpoint)
+                since_checkpoint = 0
+            if time.monotonic() - last_report >= args.progress_interval:
+                report()
+                last_report = time.monotonic()
+
+        # Keep a bounded window of chunks in flight and collect them in input order,
+        # so the checkpoint is always a prefix of the input
+        for chunk in _chunks(records, args.chunk_size):
+            pending.append(pool.submit(process_chunk, chunk, args.diff))
+            if len(pending) >= workers * 4:
+                collect()
+        while pending:
+            collect()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if consistent:
+            checkpoint["output_bytes"] = writer.size()
+            save_checkpoint(checkpoint_path, checkpoint)
+        writer.close()
+
+    report(final=True)
+    return 0
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL export, Maildir directory or mbox file")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.jsonl or .csv)")
+    parser.add_argument("--input-format", choices=FORMATS, help="Default: guessed from the path")
+    parser.add_argument("--output-format", choices=("jsonl", "csv"), help="Default: guessed from the output extension")
+    parser.add_argument("--diff", action="store_true", help="Only write rows whose amount, sender or source changed")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Records per worker task")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=10000, help="Records between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many input records")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between throughput reports")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        return run(args)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,263 @@
+"""
+In-process cache of extraction results keyed by a hash of the email content.
+
+Entries are evicted least-recently-used once the cache is full and expire after
+a TTL. Concurrent requests for the same key share one computation
+(single-flight). An optional SQLite file keeps entries across worker restarts;
+writes to it are buffered and committed together by a background thread, so a
+request never waits on the disk.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_COALESCED = "coalesced"
+
+# Expired rows are purged from the SQLite file once every this many written rows
+PRUNE_EVERY = 1000
+
+
+def content_key(from_email: Optional[str], subject: Optional[str], text_body: Optional[str], html_body: Optional[str], version: str = "") -> str:
+    """
+    Hash of the normalized (from_email, subject, text_body, html_body) tuple
+    and the version of the rules that extract it (e.g. the template registry's),
+    so results from older rules are not served.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    fields = (
+        version,
+        (from_email or "").strip().lower(),
+        (subject or "").strip(),
+        (text_body or "").replace("\r\n", "\n").strip(),
+        (html_body or "").replace("\r\n", "\n").strip(),
+    )
+    for field in fields:
+        encoded = field.encode("utf-8", "surrogatepass")
+        # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def raw_key(raw: bytes, version: str = "") -> str:
+    """Hash of a raw RFC 822 message and a rules version (kept apart from content_key hashes)."""
+    digest = hashlib.blake2b(digest_size=20, person=b"raw-rfc822")
+    encoded = version.encode("utf-8")
+    digest.update(len(encoded).to_bytes(8, "little"))
+    digest.update(encoded)
+    digest.update(raw)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache with TTL expiry, hit/miss counters and single-flight."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600, path: Optional[str] = None, flush_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # key -> (JSON value, stored_at) waiting for the next flush
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._writes = 0
+        if path and self.enabled:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached value for key, or None when missing or expired. Does not touch the counters."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+            row = self._pending.get(key)
+        if self._db is None:
+            return None
+        if row is None:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+        # Expired rows are left for the next prune
+        if row is None or now - row[1] > self.ttl:
+            return None
+        value = json.loads(row[0])
+        with self._lock:
+            self._store(key, value, row[1])
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value, evicting the least recently used entries beyond max_entries."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+            if self._db is not None:
+                self._pending[key] = (json.dumps(value), now)
+        if self._db is not None and self._thread is None:
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="result-cache", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Could not write cached results to {self.path}: {e}")
+
+    def flush(self) -> int:
+        """Commit the buffered entries in one transaction; returns how many were written."""
+        if self._db is None:
+            return 0
+        # Taken before the buffer so two flushes commit in the order they emptied it
+        with self._db_lock:
+            with self._lock:
+                rows, self._pending = self._pending, {}
+            if not rows:
+                return 0
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO results (key, value, stored_at) VALUES (?, ?, ?)",
+                    [(key, value, stored_at) for key, (value, stored_at) in rows.items()],
+                )
+                self._writes += len(rows)
+                if self._writes >= PRUNE_EVERY:
+                    self._writes = 0
+                    self._db.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - self.ttl,))
+        return len(rows)
+
+    def close(self) -> None:
+        """Flush and stop the background writer."""
+        if self._db is None:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+        self._db = None
+
+    def _store(self, key: str, value: Dict[str, Any], stored_at: float) -> None:
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() that also counts the hit or miss."""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Return (value, status) where status is hit, miss or coalesced.
+
+        Identical keys requested while a computation is running wait for that
+        computation instead of starting their own. A computed value is only
+        stored when `cacheable(value)` is true (always without `cacheable`);
+        requests that were waiting for it still get it.
+        """
+        if not self.enabled:
+            return await compute(), CACHE_MISS
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, CACHE_HIT
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending), CACHE_COALESCED
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody waited for is not logged as "never retrieved"
+            future.exception()
+            raise
+        else:
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value, CACHE_MISS
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,566 @@
+"""
+The extraction cascade, shared by the API (main.py), script mode
+(extract_simple.py) and bulk re-extraction.
+
+Standard library only: BeautifulSoup, lxml, selectolax and re2 are loaded on
+first use when installed (see extractor.document and extractor.patterns).
+Results are plain dicts; main.py validates them into its pydantic models.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from extractor.adaptive import AdaptiveOrder
+from extractor.amounts import MINOR_PER_MAJOR, parse_minor, to_major
+from extractor.currency import amounts_in_words, currency_code, find_currency
+from extractor.document import ParsedDocument
+from extractor.fields import transaction_fields
+from extractor.patterns import RegexBudgetExceeded, budget_for, regex_budget
+from extractor.profiling import StepTimer, timed
+from extractor.scanner import (
+    CURRENCY_AMOUNT_RE,
+    NAME_TIER_CELL,
+    NAME_TIER_CODE,
+    NAME_TIER_DESCRIPTION,
+    NAME_TIER_FROM,
+    cell_name,
+    clean_description_name,
+    scan_body,
+    scan_scope,
+)
+from extractor.templates import BankTemplate, TemplateRegistry, sender_domain
+
+logger = logging.getLogger(__name__)
+
+# Bank templates, hot-reloaded from EXTRACTOR_TEMPLATE_DIR
+TEMPLATE_DIR = os.getenv(
+    "EXTRACTOR_TEMPLATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates"),
+)
+TEMPLATE_MIN_CONFIDENCE = float(os.getenv("EXTRACTOR_TEMPLATE_MIN_CONFIDENCE", "0.9"))
+# Characters either side of a template's amount match searched for transaction fields
+TEMPLATE_FIELD_WINDOW = int(os.getenv("EXTRACTOR_TEMPLATE_FIELD_WINDOW", "8192"))
+# Error of a cascade that ran to the end without finding an amount (the same email fails the same way again)
+NO_MATCH_ERROR = "All extraction strategies failed"
+bank_templates = TemplateRegistry(TEMPLATE_DIR, reload_interval=float(os.getenv("EXTRACTOR_TEMPLATE_RELOAD_INTERVAL", "5")))
+
+# Fields of a successful result and their defaults (main.ExtractionResult mirrors these)
+RESULT_DEFAULTS: Dict[str, Any] = {
+    "amount": None,
+    "amount_minor": None,
+    "currency": "NGN",
+    "direction": "credit",
+    "confidence": None,
+    "source": None,
+    "sender_name": None,
+    "account_number": None,
+    "payer_account_number": None,
+    "description_field": None,
+    "extracted_date": None,
+    "value_date": None,
+    "narration": None,
+}
+
+
+class Email(NamedTuple):
+    """The request fields the cascade reads (main.ExtractionRequest has the same attributes)."""
+    email_id: int = 0
+    subject: str = ""
+    from_email: str = ""
+    text_body: Optional[str] = None
+    html_body: Optional[str] = None
+    email_date: Optional[str] = None
+
+
+def email_from_dict(data: Dict[str, Any]) -> Email:
+    """Email from a decoded JSON request; unknown keys are ignored."""
+    return Email(
+        email_id=data.get("email_id") or 0,
+        subject=data.get("subject") or "",
+        from_email=data.get("from_email") or "",
+        text_body=data.get("text_body"),
+        html_body=data.get("html_body"),
+        email_date=data.get("email_date"),
+    )
+
+
+def extract_from_html_table(html: str, document: Optional[ParsedDocument] = None) -> Optional[Dict[str, Any]]:
+    """Extract amount from HTML table structures (most accurate)."""
+    if not html:
+        return None
+
+    document = document or ParsedDocument(html)
+    cells = document.cells()
+
+    # Look for table cells containing amount
+    for cell_text, next_text in cells:
+        text = cell_text.lower()
+
+        # Check if this cell indicates it contains an amount
+        if any(keyword in text for keyword in ['amount', 'sum', 'value', 'total', 'paid', 'payment']):
+            # Check current cell for amount
+            amount_match = CURRENCY_AMOUNT_RE.search(text)
+            if amount_match:
+                minor = parse_minor(text, *amount_match.span(1), minimum=10 * MINOR_PER_MAJOR)
+                if minor is not None:
+                    return {
+                        "amount": to_major(minor),
+                        "amount_minor": minor,
+                        "currency": "NGN",
+                        "confidence": 0.95,
+                        "source": "html_table",
+                    }
+
+            # Check next sibling cell
+            if next_text is not None:
+                amount_match = CURRENCY_AMOUNT_RE.search(next_text)
+                if amount_match:
+                    minor = parse_minor(next_text, *amount_match.span(1), minimum=10 * MINOR_PER_MAJOR)
+                    if minor is not None:
+                        return {
+                            "amount": to_major(minor),
+                            "amount_minor": minor,
+                            "currency": "NGN",
+                            "confidence": 0.95,
+                            "source": "html_table",
+                        }
+
+    # Try finding any table cell with NGN/Naira amount
+    for text, _ in cells:
+        amount_match = CURRENCY_AMOUNT_RE.search(text)
+        if amount_match:
+            minor = parse_minor(text, *amount_match.span(1), minimum=10 * MINOR_PER_MAJOR)
+            if minor is not None:
+                return {
+                    "amount": to_major(minor),
+                    "amount_minor": minor,
+                    "currency": "NGN",
+                    "confidence": 0.90,
+                    "source": "html_table",
+                }
+
+    return None
+
+
+def extract_from_html_text(html: str) -> Optional[Dict[str, Any]]:
+    """Extract amount from HTML text (not table-based)."""
+    if not html:
+        return None
+
+    hit = scan_body(html).best_amount(suffix_currencies=("naira", "ngn"))
+    if hit:
+        return {
+            "amount": hit.amount,
+            "amount_minor": hit.minor,
+            "currency": currency_code(hit.currency),
+            "confidence": 0.85,
+            "source": "html_text",
+        }
+
+    return None
+
+
+def extract_from_text_body(text: str) -> Optional[Dict[str, Any]]:
+    """Extract amount from plain text body."""
+    if not text:
+        return None
+
+    hit = scan_body(text).best_amount(suffix_currencies=("naira", "ngn", "usd", "dollar"))
+    if hit:
+        return {
+            "amount": hit.amount,
+            "amount_minor": hit.minor,
+            "currency": currency_code(hit.currency),
+            "confidence": 0.80,
+            "source": "text_body",
+        }
+
+    return None
+
+
+def extract_sender_name(html: str, text: str, document: Optional[ParsedDocument] = None) -> Optional[str]:
+    """Extract sender name from email content."""
+    # A streamed document may already have passed a Description cell; no need to scan the whole body
+    if document is not None and document.backend == "stream":
+        name = cell_name(document.parsed_cells())
+        if name and len(name) >= 3:
+            return name
+
+    # Try HTML first
+    if html:
+        scanned = scan_body(html)
+        for tier in (NAME_TIER_CELL, NAME_TIER_FROM):
+            hit = scanned.first_name(tier)
+            if hit and len(hit.name) >= 3:
+                return hit.name
+
+    # Try text
+    if text:
+        hit = scan_body(text).first_name(NAME_TIER_FROM)
+        if hit and len(hit.name) >= 3:
+            return hit.name
+
+    # "Description: CODE-NAME TRF FOR", then a bare "CODE-NAME TRF FOR" (quoted-printable
+    # leftovers such as =20 included), HTML before text
+    for tier in (NAME_TIER_DESCRIPTION, NAME_TIER_CODE):
+        for body in (html, text):
+            if not body:
+                continue
+            hit = scan_body(body).first_name(tier)
+            if hit:
+                name = clean_description_name(hit.name)
+                if len(name) >= 3:
+                    return name
+
+    return None
+
+
+def extract_transaction_fields(html: str, text: str) -> Dict[str, Optional[str]]:
+    """Account numbers, description field, value date and narration, from the scans already made."""
+    # The whole body even when a streamed document stopped early: the fields may follow the amount
+    return transaction_fields((html, text))
+
+
+def detect_currency(text: str, html: str) -> str:
+    """Detect currency from email content, for a result without a currency marker."""
+    return find_currency(text, html) or "NGN"  # Default to Naira
+
+
+def check_amount_in_words(result: Dict[str, Any], text: str, html: str) -> Optional[Dict[str, Any]]:
+    """
+    Compare the amount with an amount written in words in the email
+    ("... Naira Only"), or None when there is none. Kobo are left out of both.
+    """
+    words = amounts_in_words(text) or amounts_in_words(html)
+    if not words or result.get("amount_minor") is None:
+        return None
+    naira = result["amount_minor"] // MINOR_PER_MAJOR
+    return {"amount": naira if naira in words else words[0], "matches": naira in words}
+
+
+def _run_html_table(email: Email, document: ParsedDocument) -> Optional[Dict[str, Any]]:
+    return extract_from_html_table(email.html_body, document)
+
+
+def _run_html_text(email: Email, document: ParsedDocument) -> Optional[Dict[str, Any]]:
+    return extract_from_html_text(email.html_body)
+
+
+def _run_text_body(email: Email, document: ParsedDocument) -> Optional[Dict[str, Any]]:
+    return extract_from_text_body(email.text_body)
+
+
+def _run_html_rendered_text(email: Email, document: ParsedDocument) -> Optional[Dict[str, Any]]:
+    result = extract_from_text_body(document.text())
+    if result:
+        result["source"] = "html_rendered_text"
+        result["confidence"] = 0.75  # Lower confidence for converted text
+    return result
+
+
+class Strategy(NamedTuple):
+    name: str
+    applies: Callable[[Email, ParsedDocument], bool]
+    run: Callable[[Email, ParsedDocument], Optional[Dict[str, Any]]]
+    attempt_step: str
+    failure_error: str
+
+
+# Extraction cascade, highest confidence first (the fixed order; see extractor.adaptive)
+STRATEGIES = [
+    Strategy(
+        "html_table",
+        lambda email, document: bool(email.html_body),
+        _run_html_table,
+        "Attempting HTML table extraction",
+        "HTML table extraction failed",
+    ),
+    Strategy(
+        "html_text",
+        lambda email, document: bool(email.html_body),
+        _run_html_text,
+        "Attempting HTML text extraction",
+        "HTML text extraction failed",
+    ),
+    Strategy(
+        "text_body",
+        lambda email, document: bool(email.text_body),
+        _run_text_body,
+        "Attempting text body extraction",
+        "Text body extraction failed",
+    ),
+    # Convert HTML to text and try again
+    Strategy(
+        "html_rendered_text",
+        lambda email, document: bool(email.html_body) and bool(document.text()),
+        _run_html_rendered_text,
+        "Attempting HTML-to-text conversion extraction",
+        "HTML-to-text extraction failed",
+    ),
+]
+STRATEGIES_BY_NAME = {strategy.name: strategy for strategy in STRATEGIES}
+STRATEGY_NAMES = tuple(STRATEGIES_BY_NAME)
+
+# Per-domain strategy order learned from hit rates and cost (EXTRACTOR_ADAPTIVE_ORDER=off|shadow|on)
+strategy_order = AdaptiveOrder(
+    path=os.getenv("EXTRACTOR_STRATEGY_STATS_PATH") or None,
+    mode=os.getenv("EXTRACTOR_ADAPTIVE_ORDER", "off"),
+    sample_rate=float(os.getenv("EXTRACTOR_ADAPTIVE_SAMPLE_RATE", "0.05")),
+    max_disagreement=float(os.getenv("EXTRACTOR_ADAPTIVE_MAX_DISAGREEMENT", "0.01")),
+)
+
+
+def extract(
+    email: Email,
+    outcome: Optional[Dict[str, Any]] = None,
+    lean: bool = False,
+    backend: Optional[str] = None,
+    timer: Optional[StepTimer] = None,
+) -> Dict[str, Any]:
+    """
+    Run the cascade for one email and return the response dict
+    ({"success", "data", "errors", "diagnostics"}).
+
+    `email` may be an Email or anything with the same attributes. When `outcome`
+    is given it is filled with what metrics need (strategy timings, winner,
+    template domain) so callers in another process can record them. With `lean`
+    no diagnostics are collected or returned, and only the error that ended a
+    failed cascade is reported. `backend` overrides the HTML parser backend.
+    With a `timer` every strategy and helper is timed, and the timings are
+    returned in diagnostics["profile"].
+    """
+    if lean:
+        result, error = run(email, None, outcome, backend, timer)
+        if result:
+            return {"success": True, "data": result_data(result), "errors": []}
+        return {"success": False, "data": None, "errors": [error]}
+
+    diagnostics = {
+        "steps": [],
+        "errors": [],
+        "text_length": len(email.text_body or ""),
+        "html_length": len(email.html_body or ""),
+    }
+    result, error = run(email, diagnostics, outcome, backend, timer)
+    if timer is not None:
+        diagnostics["profile"] = timer.summary()
+    if result:
+        return {"success": True, "data": result_data(result), "errors": [], "diagnostics": diagnostics}
+    diagnostics["errors"].append(error)
+    return {"success": False, "data": None, "errors": list(diagnostics["errors"]), "diagnostics": diagnostics}
+
+
+def result_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A strategy or template result with every RESULT_DEFAULTS field, and no others."""
+    return {name: result.get(name, default) for name, default in RESULT_DEFAULTS.items()}
+
+
+def _note(diagnostics: Optional[Dict[str, Any]], kind: str, message: str) -> None:
+    """Append to diagnostics["steps"] or ["errors"] unless diagnostics are off (lean mode)."""
+    if diagnostics is not None:
+        diagnostics[kind].append(message)
+
+
+def run(
+    email: Email,
+    diagnostics: Optional[Dict[str, Any]] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+    backend: Optional[str] = None,
+    timer: Optional[StepTimer] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """The cascade under the regex budget: (result, None) or (None, error that ended it)."""
+    if outcome is None:
+        outcome = {}
+    outcome.update({
+        "text_length": len(email.text_body or ""),
+        "html_length": len(email.html_body or ""),
+        "template": None,
+        "strategy_seconds": {},
+        "domain": None,
+        "strategy_hits": [],
+        "order_agreed": None,
+        "winner": None,
+        "exception": False,
+        "budget_exceeded": False,
+    })
+
+    budget_ms = budget_for(outcome["text_length"] + outcome["html_length"])
+    try:
+        with regex_budget(budget_ms), scan_scope():
+            result = _run_cascade(email, diagnostics, outcome, backend, timer)
+
+    except RegexBudgetExceeded:
+        logger.warning(f"Extraction of email {email.email_id} exceeded the {budget_ms:.0f} ms regex budget")
+        outcome["budget_exceeded"] = True
+        return None, f"Regex time budget exceeded ({budget_ms:.0f} ms)"
+
+    except Exception as e:
+        logger.error(f"Extraction error: {str(e)}", exc_info=True)
+        outcome["exception"] = True
+        return None, f"Extraction exception: {str(e)}"
+
+    # All strategies failed
+    return result, None if result else NO_MATCH_ERROR
+
+
+def _run_cascade(
+    email: Email,
+    diagnostics: Optional[Dict[str, Any]],
+    outcome: Dict[str, Any],
+    backend: Optional[str],
+    timer: Optional[StepTimer] = None,
+) -> Optional[Dict[str, Any]]:
+    """Template fast path, then each strategy in turn until one finds an amount."""
+    document = ParsedDocument(email.html_body, backend, timer)
+
+    # Check for bank template match: a confident template hit skips the generic cascade
+    bank_template = bank_templates.find(email.from_email)
+    outcome["rules_version"] = bank_templates.version
+    template_result = None
+    if bank_template:
+        outcome["template"] = bank_template.domains[0]
+        _note(diagnostics, "steps", f"Template found: {bank_template.name}")
+        started = time.perf_counter()
+        with timed(timer, "template"):
+            template_result = bank_template.extract_amount(email.html_body, email.text_body)
+        outcome["strategy_seconds"]["template"] = time.perf_counter() - started
+        if template_result and template_result["confidence"] >= TEMPLATE_MIN_CONFIDENCE:
+            return _template_result(bank_template, template_result, email, document, diagnostics, outcome, timer)
+        if not template_result:
+            _note(diagnostics, "errors", "Template extraction failed")
+    else:
+        _note(diagnostics, "steps", "No matching bank template found")
+
+    domain = sender_domain(email.from_email)
+    outcome["domain"] = domain
+    order, learned, check = strategy_order.plan(domain, STRATEGY_NAMES)
+    if order != STRATEGY_NAMES:
+        _note(diagnostics, "steps", f"Learned strategy order for {domain}: {', '.join(order)}")
+    if check:
+        result = _run_checked(email, document, order, learned, diagnostics, outcome, timer)
+    else:
+        result = _run_in_order(email, document, order, diagnostics, outcome, timer)
+    if result:
+        with timed(timer, "sender_name"):
+            result["sender_name"] = extract_sender_name(email.html_body, email.text_body, document)
+        # The marker next to the amount; the whole email only when the strategy had none
+        with timed(timer, "detect_currency"):
+            result["currency"] = result.get("currency") or detect_currency(email.text_body, email.html_body)
+        with timed(timer, "transaction_fields"):
+            result.update(extract_transaction_fields(email.html_body, email.text_body))
+        with timed(timer, "amount_in_words"):
+            _check_words(result, email, diagnostics)
+        _note(diagnostics, "steps", f"Extraction successful: {result['source']}")
+        return result
+
+    # Fall back to a low-confidence template hit before giving up
+    if template_result:
+        return _template_result(bank_template, template_result, email, document, diagnostics, outcome, timer)
+    return None
+
+
+def _check_words(result: Dict[str, Any], email: Email, diagnostics: Optional[Dict[str, Any]]) -> None:
+    """Cross-check the amount against the amount in words into diagnostics (skipped in lean mode)."""
+    if diagnostics is None:
+        return
+    check = check_amount_in_words(result, email.text_body, email.html_body)
+    if check is None:
+        return
+    diagnostics["amount_in_words"] = check
+    if check["matches"]:
+        _note(diagnostics, "steps", f"Amount in words matches: {check['amount']}")
+    else:
+        _note(diagnostics, "errors", f"Amount in words ({check['amount']}) does not match amount ({result['amount']:g})")
+
+
+def _run_strategy(
+    strategy: Strategy,
+    email: Email,
+    document: ParsedDocument,
+    diagnostics: Optional[Dict[str, Any]],
+    outcome: Dict[str, Any],
+    timer: Optional[StepTimer] = None,
+) -> Optional[Dict[str, Any]]:
+    """Run one strategy if it applies, recording its time and whether it found an amount."""
+    # Timed from the applies() check, which may render the HTML to text
+    started = time.perf_counter()
+    with timed(timer, strategy.name):
+        if not strategy.applies(email, document):
+            return None
+        _note(diagnostics, "steps", strategy.attempt_step)
+        result = strategy.run(email, document)
+    outcome["strategy_seconds"][strategy.name] = time.perf_counter() - started
+    if result:
+        outcome["strategy_hits"].append(strategy.name)
+    else:
+        _note(diagnostics, "errors", strategy.failure_error)
+    return result
+
+
+def _run_in_order(
+    email: Email,
+    document: ParsedDocument,
+    order: Sequence[str],
+    diagnostics: Optional[Dict[str, Any]],
+    outcome: Dict[str, Any],
+    timer: Optional[StepTimer] = None,
+) -> Optional[Dict[str, Any]]:
+    """Strategies in the given order until one finds an amount."""
+    for name in order:
+        result = _run_strategy(STRATEGIES_BY_NAME[name], email, document, diagnostics, outcome, timer)
+        if result:
+            outcome["winner"] = name
+            return result
+    return None
+
+
+def _run_checked(
+    email: Email,
+    document: ParsedDocument,
+    order: Sequence[str],
+    learned: Sequence[str],
+    diagnostics: Optional[Dict[str, Any]],
+    outcome: Dict[str, Any],
+    timer: Optional[StepTimer] = None,
+) -> Optional[Dict[str, Any]]:
+    """Every strategy (a sampled request), returning the first hit in `order` and comparing the learned order with the fixed one."""
+    results = {strategy.name: _run_strategy(strategy, email, document, diagnostics, outcome, timer) for strategy in STRATEGIES}
+
+    def first_hit(names: Sequence[str]) -> Optional[str]:
+        return next((name for name in names if results[name]), None)
+
+    if learned != STRATEGY_NAMES:
+        fixed, adaptive = first_hit(STRATEGY_NAMES), first_hit(learned)
+        outcome["order_agreed"] = (results[fixed]["amount"] if fixed else None) == (results[adaptive]["amount"] if adaptive else None)
+    outcome["winner"] = first_hit(order)
+    return results[outcome["winner"]] if outcome["winner"] else None
+
+
+def _template_result(
+    template: BankTemplate,
+    result: Dict[str, Any],
+    email: Email,
+    document: ParsedDocument,
+    diagnostics: Optional[Dict[str, Any]],
+    outcome: Dict[str, Any],
+    timer: Optional[StepTimer] = None,
+) -> Dict[str, Any]:
+    """Result of a template hit, with the template's own name patterns tried first."""
+    with timed(timer, "sender_name"):
+        result["sender_name"] = (
+            template.extract_sender_name(email.html_body, email.text_body)
+            or extract_sender_name(email.html_body, email.text_body)
+        )
+    # Fields sit next to the amount in an alert; the rest of a large body is not read
+    start, end = result["match_span"]
+    body = email.html_body if result["match_part"] == "html" else email.text_body
+    region = body[max(0, start - TEMPLATE_FIELD_WINDOW):end + TEMPLATE_FIELD_WINDOW]
+    with timed(timer, "transaction_fields"):
+        result.update(transaction_fields((region,)))
+    with timed(timer, "amount_in_words"):
+        _check_words(result, email, diagnostics)
+    _note(diagnostics, "steps", f"Extraction successful: template ({template.name})")
+    outcome["winner"] = "template"
+    return result
@@ -0,0 +1,136 @@
+"""
+Currency keywords and amounts written in words.
+
+Amounts found by the scanner carry the currency marker next to them ("NGN",
+"₦", "naira", "usd"...), so a strategy hit already knows its currency and the
+body does not have to be searched for keywords. find_currency() is the
+fallback for a result without a marker: each buffer is searched on its own
+(no concatenated copy), a keyword must be a whole word ("euro" but not
+"europe") and "$" only counts before a digit, since inline CSS and JavaScript
+are full of them.
+
+Amounts in words ("Five Thousand, Two Hundred and Fifty Naira Only") are read
+from a short window before each "naira" or "only", so the number-word pattern
+never runs over the whole body.
+"""
+
+import re
+from typing import Dict, Iterator, List, Optional
+
+from extractor.patterns import compile_pattern
+
+# Currency codes, in the order find_currency prefers them
+CURRENCIES = {
+    "NGN": ["ngn", "naira", "₦", "nigeria naira"],
+    "USD": ["usd", "dollar", "$", "us dollar"],
+    "GBP": ["gbp", "pound", "£", "british pound"],
+    "EUR": ["eur", "euro", "€"],
+}
+
+# Word to number conversion (Nigerian format)
+WORD_TO_NUMBER = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    "hundred": 100, "thousand": 1000, "million": 1000000, "billion": 1000000000,
+}
+
+CURRENCY_BY_KEYWORD: Dict[str, str] = {
+    keyword: currency for currency, keywords in CURRENCIES.items() for keyword in keywords
+}
+
+# Words that end an amount in words, and how far before them the amount may start
+WORDS_TERMINATORS = ("naira", "only")
+WORDS_WINDOW = 300
+
+_NUMBER_WORDS = "|".join(sorted(WORD_TO_NUMBER, key=len, reverse=True))  # "seventeen" before "seven"
+_NUMBER_WORD = r'(?<![a-z])(?:' + _NUMBER_WORDS + r')(?![a-z])'
+# Two or more number words ending where the window ends (just before the terminator);
+# repeats are bounded, like the scanner's (see benchmarks.bench_redos)
+AMOUNT_WORDS_RE = compile_pattern(
+    _NUMBER_WORD + r'(?:[\s,\-]{1,4}(?:and\s{1,4})?' + _NUMBER_WORD + r'){1,15}[\s,\-]{0,4}\Z',
+    re.IGNORECASE,
+    name="amount_words",
+)
+NUMBER_WORD_RE = compile_pattern(_NUMBER_WORDS, re.IGNORECASE, name="number_word")
+
+
+def currency_code(marker: Optional[str]) -> Optional[str]:
+    """Currency code of a keyword or symbol ("Naira" -> NGN, "dollars" -> USD), or None."""
+    if not marker:
+        return None
+    marker = marker.lower()
+    return CURRENCY_BY_KEYWORD.get(marker) or CURRENCY_BY_KEYWORD.get(marker[:-1] if marker.endswith("s") else "")
+
+
+def _lowered(body: str) -> Optional[str]:
+    """Lowercased body for substring search, or None when lowercasing moves positions (e.g. "İ")."""
+    lowered = body.lower()
+    return lowered if len(lowered) == len(body) else None
+
+
+def _keyword_positions(lowered: str, keyword: str) -> Iterator[int]:
+    """Start of every whole-word occurrence of a lowercase keyword ("$" only before a digit)."""
+    start = lowered.find(keyword)
+    while start != -1:
+        end = start + len(keyword)
+        if keyword == "$":
+            whole = lowered[end:end + 2].lstrip(" ")[:1].isdigit()
+        elif keyword[0].isalpha():
+            before = lowered[start - 1] if start else ""
+            after = lowered[end + 1:end + 2] if lowered[end:end + 1] == "s" else lowered[end:end + 1]  # "dollars"
+            whole = not (before.isalpha() or after.isalpha())
+        else:
+            whole = True  # ₦ £ €
+        if whole:
+            yield start
+        start = lowered.find(keyword, start + 1)
+
+
+def find_currency(*bodies: Optional[str]) -> Optional[str]:
+    """First currency of CURRENCIES mentioned in any of the bodies, or None."""
+    lowered = [body.lower() for body in bodies if body]
+    for currency, keywords in CURRENCIES.items():
+        for body in lowered:
+            for keyword in keywords:
+                if next(_keyword_positions(body, keyword), None) is not None:
+                    return currency
+    return None
+
+
+def words_to_number(phrase: str) -> int:
+    """Value of a phrase of number words ("two hundred and fifty thousand" -> 250000)."""
+    total = current = 0
+    for word in NUMBER_WORD_RE.findall(phrase):
+        value = WORD_TO_NUMBER[word.lower()]
+        if value == 100:
+            current = (current or 1) * 100
+        elif value >= 1000:
+            total += (current or 1) * value
+            current = 0
+        else:
+            current += value
+    return total + current
+
+
+def amounts_in_words(body: Optional[str]) -> List[int]:
+    """Every amount written in words before "naira" or "only", in position order."""
+    if not body:
+        return []
+    lowered = _lowered(body)
+    if lowered is None:
+        return []
+    ends = sorted(
+        position
+        for terminator in WORDS_TERMINATORS
+        for position in _keyword_positions(lowered, terminator)
+    )
+    amounts = []
+    for end in ends:
+        match = AMOUNT_WORDS_RE.search(body, max(0, end - WORDS_WINDOW), end)
+        if match:
+            amounts.append(words_to_number(match.group()))
+    return amounts
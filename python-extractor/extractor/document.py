@@ -0,0 +1,153 @@
+"""
+Parsed HTML document shared by every extraction strategy of one request.
+The tree is built once, on first use, with a selectable parser backend.
+
+The "stream" backend builds no tree: cells are parsed incrementally by
+extractor.stream.CellStream and the parse stops where the caller stops reading.
+"""
+
+import functools
+import logging
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from extractor.patterns import budget_paused
+from extractor.profiling import StepTimer, timed
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("html.parser", "lxml", "selectolax", "stream")
+DEFAULT_BACKEND = os.getenv("EXTRACTOR_HTML_PARSER", "html.parser")
+
+_unavailable_logged = set()
+
+
+@functools.lru_cache(maxsize=None)
+def backend_available(backend: str) -> bool:
+    """Check whether the libraries behind a parser backend are installed (checked once per backend)."""
+    # The first check imports the parser; a worker's first email should not pay for it in its regex budget
+    try:
+        with budget_paused():
+            return _import_backend(backend)
+    except ImportError:
+        return False
+
+
+def _import_backend(backend: str) -> bool:
+    if backend == "html.parser":
+        import bs4  # noqa: F401
+    elif backend == "lxml":
+        import bs4  # noqa: F401
+        import lxml  # noqa: F401
+    elif backend == "selectolax":
+        import selectolax.lexbor  # noqa: F401
+    elif backend != "stream":
+        return False
+    return True
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """Return the requested backend, or a fallback when it cannot be used.
+
+    The fallback is html.parser, or the stdlib-only stream backend when
+    BeautifulSoup is not installed either (script mode on shared hosting).
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend_available(backend):
+        return backend
+    fallback = "html.parser" if backend_available("html.parser") else "stream"
+    if backend not in _unavailable_logged:
+        _unavailable_logged.add(backend)
+        logger.warning(f"HTML parser backend '{backend}' is not available, using {fallback}")
+    return fallback
+
+
+class ParsedDocument:
+    """Lazily parsed view of one email's HTML body."""
+
+    def __init__(self, html: Optional[str], backend: Optional[str] = None, timer: Optional[StepTimer] = None):
+        self.html = html or ""
+        self.backend = resolve_backend(backend)
+        self.timer = timer
+        self._tree = None
+        self._cells: Optional[Iterable[Tuple[str, Optional[str]]]] = None
+        self._text: Optional[str] = None
+
+    @property
+    def tree(self):
+        """The backend's parse tree (BeautifulSoup, selectolax LexborHTMLParser or CellStream)."""
+        if self._tree is None:
+            with timed(self.timer, "html_parse"), budget_paused():
+                self._tree = self._parse()
+        return self._tree
+
+    def _parse(self):
+        if self.backend == "stream":
+            from extractor.stream import CellStream
+            return CellStream(self.html)
+        if self.backend == "selectolax":
+            from selectolax.lexbor import LexborHTMLParser
+            tree = LexborHTMLParser(self.html)
+            # BeautifulSoup leaves style/script contents out of get_text(); match it
+            tree.strip_tags(['style', 'script'])
+            return tree
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(self.html, self.backend)
+
+    def cells(self) -> Iterable[Tuple[str, Optional[str]]]:
+        """Text of every <td> in document order, paired with the text of its next sibling <td>."""
+        if self._cells is None:
+            if self.backend == "stream":
+                # Re-iterable and lazy: parsing advances only as far as the caller reads
+                self._cells = self.tree
+            elif self.backend == "selectolax":
+                with budget_paused():
+                    self._cells = self._selectolax_cells()
+            else:
+                with budget_paused():
+                    self._cells = self._soup_cells()
+        return self._cells
+
+    def parsed_cells(self) -> List[Tuple[str, Optional[str]]]:
+        """Cells available without parsing more of a streamed document (all cells otherwise)."""
+        if self.backend == "stream":
+            return self.tree.parsed()
+        return list(self.cells())
+
+    def _soup_cells(self) -> List[Tuple[str, Optional[str]]]:
+        cells = []
+        for td in self.tree.find_all('td'):
+            next_td = td.find_next_sibling('td')
+            cells.append((
+                td.get_text(strip=True),
+                next_td.get_text(strip=True) if next_td is not None else None,
+            ))
+        return cells
+
+    def _selectolax_cells(self) -> List[Tuple[str, Optional[str]]]:
+        cells = []
+        for td in self.tree.css('td'):
+            next_td = td.next
+            while next_td is not None and next_td.tag != 'td':
+                next_td = next_td.next
+            cells.append((
+                td.text(strip=True),
+                next_td.text(strip=True) if next_td is not None else None,
+            ))
+        return cells
+
+    def text(self) -> str:
+        """All text of the document, whitespace-stripped and joined with single spaces."""
+        if self._text is None:
+            with timed(self.timer, "html_render_text"), budget_paused():
+                self._text = self._render_text()
+        return self._text
+
+    def _render_text(self) -> str:
+        if self.backend == "stream":
+            return self.tree.text()
+        if self.backend == "selectolax":
+            root = self.tree.root
+            chunks = root.text(separator='\x00', strip=True).split('\x00') if root is not None else []
+            return ' '.join(chunk for chunk in chunks if chunk)
+        return self.tree.get_text(separator=' ', strip=True)
@@ -0,0 +1,20 @@
+"""
+JSON encoding for lean responses: orjson when installed, else the standard library.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON for plain dicts, lists, strings, numbers and None."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,90 @@
+"""
+Transaction fields besides amount and sender: account numbers, the numeric
+description field, value date and narration.
+
+They are read from the field candidates the scanner already collected for each
+body, so getting them costs no extra pass. The description field split follows
+App\\Services\\DescriptionFieldExtractor on the Laravel side.
+"""
+
+import datetime
+import html as html_lib
+from typing import Dict, Iterable, Optional
+
+from extractor.patterns import compile_pattern
+from extractor.scanner import scan_body
+
+# First run of 20+ digits in a description line (GTBank packs accounts and dates into 43)
+DESCRIPTION_DIGITS_RE = compile_pattern(r'\d{20,}', name="description_digits")
+NARRATION_WHITESPACE_RE = compile_pattern(r'\s+', name="narration_whitespace")
+
+# Tried in order, day first as in Nigerian bank alerts
+VALUE_DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y", "%Y-%m-%d", "%Y/%m/%d", "%d/%m/%y", "%d-%m-%y")
+
+FIELDS = ("account_number", "payer_account_number", "description_field", "extracted_date", "value_date", "narration")
+
+
+def normalize_date(raw: str) -> str:
+    """YYYY-MM-DD for a date in one of VALUE_DATE_FORMATS, else the input unchanged."""
+    for date_format in VALUE_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(raw, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return raw
+
+
+def parse_description_field(digits: str) -> Dict[str, Optional[str]]:
+    """
+    Split a description field into account number, payer account number and date.
+
+    43 digits (42 padded with a trailing 0) are account (10), payer account (10),
+    amount (6, not reliable and ignored), date YYYYMMDD (8) and reference (9).
+    30-41 digits give both accounts, 20-29 only the first.
+    """
+    parsed = {"account_number": None, "payer_account_number": None, "extracted_date": None}
+    if len(digits) == 42:
+        digits += "0"
+    if len(digits) == 43:
+        try:
+            parsed["extracted_date"] = datetime.datetime.strptime(digits[26:34], "%Y%m%d").date().isoformat()
+        except ValueError:
+            pass
+    if 30 <= len(digits) <= 43:
+        parsed["payer_account_number"] = digits[10:20]
+    if len(digits) >= 20:
+        parsed["account_number"] = digits[:10]
+    return parsed
+
+
+def transaction_fields(bodies: Iterable[Optional[str]]) -> Dict[str, Optional[str]]:
+    """
+    FIELDS found in the given bodies, earlier bodies first.
+
+    A labeled "Account Number" wins over the account packed in the description field.
+    """
+    found: Dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    description_account = None
+    for body in bodies:
+        if not body:
+            continue
+        scanned = scan_body(body)
+        accounts = scanned.field_values("account")
+        if accounts and found["account_number"] is None:
+            found["account_number"] = accounts[0]
+        value_dates = scanned.field_values("value_date")
+        if value_dates and found["value_date"] is None:
+            found["value_date"] = normalize_date(value_dates[0])
+        for line in scanned.field_values("description"):
+            narration = NARRATION_WHITESPACE_RE.sub(" ", html_lib.unescape(line)).strip(" :-")
+            if narration and found["narration"] is None:
+                found["narration"] = narration
+            digits = DESCRIPTION_DIGITS_RE.search(line)
+            if digits and found["description_field"] is None:
+                found["description_field"] = digits.group(0)
+                parsed = parse_description_field(digits.group(0))
+                description_account = parsed["account_number"]
+                found["payer_account_number"] = parsed["payer_account_number"]
+                found["extracted_date"] = parsed["extracted_date"]
+    found["account_number"] = found["account_number"] or description_account
+    return found
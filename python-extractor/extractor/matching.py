@@ -0,0 +1,343 @@
+"""
+In-memory index of pending payments, for ranking the payments an extracted
+email may belong to (what PaymentMatchingService::matchEmail queries for).
+
+Payments are indexed by amount bucket and by sender-name trigram, so a lookup
+only scores the payments whose amount is within tolerance (3% by default, as
+PHP allows for Moniepoint) or, without an amount, those sharing name trigrams
+with the sender. Each candidate gets:
+
+  name_similarity   PHP similar_text() percentage, so Laravel's 50% / 75%
+                    thresholds apply unchanged
+  name_overlap      Dice coefficient of the name trigram sets
+  amount_difference received minus expected amount
+  account_match     the email's account number equals the payment's
+  score             SCORE_WEIGHTS applied to the three, 0-1
+
+The snapshot is pushed over the API or loaded from a JSONL file (one payment
+per line: id, amount, payer_name, account_number, created_at, email_account_id)
+that is re-read when it changes, like the bank template directory.
+"""
+
+import datetime
+import email.utils
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the received amount a pending payment may differ by, and the
+# smallest window in Naira (PHP matches other banks within ±1)
+AMOUNT_TOLERANCE = float(os.getenv("EXTRACTOR_MATCH_AMOUNT_TOLERANCE", "0.03"))
+MIN_AMOUNT_WINDOW = 1.0
+
+# Without an amount, only payments whose name trigrams overlap this much are scored
+MIN_NAME_OVERLAP = 0.3
+
+SCORE_WEIGHTS = {"name": 0.6, "amount": 0.3, "account": 0.1}
+
+
+class PendingPayment(NamedTuple):
+    payment_id: str
+    amount: float
+    payer_name: Optional[str]
+    account_number: Optional[str]
+    created_at: Optional[str]
+    email_account_id: Optional[int]
+    created_ts: Optional[float]
+    name: str
+    trigrams: FrozenSet[str]
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Lowercase with single spaces, as matchNames compares names."""
+    return " ".join((name or "").lower().split())
+
+
+def name_trigrams(name: str) -> FrozenSet[str]:
+    """Trigrams of each word padded like pg_trgm ("  jo", " jon", "joh", ..., "hn ")."""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similar_text(first: str, second: str) -> float:
+    """PHP's similar_text() percentage: characters in common (longest common substrings, recursively) over the average length."""
+    if not first and not second:
+        return 0.0
+    common = 0
+    pending = [(first, second)]
+    while pending:
+        left, right = pending.pop()
+        if not left or not right:
+            continue
+        # Longest common substring; the first one found wins, as in PHP
+        best, best_left, best_right = 0, 0, 0
+        previous = [0] * (len(right) + 1)
+        for i, char in enumerate(left):
+            current = [0] * (len(right) + 1)
+            for j, other in enumerate(right):
+                if char == other:
+                    length = previous[j] + 1
+                    current[j + 1] = length
+                    start_left, start_right = i - length + 1, j - length + 1
+                    if length > best or (length == best and (start_left, start_right) < (best_left, best_right)):
+                        best, best_left, best_right = length, start_left, start_right
+            previous = current
+        if best:
+            common += best
+            pending.append((left[:best_left], right[:best_right]))
+            pending.append((left[best_left + best:], right[best_right + best:]))
+    return common * 200.0 / (len(first) + len(second))
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds of an ISO 8601 or RFC 2822 date (naive dates are UTC), else None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        parsed = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = email.utils.parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def payment_from_row(row: Dict[str, Any]) -> PendingPayment:
+    """PendingPayment from a payments row; ValueError when it has no id or no positive amount."""
+    payment_id = row.get("id", row.get("transaction_id"))
+    if payment_id is None or payment_id == "":
+        raise ValueError("payment has no id")
+    amount = float(row.get("amount") or 0)
+    if not amount > 0 or math.isinf(amount):
+        raise ValueError(f"payment {payment_id} has no positive amount")
+    name = normalize_name(row.get("payer_name"))
+    account_id = row.get("email_account_id")
+    return PendingPayment(
+        payment_id=str(payment_id),
+        amount=amount,
+        payer_name=row.get("payer_name"),
+        account_number=row.get("account_number") or None,
+        created_at=row.get("created_at"),
+        email_account_id=int(account_id) if account_id not in (None, "") else None,
+        created_ts=parse_timestamp(row.get("created_at")),
+        name=name,
+        trigrams=name_trigrams(name),
+    )
+
+
+class PaymentIndex:
+    """Pending payments indexed by amount bucket and name trigram."""
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 5.0, tolerance: float = AMOUNT_TOLERANCE):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.tolerance = tolerance
+        # Buckets are powers of (1 + tolerance): a tolerance window spans at most three
+        self._bucket_step = math.log1p(max(tolerance, 0.001))
+        self._payments: Dict[str, PendingPayment] = {}
+        self._by_bucket: Dict[int, set] = {}
+        self._by_trigram: Dict[str, set] = {}
+        self._signature: Tuple = ()
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self.reload(force=True)
+
+    def __len__(self) -> int:
+        return len(self._payments)
+
+    def _bucket(self, amount: float) -> int:
+        return math.floor(math.log(amount) / self._bucket_step)
+
+    def _add(self, payment: PendingPayment) -> None:
+        self._discard(payment.payment_id)
+        self._payments[payment.payment_id] = payment
+        self._by_bucket.setdefault(self._bucket(payment.amount), set()).add(payment.payment_id)
+        for gram in payment.trigrams:
+            self._by_trigram.setdefault(gram, set()).add(payment.payment_id)
+
+    def _discard(self, payment_id: str) -> bool:
+        payment = self._payments.pop(payment_id, None)
+        if payment is None:
+            return False
+        bucket = self._bucket(payment.amount)
+        self._by_bucket[bucket].discard(payment_id)
+        if not self._by_bucket[bucket]:
+            del self._by_bucket[bucket]
+        for gram in payment.trigrams:
+            self._by_trigram[gram].discard(payment_id)
+            if not self._by_trigram[gram]:
+                del self._by_trigram[gram]
+        return True
+
+    def _parse_rows(self, rows: Iterable[Dict[str, Any]]) -> Tuple[List[PendingPayment], int]:
+        payments, rejected = [], 0
+        for row in rows:
+            try:
+                payments.append(payment_from_row(row))
+            except (TypeError, ValueError) as e:
+                rejected += 1
+                logger.warning(f"Skipping pending payment: {e}")
+        return payments, rejected
+
+    def replace(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Replace the whole snapshot. Returns pending and rejected counts."""
+        payments, rejected = self._parse_rows(rows)
+        with self._lock:
+            self._payments, self._by_bucket, self._by_trigram = {}, {}, {}
+            for payment in payments:
+                self._add(payment)
+            return {"pending": len(self._payments), "rejected": rejected}
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Add payments, or update them by id. Returns pending and rejected counts."""
+        payments, rejected = self._parse_rows(rows)
+        with self._lock:
+            for payment in payments:
+                self._add(payment)
+            return {"pending": len(self._payments), "rejected": rejected}
+
+    def remove(self, payment_ids: Iterable[str]) -> int:
+        """Drop matched or expired payments. Returns how many were pending."""
+        with self._lock:
+            return sum(self._discard(str(payment_id)) for payment_id in payment_ids)
+
+    def _scan(self) -> Tuple:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return ()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the JSONL file if it changed. Returns True when reloaded."""
+        if not self.path:
+            return False
+        signature = self._scan()
+        self._checked_at = time.monotonic()
+        if not force and signature == self._signature:
+            return False
+        rows = []
+        if signature:
+            with open(self.path, encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError as e:
+                        logger.warning(f"Skipping line {number} of {self.path}: {e}")
+        counts = self.replace(rows)
+        self._signature = signature
+        logger.info(f"Loaded {counts['pending']} pending payment(s) from {self.path}")
+        return True
+
+    def maybe_reload(self) -> None:
+        """Cheap per-request check; re-reads the file at most once per reload_interval."""
+        if self.path and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+    def _amount_candidates(self, amount: float, window: float) -> List[PendingPayment]:
+        low, high = max(amount - window, 1e-9), amount + window
+        payments = []
+        for bucket in range(self._bucket(low), self._bucket(high) + 1):
+            for payment_id in self._by_bucket.get(bucket, ()):
+                payment = self._payments[payment_id]
+                if low <= payment.amount <= high:
+                    payments.append(payment)
+        return payments
+
+    def _name_candidates(self, trigrams: FrozenSet[str]) -> List[PendingPayment]:
+        payment_ids = set().union(*(self._by_trigram.get(gram, ()) for gram in trigrams))
+        return [self._payments[payment_id] for payment_id in payment_ids]
+
+    def match(
+        self,
+        amount: Optional[float] = None,
+        sender_name: Optional[str] = None,
+        account_number: Optional[str] = None,
+        email_date: Any = None,
+        email_account_id: Optional[int] = None,
+        tolerance: Optional[float] = None,
+        limit: int = 10,
+    ) -> Dict[str, Any]:
+        """
+        Pending payments the email may belong to, best first.
+
+        Only payments created before email_date (when both are known) and, when
+        email_account_id is given, payments on that email account qualify.
+        "considered" is how many payments were scored. ValueError when amount is
+        given but not a positive, finite number.
+        """
+        if amount and not 0 < amount < math.inf:
+            raise ValueError(f"amount must be positive, got {amount}")
+        self.maybe_reload()
+        tolerance = self.tolerance if tolerance is None else tolerance
+        name = normalize_name(sender_name)
+        trigrams = name_trigrams(name)
+        email_ts = parse_timestamp(email_date)
+
+        with self._lock:
+            if amount:
+                window = max(amount * tolerance, MIN_AMOUNT_WINDOW)
+                payments = self._amount_candidates(amount, window)
+            elif trigrams:
+                window = 0.0
+                payments = self._name_candidates(trigrams)
+            else:
+                payments = []
+
+        # Every filter and score is computed over the whole candidate list at once
+        if email_account_id is not None:
+            payments = [p for p in payments if p.email_account_id in (None, email_account_id)]
+        if email_ts is not None:
+            payments = [p for p in payments if p.created_ts is None or p.created_ts <= email_ts]
+        overlaps = [
+            2 * len(trigrams & p.trigrams) / (len(trigrams) + len(p.trigrams)) if trigrams and p.trigrams else 0.0
+            for p in payments
+        ]
+        if not amount:
+            kept = [i for i, overlap in enumerate(overlaps) if overlap >= MIN_NAME_OVERLAP]
+            payments, overlaps = [payments[i] for i in kept], [overlaps[i] for i in kept]
+        similarities = [similar_text(p.name, name) if name and p.name else 0.0 for p in payments]
+        differences = [amount - p.amount if amount else None for p in payments]
+        closeness = [1 - abs(d) / window if d is not None and window else 0.0 for d in differences]
+        accounts = [bool(account_number) and p.account_number == account_number for p in payments]
+        scores = [
+            SCORE_WEIGHTS["name"] * s / 100 + SCORE_WEIGHTS["amount"] * c + SCORE_WEIGHTS["account"] * a
+            for s, c, a in zip(similarities, closeness, accounts)
+        ]
+
+        # Best score first, then the newest payment, as matchEmail tries them
+        order = sorted(range(len(payments)), key=lambda i: (-scores[i], -(payments[i].created_ts or 0.0)))
+        candidates = []
+        for i in order[:limit]:
+            payment = payments[i]
+            candidates.append({
+                "payment_id": payment.payment_id,
+                "amount": payment.amount,
+                "payer_name": payment.payer_name,
+                "account_number": payment.account_number,
+                "created_at": payment.created_at,
+                "name_similarity": round(similarities[i], 2),
+                "name_overlap": round(overlaps[i], 4),
+                "amount_difference": round(differences[i], 2) if differences[i] is not None else None,
+                "account_match": accounts[i],
+                "score": round(scores[i], 4),
+            })
+        return {"candidates": candidates, "considered": len(payments), "pending": len(self._payments)}
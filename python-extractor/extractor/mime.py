@@ -0,0 +1,69 @@
+"""
+Decode raw RFC 822 messages into the fields the extraction strategies use.
+
+Only the first text/plain and the first text/html part are decoded (transfer
+encoding and charset); attachments and every other part are skipped.
+"""
+
+import email
+import email.parser
+import email.policy
+import email.utils
+from typing import Any, Dict, Optional
+
+
+def _part_text(part) -> Optional[str]:
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError, ValueError):
+        # Unknown or lying charset: decode the bytes ourselves
+        payload = part.get_payload(decode=True)
+        if payload is None:
+            return None
+        return payload.decode("utf-8", errors="replace")
+
+
+def _header(message, name: str) -> str:
+    try:
+        value = message.get(name)
+    except (TypeError, ValueError, IndexError):
+        # Malformed header the policy could not parse; fall back to the raw value
+        value = message.get_all(name, [""])[0] if hasattr(message, "get_all") else ""
+    return str(value or "").strip()
+
+
+def decode_message(raw: bytes) -> Dict[str, Any]:
+    """Subject, sender address, Message-ID, date and decoded text/html bodies of a raw message."""
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+
+    text_body = None
+    html_body = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain" and text_body is None:
+            text_body = _part_text(part)
+        elif content_type == "text/html" and html_body is None:
+            html_body = _part_text(part)
+        if text_body is not None and html_body is not None:
+            break
+
+    return {
+        "subject": _header(message, "subject"),
+        "from_email": email.utils.parseaddr(_header(message, "from"))[1],
+        "message_id": _header(message, "message-id") or None,
+        "email_date": _header(message, "date") or None,
+        "text_body": text_body,
+        "html_body": html_body,
+    }
+
+
+def decode_headers(raw: bytes) -> Dict[str, Any]:
+    """Sender address, Message-ID and date of a raw message, without parsing its body."""
+    message = email.parser.BytesHeaderParser(policy=email.policy.default).parsebytes(raw)
+    return {
+        "from_email": email.utils.parseaddr(_header(message, "from"))[1],
+        "message_id": _header(message, "message-id") or None,
+        "email_date": _header(message, "date") or None,
+    }
@@ -0,0 +1,145 @@
+"""
+Registry of the extractor's regexes, an optional linear-time engine and a
+per-request time budget.
+
+Every module-level pattern is compiled through compile_pattern() under a name,
+so benchmarks.bench_redos can fuzz all of them. With
+EXTRACTOR_REGEX_ENGINE=re2 patterns are compiled with google-re2 (linear time,
+no backtracking) when it is installed; patterns RE2 cannot express, such as
+lookarounds, keep using re.
+
+regex_budget() bounds how long one extraction may spend matching. The linear
+patterns take time in proportion to the body, so budget_for() grants
+EXTRACTOR_REGEX_BUDGET_MS plus EXTRACTOR_REGEX_BUDGET_MS_PER_MB per MiB of
+body: a large valid email still extracts, while a pattern that backtracks
+(super-linearly) runs out of it. It arms a
+SIGALRM timer; sre checks for pending signals while it backtracks, so a
+runaway match is interrupted as well. HTML parsing runs under budget_paused(),
+which stops the clock: parse time grows with the size of the markup, not with
+how a pattern backtracks, and is not what the budget guards against. Signals
+only reach the main thread, so elsewhere the budget is not enforced.
+"""
+
+import logging
+import os
+import re
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+ENGINE = os.getenv("EXTRACTOR_REGEX_ENGINE", "re")
+REGEX_BUDGET_MS = float(os.getenv("EXTRACTOR_REGEX_BUDGET_MS", "250"))
+REGEX_BUDGET_MS_PER_MB = float(os.getenv("EXTRACTOR_REGEX_BUDGET_MS_PER_MB", "100"))
+
+# name -> compiled pattern, and name -> engine that compiled it ("re" or "re2")
+REGISTRY: Dict[str, Any] = {}
+ENGINES: Dict[str, str] = {}
+
+_INLINE_FLAGS = ((re.IGNORECASE, "i"), (re.DOTALL, "s"), (re.MULTILINE, "m"))
+
+_re2_module = None
+_re2_checked = False
+_armed = False
+_paused = False
+
+
+class RegexBudgetExceeded(TimeoutError):
+    """Raised inside an extraction that ran past its regex time budget."""
+
+
+def _re2():
+    global _re2_module, _re2_checked
+    if not _re2_checked:
+        _re2_checked = True
+        try:
+            import re2
+            _re2_module = re2
+        except ImportError:
+            logger.warning("EXTRACTOR_REGEX_ENGINE=re2 but google-re2 is not installed, using re")
+    return _re2_module
+
+
+def _compile_re2(pattern: str, flags: int):
+    re2 = _re2()
+    if re2 is None:
+        return None
+    inline = "".join(letter for flag, letter in _INLINE_FLAGS if flags & flag)
+    options = re2.Options()
+    options.log_errors = False
+    try:
+        return re2.compile(f"(?{inline}){pattern}" if inline else pattern, options)
+    except re2.error:
+        return None
+
+
+def compile_pattern(pattern: str, flags: int = 0, name: Optional[str] = None, engine: Optional[str] = None):
+    """Compile with the configured engine, falling back to re; registered under `name` when given."""
+    engine = engine or ENGINE
+    compiled = _compile_re2(pattern, flags) if engine == "re2" else None
+    used = "re2"
+    if compiled is None:
+        if engine == "re2" and _re2() is not None:
+            logger.info(f"Pattern {name or pattern!r} is not supported by re2, using re")
+        compiled = re.compile(pattern, flags)
+        used = "re"
+    if name:
+        REGISTRY[name] = compiled
+        ENGINES[name] = used
+    return compiled
+
+
+def budget_for(length: int) -> float:
+    """Budget in milliseconds for an email of `length` characters (0 when the budget is disabled)."""
+    if REGEX_BUDGET_MS <= 0:
+        return 0.0
+    return REGEX_BUDGET_MS + REGEX_BUDGET_MS_PER_MB * length / (1024 * 1024)
+
+
+def _on_alarm(signum, frame):
+    if _armed:
+        raise RegexBudgetExceeded("Regex time budget exceeded")
+
+
+@contextmanager
+def regex_budget(milliseconds: float = REGEX_BUDGET_MS) -> Iterator[None]:
+    """Raise RegexBudgetExceeded in the enclosed block once it runs longer than `milliseconds`."""
+    global _armed
+    if (
+        milliseconds <= 0
+        or _armed
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    _armed = True
+    signal.setitimer(signal.ITIMER_REAL, milliseconds / 1000)
+    try:
+        yield
+    finally:
+        # Disarm first: an alarm landing between these lines is then ignored
+        _armed = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+@contextmanager
+def budget_paused() -> Iterator[None]:
+    """Stop the clock of the running regex_budget() for the enclosed block (a no-op outside one)."""
+    global _paused
+    if not _armed or _paused:
+        yield
+        return
+    remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+    _paused = True
+    try:
+        yield
+    finally:
+        _paused = False
+        # A budget that ran out right as the block started is enforced on resuming
+        if _armed:
+            signal.setitimer(signal.ITIMER_REAL, max(remaining, 1e-6))
@@ -0,0 +1,173 @@
+"""
+Opt-in per-request profiling and a spool of slow requests.
+
+A StepTimer records wall and CPU time per strategy and per helper (HTML parse,
+sender name, currency, transaction fields...) of one extraction; core.extract
+reports them in diagnostics["profile"]. Steps are inclusive: the HTML parse
+is also counted in the strategy that triggered it.
+
+A SlowSpool keeps, for each request over its threshold, a redacted copy of the
+request (replayable with `python -m benchmarks.run --spool DIR`), the step
+timings and the cProfile stats (a .prof file and the top functions as text).
+"""
+
+import io
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Functions listed in a spool entry's text stats, by cumulative time
+STATS_LIMIT = 40
+
+# Redaction: long digit runs (account numbers, description fields) and email local parts
+ACCOUNT_DIGITS_RE = re.compile(r'\d{10,}')
+EMAIL_LOCAL_RE = re.compile(r'[\w.+\-]+(?=@[\w\-]+\.[\w.\-]+)')
+
+
+class StepTimer:
+    """Wall and CPU milliseconds per named step of one extraction."""
+
+    def __init__(self):
+        self.steps: Dict[str, Dict[str, float]] = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            entry = self.steps.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0, "calls": 0})
+            entry["wall_ms"] += (time.perf_counter() - wall) * 1000
+            entry["cpu_ms"] += (time.thread_time() - cpu) * 1000
+            entry["calls"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """{"wall_ms", "cpu_ms", "steps"} since the timer was created, rounded to microseconds."""
+        return {
+            "wall_ms": round((time.perf_counter() - self._wall) * 1000, 3),
+            "cpu_ms": round((time.thread_time() - self._cpu) * 1000, 3),
+            "steps": {
+                name: {"wall_ms": round(entry["wall_ms"], 3), "cpu_ms": round(entry["cpu_ms"], 3), "calls": entry["calls"]}
+                for name, entry in self.steps.items()
+            },
+        }
+
+
+def timed(timer: Optional[StepTimer], name: str):
+    """timer.step(name), or a no-op context when profiling is off."""
+    return timer.step(name) if timer is not None else nullcontext()
+
+
+def profile_stats(profile: Any, limit: int = STATS_LIMIT) -> str:
+    """The top `limit` functions of a cProfile.Profile by cumulative time, as pstats prints them."""
+    import pstats
+
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+def _mask_names(text: str, names: Iterable[str]) -> str:
+    for name in names:
+        text = re.sub(re.escape(name), lambda match: "X" * len(match.group()), text, flags=re.IGNORECASE)
+    return text
+
+
+def redact(request: Dict[str, Any], names: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Copy of a request with account numbers (10+ digits) zeroed, email local
+    parts and the given names (e.g. the extracted sender name) masked. Lengths
+    and markup are kept, so the copy costs about as much to extract.
+    """
+    names = sorted({word for name in names if name for word in name.split() if len(word) >= 3}, key=len, reverse=True)
+    redacted = dict(request)
+    for key in ("subject", "from_email", "text_body", "html_body"):
+        value = redacted.get(key)
+        if not value:
+            continue
+        value = ACCOUNT_DIGITS_RE.sub(lambda match: "0" * len(match.group()), value)
+        value = EMAIL_LOCAL_RE.sub(lambda match: "x" * len(match.group()), value)
+        redacted[key] = _mask_names(value, names)
+    return redacted
+
+
+class SlowSpool:
+    """Directory of slow-request captures, oldest removed past max_entries."""
+
+    def __init__(self, directory: Optional[str], threshold_ms: float = 1000.0, max_entries: int = 200):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.threshold_ms > 0
+
+    def is_slow(self, seconds: float) -> bool:
+        return self.enabled and seconds * 1000 >= self.threshold_ms
+
+    def write(
+        self,
+        request: Dict[str, Any],
+        response: Dict[str, Any],
+        seconds: float,
+        profile: Optional[Dict[str, Any]] = None,
+        stats: Optional[Any] = None,
+    ) -> Optional[str]:
+        """Write one capture (`stats` is a cProfile.Profile); returns its JSON file's path, or None on error."""
+        data = response.get("data") or {}
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+        name = f"{stamp}-{request.get('email_id') or 0}-{os.urandom(3).hex()}"
+        entry = {
+            "captured_at": now,
+            "wall_ms": round(seconds * 1000, 3),
+            "threshold_ms": self.threshold_ms,
+            "request": redact(request, [data.get("sender_name")]),
+            "result": {"success": response.get("success"), "source": data.get("source"), "errors": response.get("errors")},
+            "profile": profile,
+            "stats": profile_stats(stats) if stats is not None else None,
+        }
+        path = os.path.join(self.directory, f"{name}.json")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if stats is not None:
+                stats.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            temporary = f"{path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temporary, path)
+            self.prune()
+        except OSError as e:
+            logger.error(f"Could not write slow request capture to {self.directory}: {e}")
+            return None
+        logger.warning(f"Slow extraction of email {request.get('email_id')} ({seconds * 1000:.0f} ms) captured to {path}")
+        return path
+
+    def prune(self) -> None:
+        """Remove the oldest captures (and their .prof files) beyond max_entries."""
+        captures = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in captures[:max(0, len(captures) - self.max_entries)]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-len(".json")] + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+def load_spool(directory: str) -> List[Dict[str, Any]]:
+    """The redacted requests of every capture in a spool directory, oldest first."""
+    requests = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                requests.append(json.load(f)["request"])
+    return requests
@@ -0,0 +1,431 @@
+"""
+Precompiled scanner for amounts and sender names.
+
+One scan of a body yields every candidate amount (with its currency marker)
+and every sender name span, each tagged with a priority tier, plus the labeled
+transaction fields (account number, value date, description line). Strategies
+then pick their best hit from the candidates instead of rescanning the body
+once per pattern. Candidates are found as strategies ask for them, so taking
+the first hit of a tier stops the scan of that tier there.
+
+Each branch is its own pattern, run over a lowercased copy of the body without
+re.IGNORECASE, so sre can skip ahead to the branch's first character instead of
+trying every branch at every offset. Branches that start with one of a few
+keywords or currency markers are only tried where str.find located one; amounts
+followed by a currency word and "CODE-NAME" transfer codes are found from the
+currency word or the dash back. Spans map straight back to the original body,
+where values are read.
+"""
+
+import heapq
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from extractor.amounts import MINOR_PER_MAJOR, parse_minor_parts, to_major
+from extractor.patterns import compile_pattern
+
+# Amount tiers, best first
+TIER_LABELED = 0   # "Amount: NGN 1,000"
+TIER_PREFIXED = 1  # "NGN 1,000"
+TIER_SUFFIXED = 2  # "1,000 naira"
+
+# Name tiers, best first
+NAME_TIER_CELL = 0         # <td>Description</td><td>FROM NAME TO
+NAME_TIER_FROM = 1         # FROM NAME TO
+NAME_TIER_DESCRIPTION = 2  # Description: 123-NAME TRF FOR
+NAME_TIER_CODE = 3         # 123-NAME TRF FOR
+
+AMOUNT_KEYWORD_LIST = ("amount", "sum", "value", "total", "paid", "payment", "deposit", "transfer", "credit")
+NAIRA_MARKER_LIST = ("ngn", "naira", "₦")
+SUFFIX_CURRENCY_LIST = ("naira", "ngn", "usd", "dollar")
+AMOUNT_KEYWORDS = "|".join(AMOUNT_KEYWORD_LIST)
+NAIRA_MARKERS = "|".join(NAIRA_MARKER_LIST)
+# Repeats are bounded so no pattern can backtrack across a long run of digits,
+# whitespace or capitals (see benchmarks.bench_redos); real amounts, codes and
+# names are far shorter than the bounds. A run of digits longer than NUMBER's
+# bounds is not an amount at all: the lookarounds reject it instead of matching
+# (and so truncating) a part of it.
+NUMBER = r'(?<![\d,])[\d,]{1,32}(?![\d,])(?:\.\d{0,32})?(?!\.?\d)'
+NUMBER_MAX_CHARS = 65
+NAME = r'[A-Z][A-Z\s]{1,100}?'
+# NAME in a lowercased body
+LOWER_NAME = r'[a-z][a-z\s]{1,100}?'
+# Between a field label and its value: separators in the same cell, or the end
+# of the label cell and the start of the value cell
+FIELD_GAP = r'(?:[\s:]{1,16}(?:</td>\s{0,16}<td[^<>]*>\s{0,16})?|</td>\s{0,16}<td[^<>]*>\s{0,16})'
+CODE_RUN_MAX_CHARS = 64
+# First look-ahead of _literal_starts
+LITERAL_WINDOW = 1024
+
+AMOUNT_TIERS = (TIER_LABELED, TIER_PREFIXED, TIER_SUFFIXED)
+NAME_TIERS = (NAME_TIER_CELL, NAME_TIER_FROM, NAME_TIER_DESCRIPTION, NAME_TIER_CODE)
+FIELDS = ("account", "value_date", "description")
+# (amount group, currency group) of each tier's pattern
+AMOUNT_GROUPS = {TIER_LABELED: (2, 1), TIER_PREFIXED: (2, 1), TIER_SUFFIXED: (1, 2)}
+
+# The branches, matched against the lowercased body (see lowercased). Plain re:
+# they are tried at chosen offsets with match(), which re2 would pay for by
+# re-encoding the whole body on every call.
+LABELED_RE = compile_pattern(
+    r'(?:' + AMOUNT_KEYWORDS + r')[\s:]+(' + NAIRA_MARKERS + r')\s*(' + NUMBER + r')', name="scanner_labeled", engine="re",
+)
+PREFIXED_RE = compile_pattern(r'(' + NAIRA_MARKERS + r')\s*(' + NUMBER + r')', name="scanner_prefixed", engine="re")
+SUFFIXED_RE = compile_pattern(
+    r'(' + NUMBER + r')\s*(' + "|".join(SUFFIX_CURRENCY_LIST) + r')', name="scanner_suffixed", engine="re",
+)
+NAME_CODE_RE = compile_pattern(
+    r'[\d\-]{1,64}(?:=\d*)?\s*-\s*([a-z][a-z\s]{2,100}?)\s+(?:trf|transfer|for|to)', name="scanner_name_code", engine="re",
+)
+# The dash before the name of a transfer code: every NAME_CODE_RE match has exactly one
+NAME_CODE_DASH_RE = compile_pattern(r'-(?=\s*[a-z])', name="scanner_name_code_dash", engine="re")
+NAME_CELL_RE = compile_pattern(
+    r'<td[^<>]*>[\s]*(?:description|remarks)[\s:]*</td>\s*<td[^<>]*>[\s]*from\s+(' + LOWER_NAME + r')\s+to',
+    name="scanner_name_cell",
+    engine="re",
+)
+NAME_FROM_RE = compile_pattern(r'from\s+(' + LOWER_NAME + r')\s+to', name="scanner_name_from", engine="re")
+# The description line is read by a lookahead, so the name after it is still matched
+DESCRIPTION_RE = compile_pattern(
+    r'description(?=' + FIELD_GAP + r'([^<\r\n]{0,300}))?'
+    r'(?:[\s:]{1,16}(?:=\d+)?\s{0,16}(?:[\d\-\s]{1,64}-)?([a-z][a-z\s]{2,100}?)\s+(?:trf|transfer|for|to))?',
+    name="scanner_description",
+    engine="re",
+)
+ACCOUNT_RE = compile_pattern(
+    r'account\s{0,4}(?:number|no\.?)?' + FIELD_GAP + r'(\d{6,20})(?!\d)', name="scanner_account", engine="re",
+)
+VALUE_DATE_RE = compile_pattern(
+    r'value\s{0,4}date' + FIELD_GAP + r'(\d{1,4}[/\-]\d{1,2}[/\-]\d{2,4})', name="scanner_value_date", engine="re",
+)
+
+# Currency-prefixed amount inside a single table cell
+CURRENCY_AMOUNT_RE = compile_pattern(r'(?:' + NAIRA_MARKERS + r')\s*(' + NUMBER + r')', re.IGNORECASE, name="currency_amount")
+
+# Sender name in parsed table cells: <td>Description</td><td>FROM NAME TO ...</td>
+CELL_NAME_LABEL_RE = compile_pattern(r'(?:description|remarks)[\s:]*', re.IGNORECASE, name="cell_name_label")
+CELL_NAME_VALUE_RE = compile_pattern(r'from\s+(' + NAME + r')\s+to', re.IGNORECASE, name="cell_name_value")
+
+# Leading transfer codes and quoted-printable leftovers in description names
+NAME_CODE_PREFIX_RE = compile_pattern(r'^(?:=\d+|\d+[\-\s])+', name="name_code_prefix")
+NAME_DIGIT_PREFIX_RE = compile_pattern(r'^[\d\-\s]+', name="name_digit_prefix")
+
+
+class AmountCandidate(NamedTuple):
+    tier: int
+    start: int
+    end: int
+    minor: Optional[int]  # kobo/cents; None when the matched digits are not an amount (e.g. ",," or "1,2,,3")
+    currency: str
+    floor: Optional[int] = None  # minor before rounding a third decimal, for minimum checks
+
+    @property
+    def amount(self) -> Optional[float]:
+        return to_major(self.minor)
+
+
+class NameCandidate(NamedTuple):
+    tier: int
+    start: int
+    end: int
+    name: str
+
+
+class FieldCandidate(NamedTuple):
+    field: str   # "account", "value_date" or "description"
+    start: int
+    value: str
+
+
+class _Replay:
+    """Iterate an iterator any number of times: what it produced is replayed, the rest produced on demand."""
+
+    def __init__(self, iterator: Iterator):
+        self._iterator = iterator
+        self._items: List = []
+
+    def __iter__(self) -> Iterator:
+        items = self._items
+        index = 0
+        while True:
+            if index == len(items):
+                item = next(self._iterator, _END)
+                if item is _END:
+                    return
+                items.append(item)
+            yield items[index]
+            index += 1
+
+
+_END = object()
+
+
+class ScanResult:
+    """
+    The amount, name and field candidates of one body. Each branch is scanned
+    only as far as a caller asks: best_amount() stops at the first amount it
+    accepts and first_name() at the first name of its tier, as the per-pattern
+    searches the scanner replaced did; later calls pick up where they stopped.
+    """
+
+    def __init__(self, body: Optional[str]):
+        self.body = body or ""
+        self.text = lowercased(self.body)
+        # ("amount" | "name" | "field" | "descriptions", tier or field) -> candidates,
+        # set up the first time the branch is asked for
+        self._branches: Dict[Tuple[str, Any], _Replay] = {}
+
+    def _branch(self, key: Tuple[str, Any]) -> _Replay:
+        branch = self._branches.get(key)
+        if branch is None:
+            branch = self._branches[key] = _Replay(self._candidates(key))
+        return branch
+
+    def _candidates(self, key: Tuple[str, Any]) -> Iterator:
+        kind, branch = key
+        text = self.text
+        if kind == "amount":
+            return self._amount_candidates(branch, amount_tier_matches(text, branch))
+        if kind == "descriptions":
+            return description_matches(text)
+        descriptions = self._branch(("descriptions", None))
+        if kind == "name":
+            if branch == NAME_TIER_DESCRIPTION:
+                return self._name_candidates(branch, (match for match in descriptions if match.start(2) != -1), 2)
+            if branch == NAME_TIER_CODE:
+                return self._name_candidates(branch, _name_code_matches(text), 1)
+            pattern = NAME_CELL_RE if branch == NAME_TIER_CELL else NAME_FROM_RE
+            return self._name_candidates(branch, pattern.finditer(text), 1)
+        if branch == "description":
+            return self._field_candidates(branch, (match for match in descriptions if match.start(1) != -1), 1)
+        pattern = ACCOUNT_RE if branch == "account" else VALUE_DATE_RE
+        return self._field_candidates(branch, pattern.finditer(text), 1)
+
+    def _amount_candidates(self, tier: int, matches: Iterator) -> Iterator[AmountCandidate]:
+        amount_group, currency_group = AMOUNT_GROUPS[tier]
+        for match in matches:
+            parts = parse_minor_parts(self.body, *match.span(amount_group))
+            minor, floor = parts if parts is not None else (None, None)
+            yield AmountCandidate(tier, match.start(), match.end(), minor, match.group(currency_group), floor)
+
+    def _name_candidates(self, tier: int, matches: Iterable, group: int) -> Iterator[NameCandidate]:
+        for match in matches:
+            yield NameCandidate(tier, match.start(), match.end(), self.body[match.start(group):match.end(group)].strip().lower())
+
+    def _field_candidates(self, field: str, matches: Iterable, group: int) -> Iterator[FieldCandidate]:
+        for match in matches:
+            yield FieldCandidate(field, match.start(), self.body[match.start(group):match.end(group)])
+
+    @property
+    def amounts(self) -> List[AmountCandidate]:
+        """Every amount candidate, in position order."""
+        return sorted((candidate for tier in AMOUNT_TIERS for candidate in self._branch(("amount", tier))), key=_start)
+
+    @property
+    def names(self) -> List[NameCandidate]:
+        """Every name candidate, in position order."""
+        return sorted((candidate for tier in NAME_TIERS for candidate in self._branch(("name", tier))), key=_start)
+
+    @property
+    def fields(self) -> List[FieldCandidate]:
+        """Every field candidate, in position order."""
+        return sorted((candidate for field in FIELDS for candidate in self._branch(("field", field))), key=_start)
+
+    def best_amount(
+        self,
+        tiers: Iterable[int] = AMOUNT_TIERS,
+        suffix_currencies: Iterable[str] = ("naira", "ngn"),
+        minimum: float = 10,
+    ) -> Optional[AmountCandidate]:
+        """First non-overlapping candidate of the best tier with an amount of at least `minimum`."""
+        suffix_currencies = set(suffix_currencies)
+        minimum_minor = minimum * MINOR_PER_MAJOR
+        for tier in tiers:
+            last_end = -1
+            for candidate in self._branch(("amount", tier)):
+                if candidate.start < last_end:
+                    continue
+                if tier == TIER_SUFFIXED and candidate.currency not in suffix_currencies:
+                    continue
+                last_end = candidate.end
+                # Against the unrounded amount: 9.999 rounds to 10.00 but is under 10
+                if candidate.floor is not None and candidate.floor >= minimum_minor:
+                    return candidate
+        return None
+
+    def first_name(self, tier: int) -> Optional[NameCandidate]:
+        """First name candidate of a tier, or None."""
+        return next(iter(self._branch(("name", tier))), None)
+
+    def field_values(self, field: str) -> List[str]:
+        """Values of every candidate for a field, in position order."""
+        return [candidate.value for candidate in self._branch(("field", field))]
+
+
+def _start(candidate) -> int:
+    return candidate.start
+
+
+def clean_description_name(name: str) -> str:
+    """Remove leading transfer codes and quoted-printable codes from a description name."""
+    name = NAME_CODE_PREFIX_RE.sub('', name)
+    return NAME_DIGIT_PREFIX_RE.sub('', name)
+
+
+def cell_name(cells: Iterable[Tuple[str, Optional[str]]]) -> Optional[str]:
+    """Sender name from the first Description/Remarks cell whose next cell reads "FROM NAME TO"."""
+    for text, next_text in cells:
+        if next_text and CELL_NAME_LABEL_RE.fullmatch(text):
+            match = CELL_NAME_VALUE_RE.match(next_text)
+            if match:
+                return match.group(1).strip().lower()
+    return None
+
+
+def lowercased(body: str) -> str:
+    """body.lower() with every character kept in place, so spans in it are spans in body."""
+    lowered = body.lower()
+    if len(lowered) == len(body):
+        return lowered
+    # "İ" lowers to two characters; keep the first, the "i" re.IGNORECASE would match
+    return "".join(char.lower()[0] for char in body)
+
+
+def _literal_starts(text: str, literals: Sequence[str]) -> Iterator[int]:
+    """
+    Start of every occurrence of the literals, in position order. str.find
+    looks ahead in a window that grows while nothing turns up, so the first
+    start costs about as much as the text in front of it.
+    """
+    size = len(text)
+    horizon = min(size, LITERAL_WINDOW)
+    found: List[Tuple[int, str]] = []  # heap of the next occurrence of literals seen before the horizon
+    resume = {literal: 0 for literal in literals}  # where the search of every other literal continues
+    while True:
+        for literal, start in list(resume.items()):
+            start = text.find(literal, start, horizon + len(literal) - 1)
+            if start == -1:
+                resume[literal] = horizon
+            else:
+                del resume[literal]
+                heapq.heappush(found, (start, literal))
+        if found:
+            start, literal = heapq.heappop(found)
+            resume[literal] = start + 1
+            yield start
+        elif horizon == size:
+            return
+        else:
+            horizon = min(size, horizon * 4)
+
+
+def _matches_at(pattern, text: str, starts: Iterable[int]) -> Iterator:
+    """pattern.finditer(text) for a pattern that can only match at one of `starts`."""
+    last_end = 0
+    for start in starts:
+        if start < last_end:
+            continue
+        match = pattern.match(text, start)
+        if match:
+            last_end = match.end()
+            yield match
+
+
+def _suffixed_matches(text: str) -> Iterator:
+    """SUFFIXED_RE.finditer(text), tried only in front of each currency word."""
+    last_end = 0
+    for currency_start in _literal_starts(text, SUFFIX_CURRENCY_LIST):
+        if currency_start < last_end:
+            continue
+        # The number ends where the whitespace before the currency word starts
+        number_end = currency_start
+        while number_end > last_end and text[number_end - 1].isspace():
+            number_end -= 1
+        match = SUFFIXED_RE.search(text, max(last_end, number_end - NUMBER_MAX_CHARS), currency_start + 6)
+        if match and match.start(2) == currency_start:
+            last_end = match.end()
+            yield match
+
+
+def _name_code_matches(text: str) -> Iterator:
+    """NAME_CODE_RE.finditer(text), started from the digits before each "-NAME" dash."""
+    last_end = 0
+    for dash in NAME_CODE_DASH_RE.finditer(text):
+        end = dash.start()
+        if end < last_end:
+            continue
+        # Back over "\s*" and the digits before it
+        while end > last_end and text[end - 1].isspace():
+            end -= 1
+        digits_start = end
+        while digits_start > last_end and text[digits_start - 1].isdecimal():
+            digits_start -= 1
+        run_end = end
+        if digits_start > last_end and text[digits_start - 1] == "=":
+            # "CODE=20-NAME": the digits are "=\d*" when a code run comes before the "="
+            run_end = digits_start - 1
+        start = _code_run_start(text, run_end, last_end)
+        if start == run_end:
+            # No run before the "=": the digits after it are the code
+            start = max(digits_start, end - CODE_RUN_MAX_CHARS)
+        if start >= end:
+            continue
+        match = NAME_CODE_RE.match(text, start)
+        if match:
+            last_end = match.end()
+            yield match
+
+
+def _code_run_start(text: str, run_end: int, floor: int) -> int:
+    """Leftmost start of the [\\d-] run ending at run_end (at most CODE_RUN_MAX_CHARS long)."""
+    start = run_end
+    floor = max(floor, run_end - CODE_RUN_MAX_CHARS)
+    while start > floor and (text[start - 1].isdecimal() or text[start - 1] == "-"):
+        start -= 1
+    return start
+
+
+def amount_tier_matches(text: str, tier: int) -> Iterator:
+    """Every amount match of one tier in a lowercased body, in position order."""
+    if tier == TIER_LABELED:
+        return _matches_at(LABELED_RE, text, _literal_starts(text, AMOUNT_KEYWORD_LIST))
+    if tier == TIER_PREFIXED:
+        return _matches_at(PREFIXED_RE, text, _literal_starts(text, NAIRA_MARKER_LIST))
+    return _suffixed_matches(text)
+
+
+def description_matches(text: str) -> Iterator:
+    """DESCRIPTION_RE at every "description", also one inside the name tail of the one before."""
+    for start in _literal_starts(text, ("description",)):
+        yield DESCRIPTION_RE.match(text, start)
+
+
+def scan(body: Optional[str]) -> ScanResult:
+    """The candidates of a body, scanned as they are asked for."""
+    return ScanResult(body)
+
+
+# Scans shared by the strategies of the request running in this context (see scan_scope)
+_scope_scans: ContextVar[Optional[Dict[str, ScanResult]]] = ContextVar("scope_scans", default=None)
+
+
+@contextmanager
+def scan_scope() -> Iterator[None]:
+    """Within the block, scan_body() scans each distinct body once; the scans are dropped when it ends."""
+    token = _scope_scans.set({})
+    try:
+        yield
+    finally:
+        _scope_scans.reset(token)
+
+
+def scan_body(body: str) -> ScanResult:
+    """scan(), shared with every other scan of the same body inside the current scan_scope()."""
+    scans = _scope_scans.get()
+    if scans is None:
+        return scan(body)
+    scanned = scans.get(body)
+    if scanned is None:
+        scanned = scans[body] = scan(body)
+    return scanned
@@ -0,0 +1,335 @@
+"""
+Every transaction of a multi-row email (daily digests, mini statements).
+
+The cascade stops at the first amount of 10 or more, which reduces a digest
+listing dozens of credits to one row. transactions() instead walks the HTML
+table rows with RowStream as they are parsed, and yields one transaction per
+row: amount, direction, sender name, narration and date. Memory does not grow
+with the number of rows.
+
+Rows are read through the statement's header row ("Date | Description |
+Debit | Credit | Balance", "Narration | Amount | Type"...) when there is one.
+Without a header, rows of three or more cells with a currency-marked amount
+count, but only once a second such row confirms the email is a list; a
+single key/value alert table ("Amount | NGN 5,000") is not a statement.
+Plain-text statements are read line by line: after a header line, every line
+with an amount counts; without one, only lines starting with a date, and again
+only once a second one confirms the list, so an alert's "Amount:" and "Fee:"
+lines are not a statement. Rows without a CR/DR marker, sign or direction
+column have no direction. An email with no statement rows yields the cascade's
+single result, so callers can always use this mode.
+
+Each row is read under the regex budget (see extractor.patterns); a row that
+runs out of it is skipped, and parsing the markup is not charged to it.
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from extractor import core
+from extractor.amounts import MINOR_PER_MAJOR, parse_minor, to_major
+from extractor.currency import currency_code
+from extractor.fields import normalize_date
+from extractor.patterns import RegexBudgetExceeded, compile_pattern, regex_budget
+from extractor.scanner import NUMBER, scan
+from extractor.stream import RowStream, SkimStats
+
+# Header cell text (lowercased, letters only) -> column role; whole text first, then its first word
+HEADER_ROLES = {
+    "date": ("date", "trans date", "transaction date", "txn date", "value date", "posted", "posting date"),
+    "narration": (
+        "description", "narration", "narrative", "details", "transaction details", "remarks",
+        "particulars", "memo", "transaction",
+    ),
+    "credit": ("credit", "credits", "deposit", "deposits", "lodgement", "lodgements", "money in", "inflow"),
+    "debit": ("debit", "debits", "withdrawal", "withdrawals", "money out", "outflow"),
+    "amount": ("amount", "amt", "value"),
+    "type": ("type", "dr cr", "cr dr", "transaction type", "txn type"),
+    "balance": ("balance", "closing balance", "running balance", "available balance", "ledger balance"),
+}
+_ROLE_BY_NAME = {name: role for role, names in HEADER_ROLES.items() for name in names}
+AMOUNT_ROLES = ("credit", "debit", "amount")
+
+HEADER_CLEAN_RE = compile_pattern(r'[^a-z]+', name="statement_header_clean")
+# A cell holding just an amount: optional currency, sign and CR/DR marker
+CELL_AMOUNT_RE = compile_pattern(
+    r'\s{0,8}(?P<sign>[-+])?\s{0,8}(?P<currency>ngn|₦|n|usd|\$|gbp|£|eur|€)?\s{0,8}(?P<sign2>-)?'
+    r'(?P<number>' + NUMBER + r')\s{0,8}(?P<marker>cr|dr|credit|debit)?\.?\s{0,8}',
+    re.IGNORECASE,
+    name="statement_cell_amount",
+)
+DIRECTION_RE = compile_pattern(r'\b(cr|credit|dr|debit)\b', re.IGNORECASE, name="statement_direction")
+# A plain-text statement line amount without a currency: "5,000.00 CR"
+LINE_MARKED_AMOUNT_RE = compile_pattern(r'(' + NUMBER + r')\s{0,4}(cr|dr)\b', re.IGNORECASE, name="statement_line_amount")
+# The CR/DR marker right after a currency-marked amount, left out of the narration
+LINE_MARKER_RE = compile_pattern(r'\s{0,4}(?:cr|dr)\b', re.IGNORECASE, name="statement_line_marker")
+# "... FROM JOHN DOE" at the end of a narration (without the "TO ..." the scanner needs)
+NARRATION_FROM_RE = compile_pattern(r'\bfrom\s+([a-z][a-z .\'\-]{2,60}?)\s*(?:/|$)', re.IGNORECASE, name="statement_narration_from")
+BALANCE_LINE_RE = compile_pattern(r'\b(?:balance|bal|available|ledger|opening|closing)\b', re.IGNORECASE, name="statement_balance_line")
+# Summary rows of a statement table ("Total", "Closing Balance", "Balance B/F")
+SUMMARY_CELL_RE = compile_pattern(
+    r'\s*(?:(?:sub|grand)?\s*totals?|(?:opening|closing|brought forward|carried forward)?\s*balance(?:\s*[bc]/f)?|[bc]/f)\s*:?\s*',
+    re.IGNORECASE,
+    name="statement_summary_cell",
+)
+LINE_RE = compile_pattern(r'[^\r\n]+', name="statement_line")
+# Columns of a plain-text header line: tabs, pipes or runs of two or more spaces
+LINE_COLUMNS_RE = compile_pattern(r'\t|\||\s{2,}', name="statement_line_columns")
+# The date a plain-text statement line starts with: "01/03/2024", "2024-03-01", "01-Mar-2024", "01 MAR"
+LINE_DATE_RE = compile_pattern(
+    r'\s{0,8}(\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{4}[/.-]\d{1,2}[/.-]\d{1,2}'
+    r'|\d{1,2}[ -](?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]{0,6}(?:[ -]\d{2,4})?)\b',
+    re.IGNORECASE,
+    name="statement_line_date",
+)
+
+MIN_MINOR = 10 * MINOR_PER_MAJOR
+
+# Markup parsed per statement (this bounds time, not memory: rows are handed out as they are parsed)
+STATEMENT_MAX_BYTES = int(os.getenv("EXTRACTOR_STATEMENT_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def header_role(text: str) -> Optional[str]:
+    """Column role of a header cell ("Credit (NGN)" -> "credit"), or None."""
+    words = HEADER_CLEAN_RE.sub(" ", text.lower()).split()
+    if not words:
+        return None
+    return _ROLE_BY_NAME.get(" ".join(words)) or _ROLE_BY_NAME.get(words[0])
+
+
+def header_roles(cells: List[str]) -> Optional[Dict[str, int]]:
+    """Role -> column index when the cells look like a statement header, else None."""
+    # Two cells are a key/value alert row ("Transaction Type | Credit"), not a header
+    if len(cells) < 3:
+        return None
+    roles: Dict[str, int] = {}
+    for index, text in enumerate(cells):
+        role = header_role(text)
+        if role and role not in roles:
+            roles[role] = index
+    if len(roles) >= 2 and any(role in roles for role in AMOUNT_ROLES):
+        return roles
+    return None
+
+
+def cell_amount(text: str) -> Optional[Dict[str, Any]]:
+    """{"minor", "currency", "direction"} of a cell holding just an amount, or None."""
+    match = CELL_AMOUNT_RE.fullmatch(text)
+    if match is None:
+        return None
+    minor = parse_minor(text, *match.span("number"))
+    if minor is None:
+        return None
+    direction = None
+    marker = (match.group("marker") or "").lower()
+    if marker:
+        direction = "credit" if marker.startswith("c") else "debit"
+    elif match.group("sign") == "-" or match.group("sign2"):
+        direction = "debit"
+    return {"minor": minor, "currency": currency_code(match.group("currency")), "direction": direction}
+
+
+def narration_sender(narration: Optional[str]) -> Optional[str]:
+    """Sender name in a narration, as the cascade finds it, else a trailing "FROM NAME"."""
+    if not narration:
+        return None
+    name = core.extract_sender_name(None, narration)
+    if name:
+        return name
+    match = NARRATION_FROM_RE.search(narration)
+    if match:
+        name = " ".join(match.group(1).lower().split())
+        return name if len(name) >= 3 else None
+    return None
+
+
+def _transaction(
+    minor: int, currency: Optional[str], direction: Optional[str], narration: Optional[str],
+    date: Optional[str], source: str,
+) -> Dict[str, Any]:
+    return {
+        "amount": to_major(minor),
+        "amount_minor": minor,
+        "currency": currency or "NGN",
+        "direction": direction,
+        "sender_name": narration_sender(narration),
+        "narration": narration or None,
+        "date": normalize_date(date) if date else None,
+        "source": source,
+    }
+
+
+def _mapped_row(cells: List[str], roles: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """Transaction of a row under a header, or None (blank, totals or balance-only rows)."""
+    if any(SUMMARY_CELL_RE.fullmatch(text) for text in cells if text):
+        return None
+
+    def cell(role: str) -> Optional[str]:
+        index = roles.get(role)
+        return cells[index] if index is not None and index < len(cells) and cells[index] else None
+
+    for role in ("credit", "debit", "amount"):
+        text = cell(role)
+        found = cell_amount(text) if text else None
+        # The header says this column is an amount, so small charges ("N 4.00") count too
+        if found is None or not found["minor"]:
+            continue
+        direction = found["direction"]
+        if role != "amount":
+            direction = role
+        elif direction is None and cell("type"):
+            marker = DIRECTION_RE.search(cell("type"))
+            if marker:
+                direction = "credit" if marker.group(1).lower().startswith("c") else "debit"
+        return _transaction(found["minor"], found["currency"], direction, cell("narration"), cell("date"), "statement_table")
+    return None
+
+
+def _loose_row(cells: List[str]) -> Optional[Dict[str, Any]]:
+    """Transaction of a headerless row: a currency-marked amount in one of its cells."""
+    if len(cells) < 3:
+        return None
+    if any(SUMMARY_CELL_RE.fullmatch(text) for text in cells if text):
+        return None
+    text = " ".join(cells)
+    if BALANCE_LINE_RE.search(text) and not DIRECTION_RE.search(text):
+        return None
+    hit = scan(text).best_amount(suffix_currencies=("naira", "ngn", "usd", "dollar"))
+    if hit is None:
+        return None
+    marker = DIRECTION_RE.search(text)
+    direction = ("credit" if marker.group(1).lower().startswith("c") else "debit") if marker else None
+    amount_cells = {index for index, cell in enumerate(cells) if cell_amount(cell) is not None}
+    narration = max(
+        (cell for index, cell in enumerate(cells) if index not in amount_cells),
+        key=len,
+        default=None,
+    )
+    return _transaction(hit.minor, currency_code(hit.currency), direction, narration, None, "statement_table")
+
+
+def _line(line: str, date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Transaction of one plain-text statement line (without its leading date), or None."""
+    if BALANCE_LINE_RE.search(line) and not DIRECTION_RE.search(line):
+        return None
+    hit = scan(line).best_amount(suffix_currencies=("naira", "ngn", "usd", "dollar"))
+    marked = LINE_MARKED_AMOUNT_RE.search(line)
+    if hit is not None:
+        minor, currency, start, end = hit.minor, currency_code(hit.currency), hit.start, hit.end
+        marker_after = LINE_MARKER_RE.match(line, end)
+        if marker_after is not None:
+            end = marker_after.end()
+    elif marked is not None:
+        minor, currency, start, end = parse_minor(line, *marked.span(1), minimum=MIN_MINOR), None, marked.start(), marked.end()
+        if minor is None:
+            return None
+    else:
+        return None
+    marker = DIRECTION_RE.search(line)
+    direction = ("credit" if marker.group(1).lower().startswith("c") else "debit") if marker else None
+    narration = " ".join((line[:start] + " " + line[end:]).split()) or None
+    return _transaction(minor, currency, direction, narration, date, "statement_text")
+
+
+def _budgeted(read: Callable[..., Optional[Dict[str, Any]]], *args) -> Optional[Dict[str, Any]]:
+    """read(*args) under the regex budget; None when the row runs out of it."""
+    try:
+        with regex_budget():
+            return read(*args)
+    except RegexBudgetExceeded:
+        return None
+
+
+def table_transactions(html: Optional[str], stats: Optional[SkimStats] = None) -> Iterator[Dict[str, Any]]:
+    """Transactions of the table rows of an HTML body, in document order; stats.truncated tells a cut-off body."""
+    roles: Optional[Dict[str, int]] = None
+    pending: Optional[Dict[str, Any]] = None  # first headerless row, until a second one confirms it
+    confirmed = False
+    for row in RowStream(html, max_bytes=STATEMENT_MAX_BYTES, stats=stats):
+        found_roles = header_roles(row.cells)
+        if found_roles is not None:
+            roles = found_roles
+            continue
+        if roles is not None:
+            transaction = _budgeted(_mapped_row, row.cells, roles)
+            if transaction is not None:
+                yield transaction
+            continue
+        transaction = _budgeted(_loose_row, row.cells)
+        if transaction is None:
+            continue
+        if confirmed:
+            yield transaction
+        elif pending is None:
+            pending = transaction
+        else:
+            confirmed = True
+            yield pending
+            yield transaction
+
+
+def text_transactions(text: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Transactions of the lines of a plain-text statement (after a header line, or two or more dated lines)."""
+    pending: Optional[Dict[str, Any]] = None  # first dated line, until a second one confirms it
+    confirmed = False
+    headed = False
+    for match in LINE_RE.finditer(text or ""):
+        line = match.group()
+        if header_roles([cell for cell in LINE_COLUMNS_RE.split(line.strip()) if cell]) is not None:
+            headed = confirmed = True
+            if pending is not None:
+                yield pending
+                pending = None
+            continue
+        dated = LINE_DATE_RE.match(line)
+        if dated is not None:
+            transaction = _budgeted(_line, line[dated.end():], dated.group(1))
+        elif headed:
+            transaction = _budgeted(_line, line)
+        else:
+            continue
+        if transaction is None:
+            continue
+        if confirmed:
+            yield transaction
+        elif pending is None:
+            pending = transaction
+        else:
+            confirmed = True
+            yield pending
+            yield transaction
+
+
+def transactions(email: core.Email, stats: Optional[SkimStats] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Every transaction of an email, numbered from 0: the HTML table rows, else
+    the text lines, else the cascade's single result (with its own source).
+    Pass a SkimStats to learn afterwards whether the HTML body was cut off at
+    EXTRACTOR_STATEMENT_MAX_BYTES.
+    """
+    index = 0
+    for transaction in table_transactions(email.html_body, stats):
+        yield {"index": index, **transaction}
+        index += 1
+    if index:
+        return
+    for transaction in text_transactions(email.text_body):
+        yield {"index": index, **transaction}
+        index += 1
+    if index:
+        return
+    response = core.extract(email, lean=True)
+    data = response["data"]
+    if data:
+        yield {
+            "index": 0,
+            "amount": data["amount"],
+            "amount_minor": data["amount_minor"],
+            "currency": data["currency"],
+            "direction": data["direction"],
+            "sender_name": data["sender_name"],
+            "narration": data["narration"],
+            "date": data["value_date"],
+            "source": data["source"],
+        }
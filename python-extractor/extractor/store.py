@@ -0,0 +1,279 @@
+"""
+SQLite store of extraction results, for reverse searches by amount, time and sender.
+
+Every successful extraction is kept by email_id (the latest one wins), with
+indexes on (amount, email time), sender domain and normalized sender name,
+plus a table of sender-name trigrams for searches by name alone. A search for
+a payment (what PaymentMatchingService::reverseSearchPaymentInEmails does by
+scanning stored emails) is then an index range query; the few rows in range
+are scored like /match candidates (see extractor.matching).
+
+Writes are buffered and committed together by a background thread every
+flush_interval seconds, so extraction requests never wait on the disk; a
+search commits what is buffered first.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from extractor.matching import (
+    MIN_AMOUNT_WINDOW,
+    MIN_NAME_OVERLAP,
+    SCORE_WEIGHTS,
+    name_trigrams,
+    normalize_name,
+    parse_timestamp,
+    similar_text,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS results ("
+    " email_id INTEGER PRIMARY KEY,"
+    " amount REAL NOT NULL,"
+    " currency TEXT,"
+    " email_date TEXT,"
+    " email_ts REAL,"
+    " from_email TEXT,"
+    " sender_domain TEXT,"
+    " sender_name TEXT,"
+    " name_key TEXT,"
+    " account_number TEXT,"
+    " source TEXT,"
+    " data TEXT NOT NULL,"
+    " stored_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS results_amount_time ON results (amount, email_ts)",
+    "CREATE INDEX IF NOT EXISTS results_domain_time ON results (sender_domain, email_ts)",
+    "CREATE INDEX IF NOT EXISTS results_name ON results (name_key)",
+    "CREATE TABLE IF NOT EXISTS name_trigrams (gram TEXT NOT NULL, email_id INTEGER NOT NULL,"
+    " PRIMARY KEY (gram, email_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS name_trigrams_email ON name_trigrams (email_id)",
+)
+
+# Most results a search by name alone scores (those sharing the most trigrams with the name)
+NAME_CANDIDATES = 1000
+
+COLUMNS = (
+    "email_id", "amount", "currency", "email_date", "email_ts", "from_email",
+    "sender_domain", "sender_name", "name_key", "account_number", "source", "data",
+)
+
+
+def domain_of(from_email: Optional[str]) -> Optional[str]:
+    """Lowercased domain of a sender address, or None."""
+    _, at, domain = (from_email or "").rpartition("@")
+    if not at:
+        return None
+    return domain.strip().strip(">").lower() or None
+
+
+class ResultStore:
+    """Extraction results by email_id in an SQLite file; disabled without a path."""
+
+    def __init__(self, path: Optional[str], flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Tuple] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def add(self, email_id: int, from_email: Optional[str], email_date: Optional[str], data: Optional[Dict[str, Any]]) -> None:
+        """Queue one result for the next flush; failed extractions (no data) are not stored."""
+        if self._db is None or not data or data.get("amount") is None:
+            return
+        name = normalize_name(data.get("sender_name"))
+        row = (
+            int(email_id),
+            float(data["amount"]),
+            data.get("currency"),
+            email_date,
+            parse_timestamp(email_date),
+            from_email,
+            domain_of(from_email),
+            data.get("sender_name"),
+            name or None,
+            data.get("account_number"),
+            data.get("source"),
+            json.dumps(data, ensure_ascii=False),
+        )
+        with self._lock:
+            self._pending[row[0]] = row
+        if self._thread is None:
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="result-store", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Could not write results to {self.path}: {e}")
+
+    def flush(self) -> int:
+        """Commit the buffered results in one transaction; returns how many were written."""
+        if self._db is None:
+            return 0
+        # Taken before the buffer so two flushes commit in the order they emptied it
+        with self._db_lock:
+            with self._lock:
+                rows, self._pending = list(self._pending.values()), {}
+            if not rows:
+                return 0
+            stored_at = time.time()
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO results ({', '.join(COLUMNS)}, stored_at)"
+                    f" VALUES ({', '.join('?' * len(COLUMNS))}, ?)",
+                    [row + (stored_at,) for row in rows],
+                )
+                self._db.executemany("DELETE FROM name_trigrams WHERE email_id = ?", [(row[0],) for row in rows])
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO name_trigrams (gram, email_id) VALUES (?, ?)",
+                    [(gram, row[0]) for row in rows if row[8] for gram in name_trigrams(row[8])],
+                )
+        return len(rows)
+
+    def __len__(self) -> int:
+        if self._db is None:
+            return 0
+        self.flush()
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def search(
+        self,
+        amount: Optional[float] = None,
+        tolerance: float = 0.0,
+        since: Any = None,
+        until: Any = None,
+        sender_name: Optional[str] = None,
+        sender_domain: Optional[str] = None,
+        account_number: Optional[str] = None,
+        min_name_similarity: float = 0.0,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Stored results for a payment, best first.
+
+        With an amount, results within max(amount * tolerance, 1) of it are
+        scored; without one, the NAME_CANDIDATES results sharing the most
+        sender-name trigrams with the name. since/until (ISO 8601 or RFC 2822) bound the email date, and
+        exclude results without one. "considered" is how many rows were scored.
+        """
+        if self._db is None:
+            return {"results": [], "considered": 0}
+        self.flush()
+        name = normalize_name(sender_name)
+        trigrams = name_trigrams(name)
+        where, params = [], []
+        since_ts, until_ts = parse_timestamp(since), parse_timestamp(until)
+        if since_ts is not None:
+            where.append("email_ts >= ?")
+            params.append(since_ts)
+        if until_ts is not None:
+            where.append("email_ts <= ?")
+            params.append(until_ts)
+        if sender_domain:
+            where.append("sender_domain = ?")
+            params.append(sender_domain.lower())
+
+        window = 0.0
+        if amount:
+            window = max(amount * tolerance, MIN_AMOUNT_WINDOW)
+            where.insert(0, "amount BETWEEN ? AND ?")
+            params[:0] = [amount - window, amount + window]
+            query = f"SELECT {', '.join(COLUMNS)} FROM results WHERE {' AND '.join(where)}"
+        elif trigrams:
+            # The results sharing the most trigrams with the name; only those are scored
+            grams = sorted(trigrams)
+            query = (
+                f"SELECT {', '.join('r.' + column for column in COLUMNS)} FROM"
+                f" (SELECT email_id, COUNT(*) AS shared FROM name_trigrams WHERE gram IN ({', '.join('?' * len(grams))})"
+                f" GROUP BY email_id) AS t JOIN results AS r ON r.email_id = t.email_id"
+                f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY t.shared DESC LIMIT ?"
+            )
+            params = grams + params + [NAME_CANDIDATES]
+        else:
+            return {"results": [], "considered": 0}
+
+        with self._db_lock:
+            rows = [dict(zip(COLUMNS, row)) for row in self._db.execute(query, params)]
+
+        results = []
+        for row in rows:
+            row_name = row["name_key"] or ""
+            if not amount:
+                row_grams = name_trigrams(row_name)
+                if 2 * len(trigrams & row_grams) / (len(trigrams) + len(row_grams)) < MIN_NAME_OVERLAP:
+                    continue
+            similarity = similar_text(row_name, name) if name and row_name else 0.0
+            if name and similarity < min_name_similarity:
+                continue
+            difference = amount - row["amount"] if amount else None
+            closeness = 1 - abs(difference) / window if difference is not None else 0.0
+            account_match = bool(account_number) and row["account_number"] == account_number
+            score = (
+                SCORE_WEIGHTS["name"] * similarity / 100
+                + SCORE_WEIGHTS["amount"] * closeness
+                + SCORE_WEIGHTS["account"] * account_match
+            )
+            results.append({
+                "email_id": row["email_id"],
+                "amount": row["amount"],
+                "currency": row["currency"],
+                "email_date": row["email_date"],
+                "from_email": row["from_email"],
+                "sender_name": row["sender_name"],
+                "account_number": row["account_number"],
+                "source": row["source"],
+                "name_similarity": round(similarity, 2),
+                "amount_difference": round(difference, 2) if difference is not None else None,
+                "account_match": account_match,
+                "score": round(score, 4),
+                "_ts": row["email_ts"] or 0.0,
+            })
+        # Best score first, then the newest email, as the PHP reverse search orders them
+        results.sort(key=lambda result: (-result["score"], -result["_ts"]))
+        for result in results:
+            del result["_ts"]
+        return {"results": results[:limit], "considered": len(rows)}
+
+    def close(self) -> None:
+        """Flush and stop the background writer."""
+        if self._db is None:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+        self._db = None
@@ -0,0 +1,380 @@
+"""
+Streaming HTML scan for large bodies, built on html.parser.HTMLParser.feed.
+
+The body is fed to the parser in chunks and <td> cells are handed out as soon
+as their text (and the text of their next sibling cell) is known, so a caller
+that finds its amount in the first table stops the parse there. No tree is
+built. RowStream hands out whole table rows the same way, for statements.
+
+Before anything reaches the parser, <style>/<script> contents and data: URI
+payloads (inline base64 images) are skipped by searching past them in the
+original string, so they are never copied, buffered or parsed. The cascade
+parses the rest of the markup in full, as html.parser would: every other
+strategy scans the whole body, so a cell it could not see would only make the
+backends disagree. RowStream callers may pass `max_bytes` to stop parsing
+after that many characters.
+"""
+
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+
+from extractor.patterns import budget_paused, compile_pattern
+
+STREAM_CHUNK_BYTES = int(os.getenv("EXTRACTOR_STREAM_CHUNK_BYTES", str(64 * 1024)))
+
+# Start of content that is skipped: a <style>/<script> element or a data: URI in an attribute.
+# Always plain re: these are searched repeatedly from an offset, which re2 would
+# pay for by re-encoding the whole body on every call.
+SKIP_START_RE = compile_pattern(r'<(style|script)\b[^>]*>|(?<=["\'=(])\s*data:', re.IGNORECASE, name="stream_skip_start", engine="re")
+SKIP_END_RE = {
+    "style": compile_pattern(r'</style\s*>', re.IGNORECASE, name="stream_style_end", engine="re"),
+    "script": compile_pattern(r'</script\s*>', re.IGNORECASE, name="stream_script_end", engine="re"),
+}
+DATA_URI_PAYLOAD_RE = compile_pattern(r'[^"\'\s)>]*', name="stream_data_uri_payload", engine="re")
+
+# Elements bs4 closes immediately (they never contain cells or text)
+VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+))
+
+
+class SkimStats:
+    def __init__(self):
+        self.skipped_bytes = 0
+        self.fed_bytes = 0
+        self.truncated = False
+
+
+def skim(html: str, stats: SkimStats, max_bytes: Optional[int] = None, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[str]:
+    """Chunks of `html` without style/script contents and data: URI payloads, up to max_bytes in total when given."""
+    if max_bytes is None:
+        max_bytes = len(html)
+    position = 0
+    length = len(html)
+
+    def emit(start: int, end: int) -> Iterator[str]:
+        while start < end:
+            if stats.fed_bytes >= max_bytes:
+                stats.truncated = True
+                return
+            stop = min(end, start + chunk_size, start + max_bytes - stats.fed_bytes)
+            stats.fed_bytes += stop - start
+            yield html[start:stop]
+            start = stop
+
+    while position < length and not stats.truncated:
+        match = SKIP_START_RE.search(html, position)
+        if match is None:
+            yield from emit(position, length)
+            break
+        tag = match.group(1)
+        yield from emit(position, match.end())
+        if tag:
+            # Skip to the closing tag (or the end of the document when it is missing)
+            end = SKIP_END_RE[tag.lower()].search(html, match.end())
+            content_end = end.start() if end else length
+            stats.skipped_bytes += content_end - match.end()
+            position = content_end
+        else:
+            # "data:" was emitted; drop everything up to the closing quote
+            payload_end = DATA_URI_PAYLOAD_RE.match(html, match.end()).end()
+            stats.skipped_bytes += payload_end - match.end()
+            position = payload_end
+
+
+class _Cell:
+    __slots__ = ("parts", "closed", "next_index", "next_known")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.closed = False
+        self.next_index: Optional[int] = None
+        self.next_known = False
+
+
+class _Frame:
+    __slots__ = ("tag", "cell_index", "pending_td")
+
+    def __init__(self, tag: str, cell_index: Optional[int]):
+        self.tag = tag
+        self.cell_index = cell_index   # set when this element is a <td>
+        self.pending_td: Optional[int] = None  # last <td> child still waiting for a sibling
+
+
+class CellStream(HTMLParser):
+    """
+    Lazily parsed <td> cells of one HTML body, as (text, next_sibling_text) pairs.
+
+    Iterating parses only as far as needed; iterating again replays the cells
+    already parsed and then continues. Cell text matches bs4's
+    get_text(strip=True) and text() matches get_text(separator=' ', strip=True).
+    """
+
+    def __init__(self, html: Optional[str], max_bytes: Optional[int] = None, chunk_size: int = STREAM_CHUNK_BYTES):
+        super().__init__(convert_charrefs=True)
+        self.stats = SkimStats()
+        self._chunks = skim(html or "", self.stats, max_bytes, chunk_size)
+        self._cells: List[_Cell] = []
+        self._ready: List[Tuple[str, Optional[str]]] = []
+        # The document itself is the root frame, so top-level cells have siblings too
+        self._frames: List[_Frame] = [_Frame("[document]", None)]
+        self._open_cells: List[int] = []
+        self._data: List[str] = []
+        self._text: List[str] = []
+        self.finished = False
+
+    # Feeding
+
+    def _advance(self) -> bool:
+        """Feed one more chunk. Returns False once the whole body has been parsed."""
+        if self.finished:
+            return False
+        with budget_paused():
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.close()
+                self._flush_data()
+                while self._frames:
+                    self._pop_frame()
+                self._collect_ready()
+                self.finished = True
+                return True
+            self.feed(chunk)
+            self._collect_ready()
+        return True
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[str]]]:
+        index = 0
+        while True:
+            while index < len(self._ready):
+                yield self._ready[index]
+                index += 1
+            if not self._advance():
+                return
+
+    def parsed(self) -> List[Tuple[str, Optional[str]]]:
+        """Cells parsed so far, without parsing any further."""
+        return list(self._ready)
+
+    def text(self) -> str:
+        """All text of the document (parses the rest of it)."""
+        while self._advance():
+            pass
+        return " ".join(self._text)
+
+    # Tree tracking
+
+    def _flush_data(self) -> None:
+        if not self._data:
+            return
+        text = "".join(self._data).strip()
+        self._data = []
+        if not text:
+            return
+        self._text.append(text)
+        for index in self._open_cells:
+            self._cells[index].parts.append(text)
+
+    def _pop_frame(self) -> None:
+        frame = self._frames.pop()
+        if frame.pending_td is not None:
+            self._cells[frame.pending_td].next_known = True
+        if frame.cell_index is not None:
+            self._cells[frame.cell_index].closed = True
+            self._open_cells.remove(frame.cell_index)
+
+    def _collect_ready(self) -> None:
+        cells = self._cells
+        while len(self._ready) < len(cells):
+            cell = cells[len(self._ready)]
+            if not (cell.closed and cell.next_known):
+                return
+            next_text = None
+            if cell.next_index is not None:
+                next_cell = cells[cell.next_index]
+                if not next_cell.closed:
+                    return
+                next_text = "".join(next_cell.parts)
+            self._ready.append(("".join(cell.parts), next_text))
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        if tag in VOID_ELEMENTS:
+            return
+        cell_index = None
+        if tag == "td":
+            cell_index = len(self._cells)
+            self._cells.append(_Cell())
+            self._open_cells.append(cell_index)
+            if self._frames:
+                parent = self._frames[-1]
+                if parent.pending_td is not None:
+                    previous = self._cells[parent.pending_td]
+                    previous.next_index = cell_index
+                    previous.next_known = True
+                parent.pending_td = cell_index
+        self._frames.append(_Frame(tag, cell_index))
+
+    def handle_startendtag(self, tag, attrs):
+        # <td/> is an empty cell, as in bs4
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        # Like bs4: close up to the most recent open element of this name, ignore stray end tags
+        for depth in range(len(self._frames) - 1, -1, -1):
+            if self._frames[depth].tag == tag:
+                while len(self._frames) > depth:
+                    self._pop_frame()
+                return
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush_data()
+
+    def handle_decl(self, decl):
+        self._flush_data()
+
+    def handle_pi(self, data):
+        self._flush_data()
+
+
+# Longest text kept per table cell (statement cells are short; this bounds a layout cell)
+ROW_CELL_MAX_CHARS = 2000
+
+
+class Row(NamedTuple):
+    cells: List[str]  # text of each <td>/<th>, pieces joined with single spaces
+    header: bool      # every cell was a <th>
+
+
+class _OpenRow:
+    __slots__ = ("cells", "headers", "container")
+
+    def __init__(self):
+        self.cells: List[str] = []
+        self.headers = 0
+        self.container = False  # holds a nested table; its own cells are layout, not data
+
+
+class _OpenCell:
+    __slots__ = ("parts", "size", "header")
+
+    def __init__(self, header: bool):
+        self.parts: List[str] = []
+        self.size = 0
+        self.header = header
+
+
+class RowStream(HTMLParser):
+    """
+    Table rows of one HTML body, yielded as each </tr> is parsed.
+
+    Only rows without a nested table are yielded (a layout row wrapping the
+    statement table is not), and text goes to the innermost open cell only.
+    Rows are handed out and forgotten, so memory does not grow with the
+    number of rows. Missing </td> and </tr> are closed as browsers do.
+    """
+
+    def __init__(
+        self,
+        html: Optional[str],
+        max_bytes: Optional[int] = None,
+        chunk_size: int = STREAM_CHUNK_BYTES,
+        stats: Optional[SkimStats] = None,
+    ):
+        super().__init__(convert_charrefs=True)
+        self.stats = stats if stats is not None else SkimStats()
+        self._chunks = skim(html or "", self.stats, max_bytes, chunk_size)
+        # (tag, open row or cell for tr/td/th frames)
+        self._frames: List[Tuple[str, Any]] = []
+        self._ready: List[Row] = []
+        self._data: List[str] = []
+
+    def __iter__(self) -> Iterator[Row]:
+        for chunk in self._chunks:
+            self.feed(chunk)
+            yield from self._take()
+        self.close()
+        self._flush_data()
+        while self._frames:
+            self._pop()
+        yield from self._take()
+
+    def _take(self) -> List[Row]:
+        ready, self._ready = self._ready, []
+        return ready
+
+    def _innermost(self, kinds: Tuple[str, ...]) -> Any:
+        for tag, state in reversed(self._frames):
+            if tag in kinds:
+                return state
+        return None
+
+    def _flush_data(self) -> None:
+        if not self._data:
+            return
+        text = " ".join("".join(self._data).split())
+        self._data = []
+        cell = self._innermost(("td", "th"))
+        if text and cell is not None and cell.size < ROW_CELL_MAX_CHARS:
+            cell.parts.append(text)
+            cell.size += len(text) + 1
+
+    def _pop(self) -> None:
+        tag, state = self._frames.pop()
+        if tag in ("td", "th"):
+            row = self._innermost(("tr",))
+            if row is not None:
+                row.cells.append(" ".join(state.parts)[:ROW_CELL_MAX_CHARS])
+                row.headers += state.header
+        elif tag == "tr" and not state.container and state.cells:
+            self._ready.append(Row(state.cells, state.headers == len(state.cells)))
+
+    def _close_through(self, tags: Tuple[str, ...]) -> None:
+        while self._frames and self._frames[-1][0] in tags:
+            self._pop()
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        if tag in VOID_ELEMENTS:
+            return
+        if tag == "tr":
+            # An unclosed previous row (and its unclosed last cell) ends here
+            self._close_through(("td", "th"))
+            self._close_through(("tr",))
+            outer = self._innermost(("tr",))
+            if outer is not None:
+                outer.container = True
+            self._frames.append((tag, _OpenRow()))
+        elif tag in ("td", "th"):
+            self._close_through(("td", "th"))
+            self._frames.append((tag, _OpenCell(tag == "th")))
+        else:
+            self._frames.append((tag, None))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        for depth in range(len(self._frames) - 1, -1, -1):
+            if self._frames[depth][0] == tag:
+                while len(self._frames) > depth:
+                    self._pop()
+                return
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush_data()
@@ -0,0 +1,211 @@
+"""
+Bank templates: per-sender-domain patterns tried before the generic cascade.
+
+Templates are loaded from a directory of JSON files (YAML too when PyYAML is
+installed), indexed by sender domain, and their patterns compiled once. The
+directory is re-checked at most every `reload_interval` seconds and reloaded
+when any file changed, so templates can be added without restarting workers.
+
+File format (one template per file, or a list of them):
+
+    {
+      "name": "GTBank",
+      "domains": ["gtbank.com"],
+      "confidence": 0.95,
+      "amount_patterns": ["(?:amount)[\\s:]+ngn\\s*([\\d,]{1,32}(?![\\d,])(?:\\.\\d{0,32})?(?!\\.?\\d))",
+                          {"pattern": "...", "confidence": 0.9}],
+      "name_patterns": ["from\\s+([A-Z][A-Z\\s]{1,100}?)\\s+to"]
+    }
+
+Patterns are case-insensitive; group 1 captures the amount or the name.
+Bound repeats the way extractor.scanner does ([\\d,]{1,32}, not [\\d,]+), so a
+long run of digits cannot make a pattern backtrack (see benchmarks.bench_redos),
+and reject a longer run after the bound ((?![\\d,]), (?!\\.?\\d)) instead of
+capturing its first digits.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from extractor.amounts import MINOR_PER_MAJOR, parse_minor, to_major
+from extractor.patterns import compile_pattern
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIDENCE = 0.95
+TEMPLATE_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+class TemplatePattern(NamedTuple):
+    regex: Any  # re.Pattern, or an re2 pattern with EXTRACTOR_REGEX_ENGINE=re2
+    confidence: float
+
+
+class BankTemplate:
+    """One bank's compiled patterns."""
+
+    def __init__(self, spec: Dict[str, Any], source: str = ""):
+        self.name = spec["name"]
+        self.domains = [domain.lower().lstrip("@.") for domain in spec["domains"]]
+        self.source = source
+        self.currency = spec.get("currency", "NGN")
+        confidence = float(spec.get("confidence", DEFAULT_CONFIDENCE))
+        self.amount_patterns = [self._compile(pattern, confidence) for pattern in spec.get("amount_patterns", [])]
+        self.name_patterns = [self._compile(pattern, confidence).regex for pattern in spec.get("name_patterns", [])]
+
+    @staticmethod
+    def _compile(pattern: Any, confidence: float) -> TemplatePattern:
+        if isinstance(pattern, dict):
+            return TemplatePattern(compile_pattern(pattern["pattern"], re.IGNORECASE), float(pattern.get("confidence", confidence)))
+        return TemplatePattern(compile_pattern(pattern, re.IGNORECASE), confidence)
+
+    def extract_amount(self, html: Optional[str], text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        First amount of at least 10 matched by a template pattern, HTML before text.
+        "match_part" ("html" or "text") and "match_span" tell where it was found.
+        """
+        for pattern in self.amount_patterns:
+            for part, body in (("html", html), ("text", text)):
+                if not body:
+                    continue
+                for match in pattern.regex.finditer(body):
+                    try:
+                        minor = parse_minor(body, *match.span(1), minimum=10 * MINOR_PER_MAJOR)
+                    except IndexError:
+                        continue
+                    if minor is not None:
+                        return {
+                            "amount": to_major(minor),
+                            "amount_minor": minor,
+                            "currency": self.currency,
+                            "confidence": pattern.confidence,
+                            "source": "template",
+                            "match_part": part,
+                            "match_span": match.span(),
+                        }
+        return None
+
+    def extract_sender_name(self, html: Optional[str], text: Optional[str]) -> Optional[str]:
+        """First sender name of at least 3 characters matched by a template pattern."""
+        for regex in self.name_patterns:
+            for body in (html, text):
+                if not body:
+                    continue
+                match = regex.search(body)
+                if match:
+                    name = match.group(1).strip().lower()
+                    if len(name) >= 3:
+                        return name
+        return None
+
+
+def sender_domain(from_email: str) -> str:
+    """Lowercased domain part of a From address ("Name <a@b.com>" works too)."""
+    address = (from_email or "").strip().lower().rstrip(">")
+    return address.rsplit("@", 1)[-1].strip()
+
+
+class TemplateRegistry:
+    """Templates indexed by sender domain, hot-reloaded from a directory."""
+
+    def __init__(self, directory: str, reload_interval: float = 5.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._by_domain: Dict[str, BankTemplate] = {}
+        self._signature: Tuple = ()
+        # Changes whenever a template file is added, removed or edited; part of result cache keys
+        self.version = ""
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload(force=True)
+
+    def _scan(self) -> Tuple:
+        try:
+            entries = [
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(TEMPLATE_EXTENSIONS)
+            ]
+        except FileNotFoundError:
+            return ()
+        return tuple(sorted(entries))
+
+    def _load_file(self, path: str) -> List[Dict[str, Any]]:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                data = json.load(f)
+            else:
+                try:
+                    import yaml
+                except ImportError:
+                    logger.warning(f"Skipping {path}: PyYAML is not installed")
+                    return []
+                data = yaml.safe_load(f)
+        return data if isinstance(data, list) else [data]
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload the directory if any template file changed. Returns True when reloaded."""
+        with self._lock:
+            signature = self._scan()
+            self._checked_at = time.monotonic()
+            if not force and signature == self._signature:
+                return False
+            by_domain = {}
+            for filename, _, _ in signature:
+                path = os.path.join(self.directory, filename)
+                try:
+                    specs = self._load_file(path)
+                except Exception as e:
+                    logger.error(f"Could not read template file {path}: {e}")
+                    continue
+                for spec in specs:
+                    try:
+                        template = BankTemplate(spec, source=filename)
+                    except Exception as e:
+                        logger.error(f"Invalid template in {path}: {e}")
+                        continue
+                    for domain in template.domains:
+                        by_domain[domain] = template
+            self._by_domain = by_domain
+            self._signature = signature
+            self.version = hashlib.blake2b(repr(signature).encode("utf-8"), digest_size=8).hexdigest()
+        logger.info(f"Loaded {len(by_domain)} bank template domain(s) from {self.directory}")
+        return True
+
+    def maybe_reload(self) -> None:
+        """Cheap per-request check; rescans the directory at most once per reload_interval."""
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+    def find(self, from_email: str) -> Optional[BankTemplate]:
+        """Template for the sender's domain or its closest parent domain (alerts.gtbank.com -> gtbank.com)."""
+        self.maybe_reload()
+        domain = sender_domain(from_email)
+        by_domain = self._by_domain
+        while domain:
+            template = by_domain.get(domain)
+            if template is not None:
+                return template
+            if "." not in domain:
+                break
+            domain = domain.split(".", 1)[1]
+        return None
+
+    def templates(self) -> List[Dict[str, Any]]:
+        """Summary of the loaded templates."""
+        seen = {}
+        for template in self._by_domain.values():
+            seen[id(template)] = {
+                "name": template.name,
+                "domains": template.domains,
+                "source": template.source,
+                "amount_patterns": len(template.amount_patterns),
+                "name_patterns": len(template.name_patterns),
+            }
+        return list(seen.values())
@@ -0,0 +1,454 @@
+"""
+Maildir watcher: extract new emails as they arrive into a local SQLite outbox.
+
+Usage (from the python-extractor directory):
+  python -m extractor.watch ~/Maildir /var/mail/alerts --outbox outbox.sqlite
+  python -m extractor.watch --outbox outbox.sqlite --drain --limit 500
+  python -m extractor.watch --outbox outbox.sqlite --ack 1234
+
+Each Maildir's new/ directory is watched with inotify (through ctypes, Linux
+only) or, where that is unavailable, polled every --poll-interval seconds.
+New messages are extracted in chunks by a process pool running the API's
+cascade (extractor.core, lean), each chunk's results are committed to the
+outbox in one transaction, and only then are the messages moved to cur/. A
+crash between the two re-extracts those messages on restart; the outbox keeps
+one row per (maildir, file), so they are not stored twice.
+
+A message whose extraction failed (no amount found, or an error) is not
+stored; it is moved to the Maildir's quarantine folder (--quarantine,
+".Quarantine" by default, a Maildir++ subfolder mail clients show), and moving
+it back to new/ retries it. A worker that dies (killed for memory, or
+crashed) breaks the pool and every chunk in flight: the pool is replaced and
+those chunks' messages are retried one at a time, with nothing else running,
+so a message that kills its worker MAX_ATTEMPTS times on its own is
+quarantined and the others go through.
+
+--drain prints the rows not consumed yet as JSONL (one per line, oldest first)
+so the Laravel side can pick up results in bulk; it changes nothing. Once the
+consumer has stored them it runs --ack with the last id it read, which marks
+the rows up to that id consumed. A consumer that dies in between gets the same
+rows from the next --drain instead of losing them.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import signal
+import sqlite3
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from extractor import core
+from extractor.mime import decode_message
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks: Maildir delivery renames tmp/X to new/X; some agents write new/ directly
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# Consumed outbox rows are deleted after this many seconds
+CONSUMED_RETENTION = 7 * 24 * 3600
+
+# Times a message may kill its worker while extracted on its own before it is quarantined
+MAX_ATTEMPTS = 2
+
+# (maildir, file name in new/)
+Message = Tuple[str, str]
+
+
+class InotifyWatcher:
+    """Wakes up when a file is delivered to any of the watched directories."""
+
+    def __init__(self, directories: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for directory in directories:
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MOVED_TO | IN_CLOSE_WRITE) < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds; True when something was delivered (events are discarded)."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollWatcher:
+    """Fallback without inotify: reports a possible delivery every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def wait(self, timeout: float) -> bool:
+        remaining = self.interval - (time.monotonic() - self.last)
+        if remaining > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(max(0.0, remaining))
+        self.last = time.monotonic()
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(directories: List[str], poll_interval: float, use_inotify: bool = True):
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            # No libc symbol (AttributeError), watch limit reached, unsupported filesystem...
+            logger.warning(f"inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollWatcher(poll_interval)
+
+
+def new_messages(maildirs: List[str], skip: Set[Message]) -> Iterator[Message]:
+    """Messages in each Maildir's new/, oldest first per Maildir, except those in `skip`."""
+    for maildir in maildirs:
+        try:
+            entries = [entry for entry in os.scandir(os.path.join(maildir, "new")) if entry.is_file()]
+        except FileNotFoundError:
+            continue
+        entries.sort(key=lambda entry: entry.name)
+        for entry in entries:
+            if not entry.name.startswith(".") and (maildir, entry.name) not in skip:
+                yield maildir, entry.name
+
+
+def process_message(message: Message) -> Dict[str, Any]:
+    """Extract one Maildir message into an outbox row (in a worker process)."""
+    maildir, name = message
+    path = os.path.join(maildir, "new", name)
+    row: Dict[str, Any] = {"maildir": maildir, "file": name, "message_id": None, "received_at": None}
+    try:
+        row["received_at"] = os.stat(path).st_mtime
+        with open(path, "rb") as f:
+            fields = decode_message(f.read())
+        row["message_id"] = fields["message_id"]
+        email = core.Email(
+            subject=fields["subject"],
+            from_email=fields["from_email"],
+            text_body=fields["text_body"],
+            html_body=fields["html_body"],
+            email_date=fields["email_date"],
+        )
+        row["result"] = {"from_email": fields["from_email"], "email_date": fields["email_date"], **core.extract(email, lean=True)}
+    except FileNotFoundError:
+        # Moved away by another reader (a mail client marking it seen) before we got to it
+        row["result"] = None
+    except Exception as e:
+        row["result"] = {"success": False, "data": None, "errors": [f"Message {name} failed: {e}"]}
+    row["extracted_at"] = time.time()
+    return row
+
+
+def process_chunk(messages: List[Message]) -> List[Dict[str, Any]]:
+    """Worker entry point."""
+    return [process_message(message) for message in messages]
+
+
+def move_to_cur(maildir: str, name: str) -> None:
+    """Mark a message as seen by the Maildir convention: new/NAME -> cur/NAME:2,"""
+    target = name if ":" in name else f"{name}:2,"
+    try:
+        os.rename(os.path.join(maildir, "new", name), os.path.join(maildir, "cur", target))
+    except FileNotFoundError:
+        pass
+
+
+def move_to_quarantine(maildir: str, name: str, folder: str) -> None:
+    """Move a message out of new/ into the new/ of a Maildir++ subfolder of its Maildir."""
+    quarantine = os.path.join(maildir, folder)
+    for subdirectory in ("tmp", "new", "cur"):
+        os.makedirs(os.path.join(quarantine, subdirectory), exist_ok=True)
+    try:
+        os.rename(os.path.join(maildir, "new", name), os.path.join(quarantine, "new", name))
+    except FileNotFoundError:
+        pass
+
+
+class Outbox:
+    """SQLite table of extraction results, appended by the watcher and drained by the consumer."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # A committed row is on disk before its message leaves new/
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " maildir TEXT NOT NULL,"
+            " file TEXT NOT NULL,"
+            " message_id TEXT,"
+            " result TEXT NOT NULL,"
+            " received_at REAL,"
+            " extracted_at REAL NOT NULL,"
+            " consumed_at REAL,"
+            " UNIQUE (maildir, file))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (consumed_at, id)")
+        self.db.commit()
+
+    def append(self, rows: List[Dict[str, Any]]) -> int:
+        """Store rows in one transaction; returns how many were new."""
+        with self.db:
+            cursor = self.db.executemany(
+                "INSERT OR IGNORE INTO outbox (maildir, file, message_id, result, received_at, extracted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        row["maildir"],
+                        row["file"],
+                        row["message_id"],
+                        json.dumps(row["result"], ensure_ascii=False),
+                        row["received_at"],
+                        row["extracted_at"],
+                    )
+                    for row in rows
+                ],
+            )
+        return cursor.rowcount
+
+    def drain(self, limit: int = 0) -> List[Dict[str, Any]]:
+        """Rows not consumed yet, oldest first; they stay unconsumed until ack()."""
+        rows = self.db.execute(
+            "SELECT id, maildir, file, message_id, result, received_at, extracted_at"
+            " FROM outbox WHERE consumed_at IS NULL ORDER BY id LIMIT ?",
+            (limit or -1,),
+        ).fetchall()
+        return [
+            {
+                "id": row_id,
+                "maildir": maildir,
+                "file": name,
+                "message_id": message_id,
+                "received_at": received_at,
+                "extracted_at": extracted_at,
+                **json.loads(result),
+            }
+            for row_id, maildir, name, message_id, result, received_at, extracted_at in rows
+        ]
+
+    def ack(self, last_id: int) -> int:
+        """Mark the rows up to `last_id` consumed (and delete old consumed rows); returns how many were marked."""
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "UPDATE outbox SET consumed_at = ? WHERE consumed_at IS NULL AND id <= ?", (now, last_id),
+            )
+            self.db.execute("DELETE FROM outbox WHERE consumed_at < ?", (now - CONSUMED_RETENTION,))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def watch(args: argparse.Namespace) -> int:
+    maildirs = [os.path.abspath(os.path.expanduser(path)) for path in args.maildirs]
+    for maildir in maildirs:
+        if not os.path.isdir(os.path.join(maildir, "new")) or not os.path.isdir(os.path.join(maildir, "cur")):
+            raise SystemExit(f"{maildir} is not a Maildir (no new/ and cur/)")
+
+    outbox = Outbox(args.outbox)
+    watcher = make_watcher([os.path.join(maildir, "new") for maildir in maildirs], args.poll_interval, not args.poll)
+    workers = args.workers or (os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    # Futures of a pool that broke fail together; only the first of them replaces it
+    generation = 0
+    # future -> (messages, pool generation, whether it was the only task in flight)
+    running: Dict[Future, Tuple[List[Message], int, bool]] = {}
+    in_flight: Set[Message] = set()
+    # Messages of chunks lost with a worker, retried one at a time on their own
+    suspects: deque = deque()
+    attempts: Counter = Counter()
+    # Messages found by the last scan of new/ and not submitted yet
+    backlog: deque = deque()
+    max_chunks = args.max_chunks or 2 * workers
+    # new/ is scanned at start, then again only after a delivery (or a poll interval)
+    dirty = True
+    last_scan = 0.0
+    stopping = False
+    done = failed = 0
+    started = last_report = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"Watching {len(maildirs)} Maildir(s) with {type(watcher).__name__}, {workers} workers")
+
+    def replace_pool(broken: int) -> None:
+        nonlocal pool, generation
+        if broken != generation:
+            return
+        logger.error("A worker process exited; replacing the pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        generation += 1
+
+    def submit(chunk: List[Message], alone: bool = False) -> None:
+        try:
+            future = pool.submit(process_chunk, chunk)
+        except BrokenProcessPool:
+            replace_pool(generation)
+            future = pool.submit(process_chunk, chunk)
+        running[future] = (chunk, generation, alone)
+        in_flight.update(chunk)
+
+    def quarantine(maildir: str, name: str, errors: List[str]) -> None:
+        nonlocal failed
+        logger.warning(f"Quarantined {os.path.join(maildir, 'new', name)}: {'; '.join(errors) or 'no result'}")
+        move_to_quarantine(maildir, name, args.quarantine)
+        attempts.pop((maildir, name), None)
+        failed += 1
+
+    def collect(future: Future) -> None:
+        nonlocal done
+        messages, submitted_in, alone = running.pop(future)
+        in_flight.difference_update(messages)
+        try:
+            results = future.result()
+        except BrokenProcessPool:
+            replace_pool(submitted_in)
+            if not alone:
+                # Any message of any chunk in flight may have killed the worker
+                suspects.extend(messages)
+                return
+            message = messages[0]
+            attempts[message] += 1
+            if attempts[message] >= MAX_ATTEMPTS:
+                quarantine(*message, [f"Worker exited {attempts[message]} times while extracting it"])
+            else:
+                suspects.appendleft(message)
+            return
+        except Exception as e:
+            logger.error(f"Chunk of {len(messages)} messages failed: {e}")
+            for message in messages:
+                quarantine(*message, [f"Extraction failed: {e}"])
+            return
+        rows = [row for row in results if row["result"] is not None and row["result"]["success"]]
+        outbox.append(rows)
+        for row in rows:
+            move_to_cur(row["maildir"], row["file"])
+        for row in results:
+            attempts.pop((row["maildir"], row["file"]), None)
+            if row["result"] is not None and not row["result"]["success"]:
+                quarantine(row["maildir"], row["file"], row["result"]["errors"])
+        done += len(rows)
+
+    try:
+        while not stopping or running:
+            if not stopping and suspects:
+                if not running:
+                    submit([suspects.popleft()], alone=True)
+            elif not stopping:
+                # Everything already waiting in new/ first, then whatever arrives. While a
+                # backlog is left, deliveries are picked up at most once per poll interval,
+                # so a large new/ is not listed and sorted again after every chunk.
+                if dirty and (not backlog or time.monotonic() - last_scan >= args.poll_interval):
+                    backlog = deque(new_messages(maildirs, in_flight))
+                    dirty = False
+                    last_scan = time.monotonic()
+                while backlog and len(running) < max_chunks:
+                    submit([backlog.popleft() for _ in range(min(args.chunk_size, len(backlog)))])
+            if running:
+                finished, _ = wait(list(running), timeout=args.poll_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+                if not stopping and watcher.wait(0):
+                    dirty = True
+            if args.once and not running and not suspects and not backlog:
+                break
+            if not running and not stopping and not suspects and not backlog and watcher.wait(args.poll_interval):
+                dirty = True
+            if time.monotonic() - last_report >= args.progress_interval and done:
+                elapsed = time.monotonic() - started
+                logger.info(f"{done} messages extracted in {elapsed:.0f}s, {failed} quarantined")
+                last_report = time.monotonic()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        watcher.close()
+        outbox.close()
+    logger.info(f"Stopped after {done} messages ({failed} quarantined)")
+    return 0
+
+
+def drain(args: argparse.Namespace) -> int:
+    outbox = Outbox(args.outbox)
+    try:
+        for row in outbox.drain(args.limit):
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        outbox.close()
+    return 0
+
+
+def ack(args: argparse.Namespace) -> int:
+    outbox = Outbox(args.outbox)
+    try:
+        logger.info(f"{outbox.ack(args.ack)} row(s) up to id {args.ack} marked consumed")
+    finally:
+        outbox.close()
+    return 0
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("maildirs", nargs="*", help="Maildir directories (each with new/ and cur/)")
+    parser.add_argument("--outbox", required=True, help="SQLite outbox file")
+    parser.add_argument("--drain", action="store_true", help="Print unconsumed results as JSONL (marks nothing consumed)")
+    parser.add_argument("--ack", type=int, metavar="LAST_ID", help="Mark results up to this id consumed, after --drain")
+    parser.add_argument("--limit", type=int, default=0, help="Most rows printed by --drain (default: all)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Messages per worker task")
+    parser.add_argument("--max-chunks", type=int, default=0, help="Most worker tasks in flight (default: 2 per worker)")
+    parser.add_argument("--quarantine", default=".Quarantine", help="Maildir++ folder for messages that failed (default: .Quarantine)")
+    parser.add_argument("--poll", action="store_true", help="Poll even where inotify is available")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between scans without inotify")
+    parser.add_argument("--once", action="store_true", help="Extract what is in new/ now, then exit")
+    parser.add_argument("--progress-interval", type=float, default=60.0, help="Seconds between throughput log lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.drain and args.ack is not None:
+        parser.error("--drain and --ack are separate steps: ack after the drained rows are stored")
+    if args.drain:
+        return drain(args)
+    if args.ack is not None:
+        return ack(args)
+    if not args.maildirs:
+        parser.error("at least one Maildir is required (or --drain / --ack)")
+    return watch(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -3,13 +3,33 @@ Payment Email Extraction Service (FastAPI)
 Extracts payment information from bank email notifications.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-import re
+from typing import Optional, List, Dict, Any, Callable, Tuple, Union
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Connection
+import asyncio
+import collections
+import functools
+import os
 import logging
-from bs4 import BeautifulSoup
+import multiprocessing
 import json
+import random
+import time
+import zlib
+
+from extractor.cache import CACHE_COALESCED, CACHE_HIT, CACHE_MISS, ResultCache, content_key, raw_key
+from extractor import core, fastjson
+from extractor.matching import PaymentIndex
+from extractor.mime import decode_headers, decode_message
+from extractor.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from extractor.profiling import SlowSpool, StepTimer
+from extractor.statement import transactions as statement_transactions
+from extractor.store import ResultStore
+from extractor.stream import SkimStats
 
 app = FastAPI(title="Payment Email Extractor", version="1.0.0")
 
@@ -17,49 +37,118 @@ app = FastAPI(title="Payment Email Extractor", version="1.0.0")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Known bank templates
-BANK_TEMPLATES = {
-    "gtbank.com": {
-        "name": "GTBank",
-        "amount_patterns": [
-            r'<td[^>]*>[\s]*(?:amount|sum|value|total|paid|payment)[\s:]*</td>\s*<td[^>]*>[\s]*(?:ngn|naira|₦)[\s&nbsp;]*([\d,]+\.?\d*)[\s]*</td>',
-            r'<td[^>]*>[\s]*(?:amount|sum|value|total|paid|payment)[\s:]+(?:ngn|naira|₦)[\s&nbsp;]*([\d,]+\.?\d*)[\s]*</td>',
-            r'(?:amount|sum|value|total|paid|payment)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        ],
-        "name_patterns": [
-            r'<td[^>]*>[\s]*(?:description|remarks)[\s:]*</td>\s*<td[^>]*>[\s]*from\s+([A-Z][A-Z\s]+?)\s+to',
-            r'from\s+([A-Z][A-Z\s]+?)\s+to',
-        ],
-    },
-    "accessbank.com": {
-        "name": "Access Bank",
-        "amount_patterns": [
-            r'(?:amount|sum)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        ],
-        "name_patterns": [
-            r'from\s+([A-Z][A-Z\s]+?)',
-        ],
-    },
-}
-
-# Currency codes
-CURRENCIES = {
-    "NGN": ["ngn", "naira", "₦", "nigeria naira"],
-    "USD": ["usd", "dollar", "$", "us dollar"],
-    "GBP": ["gbp", "pound", "£", "british pound"],
-    "EUR": ["eur", "euro", "€"],
-}
-
-# Word to number conversion (Nigerian format)
-WORD_TO_NUMBER = {
-    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
-    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
-    "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
-    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
-    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
-    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
-    "hundred": 100, "thousand": 1000, "million": 1000000, "billion": 1000000000,
-}
+# Batch extraction settings
+BATCH_WORKERS = int(os.getenv("EXTRACTOR_BATCH_WORKERS", "0")) or (os.cpu_count() or 1)
+BATCH_MAX_SIZE = int(os.getenv("EXTRACTOR_BATCH_MAX_SIZE", "5000"))
+BATCH_CHUNKS_PER_WORKER = 4
+
+# /extract runs in the same worker pool, at most BATCH_WORKERS at a time. Up to
+# EXTRACTOR_QUEUE_DEPTH more wait for a worker (each at most EXTRACTOR_QUEUE_TIMEOUT
+# seconds); beyond that requests are shed with 503 and Retry-After.
+QUEUE_DEPTH = int(os.getenv("EXTRACTOR_QUEUE_DEPTH", "64"))
+QUEUE_TIMEOUT = float(os.getenv("EXTRACTOR_QUEUE_TIMEOUT", "5"))
+RETRY_AFTER_SECONDS = int(os.getenv("EXTRACTOR_RETRY_AFTER", "1"))
+
+# /extract/transactions: rows a worker sends back per message while it parses a statement
+TRANSACTIONS_BATCH = int(os.getenv("EXTRACTOR_TRANSACTIONS_BATCH", "50"))
+
+# Largest raw message accepted by /extract/raw (after gunzip)
+RAW_MAX_BYTES = int(os.getenv("EXTRACTOR_RAW_MAX_BYTES", str(25 * 1024 * 1024)))
+
+# Result cache settings (EXTRACTOR_CACHE_SIZE=0 disables the cache)
+result_cache = ResultCache(
+    max_entries=int(os.getenv("EXTRACTOR_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("EXTRACTOR_CACHE_TTL", "3600")),
+    path=os.getenv("EXTRACTOR_CACHE_PATH") or None,
+    flush_interval=float(os.getenv("EXTRACTOR_CACHE_FLUSH_INTERVAL", "1")),
+)
+
+# This process records strategy outcomes (observe_outcome); extraction workers re-read the saved stats
+core.strategy_order.start_recording()
+
+# Opt-in profiling: requests with "X-Extractor-Profile: 1", or a sampled fraction, get step
+# timings in diagnostics["profile"] and run under cProfile. Extractions slower than
+# EXTRACTOR_SLOW_REQUEST_MS are captured (redacted) to EXTRACTOR_SPOOL_DIR.
+PROFILE_HEADER = "x-extractor-profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("EXTRACTOR_PROFILE_SAMPLE_RATE", "0"))
+slow_spool = SlowSpool(
+    os.getenv("EXTRACTOR_SPOOL_DIR") or None,
+    threshold_ms=float(os.getenv("EXTRACTOR_SLOW_REQUEST_MS", "1000")),
+    max_entries=int(os.getenv("EXTRACTOR_SPOOL_MAX_ENTRIES", "200")),
+)
+# Profiled requests skip the result cache: their diagnostics are specific to one run
+CACHE_BYPASS = "bypass"
+
+# Pending payments for /match, pushed over the API or re-read from EXTRACTOR_PAYMENTS_PATH (JSONL)
+pending_payments = PaymentIndex(
+    path=os.getenv("EXTRACTOR_PAYMENTS_PATH") or None,
+    reload_interval=float(os.getenv("EXTRACTOR_PAYMENTS_RELOAD_INTERVAL", "5")),
+)
+
+# Every successful extraction by email_id, for /search (EXTRACTOR_RESULT_STORE_PATH, SQLite)
+result_store = ResultStore(
+    os.getenv("EXTRACTOR_RESULT_STORE_PATH") or None,
+    flush_interval=float(os.getenv("EXTRACTOR_RESULT_STORE_FLUSH_INTERVAL", "1")),
+)
+
+# Prometheus metrics (per worker process)
+metrics = Registry()
+STRATEGY_DURATION = metrics.histogram(
+    "extractor_strategy_duration_seconds", "Time spent in each extraction strategy",
+    ["strategy"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STRATEGY_WINS = metrics.counter(
+    "extractor_strategy_wins_total", "Extractions won by each strategy", ["strategy"],
+)
+FAILURES = metrics.counter(
+    "extractor_failures_total", "Extractions where every strategy failed or an exception was raised", ["reason"],
+)
+TEMPLATE_MATCHES = metrics.counter(
+    "extractor_template_matches_total", "Bank template matches per sender domain (none = no template)", ["domain"],
+)
+BODY_SIZE = metrics.histogram(
+    "extractor_request_body_size_chars", "Size of the text and HTML bodies of each extracted email",
+    ["part"], buckets=(0, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+IN_FLIGHT = metrics.gauge(
+    "extractor_in_flight_requests", "Requests currently being handled", ["endpoint"],
+)
+CACHE_REQUESTS = metrics.counter(
+    "extractor_cache_requests_total", "Result cache lookups by status (hit, miss, coalesced)", ["status"],
+)
+QUEUE_WAITING = metrics.gauge(
+    "extractor_queue_waiting_requests", "Requests waiting for an extraction worker",
+)
+QUEUE_WAIT = metrics.histogram(
+    "extractor_queue_wait_seconds", "Time requests waited for an extraction worker",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SHED = metrics.counter(
+    "extractor_shed_requests_total", "Requests rejected with 503 (reason: queue_full, queue_timeout, worker_lost)", ["reason"],
+)
+ORDER_CHECKS = metrics.counter(
+    "extractor_order_checks_total", "Sampled requests comparing the learned strategy order with the fixed one", ["result"],
+)
+PENDING_PAYMENTS = metrics.gauge(
+    "extractor_pending_payments", "Pending payments in the /match index",
+)
+MATCH_CONSIDERED = metrics.histogram(
+    "extractor_match_considered_payments", "Pending payments scored per /match request",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000),
+)
+SEARCH_CONSIDERED = metrics.histogram(
+    "extractor_search_considered_results", "Stored results scored per /search request",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000),
+)
+STATEMENT_TRANSACTIONS = metrics.counter(
+    "extractor_statement_transactions_total", "Transactions streamed by /extract/transactions", ["source"],
+)
+PROFILED = metrics.counter(
+    "extractor_profiled_requests_total", "Requests run under the profiler (trigger: header, sample)", ["trigger"],
+)
+SLOW_REQUESTS = metrics.counter(
+    "extractor_slow_requests_total", "Extractions over EXTRACTOR_SLOW_REQUEST_MS (capture: profiled, rerun, skipped)", ["capture"],
+)
 
 
 class ExtractionRequest(BaseModel):
@@ -71,14 +160,21 @@ class ExtractionRequest(BaseModel):
     email_date: Optional[str] = None
 
 
+# Fields and defaults as in extractor.core.RESULT_DEFAULTS
 class ExtractionResult(BaseModel):
     amount: float = Field(..., description="Extracted amount")
+    amount_minor: Optional[int] = Field(None, description="Exact amount in minor units (kobo, cents)")
     currency: str = Field(default="NGN", description="Currency code")
     direction: str = Field(default="credit", description="credit or debit")
     confidence: float = Field(..., ge=0.0, le=1.0, description="Confidence score 0-1")
     source: str = Field(..., description="Extraction source: html_table, html_text, text_body, template, etc.")
     sender_name: Optional[str] = Field(None, description="Extracted sender name")
     account_number: Optional[str] = Field(None, description="Extracted account number")
+    payer_account_number: Optional[str] = Field(None, description="Payer account number from the description field")
+    description_field: Optional[str] = Field(None, description="Numeric description field (e.g. GTBank's 43 digits)")
+    extracted_date: Optional[str] = Field(None, description="Date packed in the description field (YYYY-MM-DD)")
+    value_date: Optional[str] = Field(None, description="Value date (YYYY-MM-DD when recognized)")
+    narration: Optional[str] = Field(None, description="Description / narration line")
 
 
 class ExtractionResponse(BaseModel):
@@ -88,293 +184,838 @@ class ExtractionResponse(BaseModel):
     diagnostics: Optional[Dict[str, Any]] = None
 
 
-def extract_from_html_table(html: str) -> Optional[Dict[str, Any]]:
-    """Extract amount from HTML table structures (most accurate)."""
-    if not html:
-        return None
+class PendingPayment(BaseModel):
+    id: Union[int, str] = Field(..., description="Payment id (or transaction_id)")
+    amount: float = Field(..., gt=0, description="Expected amount")
+    payer_name: Optional[str] = None
+    account_number: Optional[str] = None
+    created_at: Optional[str] = Field(None, description="ISO 8601; payments created after the email are skipped")
+    email_account_id: Optional[int] = None
+
+
+class SearchRequest(BaseModel):
+    amount: Optional[float] = Field(None, gt=0, description="Amount paid")
+    tolerance: float = Field(0.0, ge=0.0, le=1.0, description="Amount tolerance as a fraction (window at least ±1)")
+    since: Optional[str] = Field(None, description="Earliest email date (ISO 8601 or RFC 2822)")
+    until: Optional[str] = Field(None, description="Latest email date")
+    sender_name: Optional[str] = Field(None, description="Payer name, matched fuzzily")
+    sender_domain: Optional[str] = Field(None, description="Only emails from this domain")
+    account_number: Optional[str] = None
+    min_name_similarity: float = Field(0.0, ge=0.0, le=100.0, description="Lowest name_similarity kept when sender_name is given")
+    limit: int = Field(50, ge=1, le=1000)
+
+
+class MatchRequest(BaseModel):
+    amount: Optional[float] = Field(None, gt=0, allow_inf_nan=False, description="Extracted amount")
+    sender_name: Optional[str] = Field(None, description="Extracted sender name")
+    account_number: Optional[str] = None
+    email_date: Optional[str] = None
+    email_account_id: Optional[int] = None
+    tolerance: Optional[float] = Field(None, ge=0.0, le=1.0, description="Amount tolerance (default 0.03)")
+    limit: int = Field(10, ge=1, le=1000)
+
+
+def run_extraction(request: ExtractionRequest, outcome: Optional[Dict[str, Any]] = None) -> ExtractionResponse:
+    """
+    Run the extraction cascade for a single email.
     
-    soup = BeautifulSoup(html, 'html.parser')
+    Synchronous so it can be called from the request handler and from batch worker processes.
+    When `outcome` is given it is filled with what metrics need (strategy timings, winner,
+    template domain) so callers in another process can record them.
+    """
+    return ExtractionResponse(**core.extract(request, outcome))
+
+
+def run_extraction_lean(request: ExtractionRequest, outcome: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Like run_extraction, as a plain dict without diagnostics or pydantic models.
     
-    # Look for table cells containing amount
-    for td in soup.find_all('td'):
-        text = td.get_text(strip=True).lower()
-        
-        # Check if this cell indicates it contains an amount
-        if any(keyword in text for keyword in ['amount', 'sum', 'value', 'total', 'paid', 'payment']):
-            # Look for amount in this cell or next sibling
-            amount_text = text
-            
-            # Check current cell for amount
-            amount_match = re.search(r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)', text, re.IGNORECASE)
-            if amount_match:
-                try:
-                    amount = float(amount_match.group(1).replace(',', ''))
-                    if amount >= 10:
-                        return {
-                            "amount": amount,
-                            "currency": "NGN",
-                            "confidence": 0.95,
-                            "source": "html_table",
-                        }
-                except ValueError:
-                    pass
-            
-            # Check next sibling cell
-            next_td = td.find_next_sibling('td')
-            if next_td:
-                next_text = next_td.get_text(strip=True)
-                amount_match = re.search(r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)', next_text, re.IGNORECASE)
-                if amount_match:
-                    try:
-                        amount = float(amount_match.group(1).replace(',', ''))
-                        if amount >= 10:
-                            return {
-                                "amount": amount,
-                                "currency": "NGN",
-                                "confidence": 0.95,
-                                "source": "html_table",
-                            }
-                    except ValueError:
-                        pass
+    Only the error that ended the cascade is reported, not one per strategy.
+    """
+    return core.extract(request, outcome, lean=True)
+
+
+def observe_outcome(outcome: Dict[str, Any]) -> None:
+    """Record one extraction's outcome in the metrics registry."""
+    BODY_SIZE.observe(outcome["text_length"], part="text")
+    BODY_SIZE.observe(outcome["html_length"], part="html")
+    TEMPLATE_MATCHES.inc(domain=outcome["template"] or "none")
+    for name, seconds in outcome["strategy_seconds"].items():
+        STRATEGY_DURATION.observe(seconds, strategy=name)
+    if "queue_wait" in outcome:
+        QUEUE_WAIT.observe(outcome["queue_wait"])
+    if outcome.get("order_agreed") is not None:
+        ORDER_CHECKS.inc(result="agreed" if outcome["order_agreed"] else "disagreed")
+    core.strategy_order.record(outcome)
+    if outcome["winner"]:
+        STRATEGY_WINS.inc(strategy=outcome["winner"])
+    else:
+        if outcome["budget_exceeded"]:
+            FAILURES.inc(reason="budget")
+        else:
+            FAILURES.inc(reason="exception" if outcome["exception"] else "no_match")
+
+
+@app.post("/extract", response_model=ExtractionResponse)
+async def extract_payment_info(request: ExtractionRequest, http_request: Request, lean: bool = False):
+    """
+    Extract payment information from email content.
     
-    # Try finding any table cell with NGN/Naira amount
-    for td in soup.find_all('td'):
-        text = td.get_text(strip=True)
-        amount_match = re.search(r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)', text, re.IGNORECASE)
-        if amount_match:
-            try:
-                amount = float(amount_match.group(1).replace(',', ''))
-                if amount >= 10:
-                    return {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "confidence": 0.90,
-                        "source": "html_table",
-                    }
-            except ValueError:
-                pass
+    Returns structured payment data with confidence scoring. With ?lean=true
+    (or "Prefer: return=minimal") only success, data and errors are returned.
+    """
+    key = request_cache_key(request)
+    profile = should_profile(http_request)
+    if is_lean(http_request, lean):
+        response = await extract_cached(
+            "extract", LEAN_KEY_PREFIX + key, _extract_one, request.model_dump(), True, lean=True, profile=profile,
+        )
+        store_result(request, response)
+        return lean_response(response)
+    response = await extract_cached("extract", key, _extract_one, request.model_dump(), profile=profile)
+    store_result(request, response)
+    return response
+
+
+@app.post("/extract/raw", response_model=ExtractionResponse)
+async def extract_raw_message(request: Request, email_id: Optional[int] = None, lean: bool = False):
+    """
+    Extract payment information from a raw RFC 822 message.
     
-    return None
+    The body is the message exactly as fetched from the mailbox, optionally
+    gzip-compressed (Content-Encoding: gzip). MIME parts, transfer encodings
+    (quoted-printable, base64) and charsets are decoded here, in the worker.
+    The result is only stored for /search when an email_id is given.
+    """
+    raw = read_raw_body(await request.body(), request.headers.get("content-encoding", ""))
+    profile = should_profile(request)
+    if is_lean(request, lean):
+        response = await extract_cached(
+            "extract_raw", LEAN_KEY_PREFIX + raw_key(raw, rules_version()), _extract_raw, raw, email_id or 0, True, lean=True, profile=profile,
+        )
+        store_raw_result(raw, email_id, response)
+        return lean_response(response)
+    response = await extract_cached("extract_raw", raw_key(raw, rules_version()), _extract_raw, raw, email_id or 0, profile=profile)
+    store_raw_result(raw, email_id, response)
+    return response
 
 
-def extract_from_html_text(html: str) -> Optional[Dict[str, Any]]:
-    """Extract amount from HTML text (not table-based)."""
-    if not html:
-        return None
+def store_result(request: ExtractionRequest, response: Dict[str, Any]) -> None:
+    """Add a successful result to the result store (a no-op unless EXTRACTOR_RESULT_STORE_PATH is set)."""
+    result_store.add(request.email_id, request.from_email, request.email_date, response["data"])
+
+
+def store_raw_result(raw: bytes, email_id: Optional[int], response: Dict[str, Any]) -> None:
+    """
+    Add a /extract/raw result to the result store (the sender and date come from
+    the headers). Without an email_id there is nothing to key it by, so it is not stored.
+    """
+    if result_store.enabled and email_id is not None and response["data"]:
+        headers = decode_headers(raw)
+        result_store.add(email_id, headers["from_email"], headers["email_date"], response["data"])
+
+
+# Lean responses carry no diagnostics, so they are cached apart from full ones
+LEAN_KEY_PREFIX = "lean:"
+
+
+def is_lean(request: Request, lean: bool) -> bool:
+    """Lean mode was asked for with ?lean=true or a "Prefer: return=minimal" header."""
+    return lean or "return=minimal" in request.headers.get("prefer", "").replace(" ", "").lower()
+
+
+def should_profile(request: Request) -> bool:
+    """Profile this request: asked for with the X-Extractor-Profile header, or sampled."""
+    if request.headers.get(PROFILE_HEADER, "").strip().lower() in ("1", "true", "yes", "on"):
+        PROFILED.inc(trigger="header")
+        return True
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        PROFILED.inc(trigger="sample")
+        return True
+    return False
+
+
+def lean_response(response: Dict[str, Any]) -> Response:
+    """Serialize a lean response directly, skipping response_model validation."""
+    return Response(content=fastjson.dumps(response), media_type="application/json")
+
+
+def read_raw_body(body: bytes, content_encoding: str) -> bytes:
+    """Request body as message bytes, gunzipped when needed; 400/413 HTTPException when unusable."""
+    if not body.strip():
+        raise HTTPException(status_code=400, detail="Empty message")
+    if "gzip" in content_encoding.lower() or body[:2] == b"\x1f\x8b":
+        # Bounded so a small gzip bomb cannot expand without limit
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, RAW_MAX_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+        too_large = bool(decompressor.unconsumed_tail) or len(body) > RAW_MAX_BYTES
+    else:
+        too_large = len(body) > RAW_MAX_BYTES
+    if too_large:
+        raise HTTPException(status_code=413, detail=f"Message too large (max {RAW_MAX_BYTES} bytes)")
+    return body
+
+
+async def extract_cached(
+    endpoint: str,
+    key: str,
+    extract: Callable[..., Tuple[Dict[str, Any], Dict[str, Any]]],
+    *args,
+    lean: bool = False,
+    profile: bool = False,
+) -> Dict[str, Any]:
+    """
+    Cached (single-flight) response for one email, computed by extract(*args) in the worker pool.
     
-    patterns = [
-        r'(?:amount|sum|value|total|paid|payment|deposit|transfer|credit)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'([\d,]+\.?\d*)\s*(?:naira|ngn)',
-    ]
+    Cache status and queue wait are added to the diagnostics unless `lean` is set.
+    A `profile`d request is always computed, under the profiler, and not cached.
+    """
+    queue_wait = 0.0
+    # The key was made with this version; a worker that had not reloaded yet extracted with older rules
+    version = core.bank_templates.version
+    fresh = True
     
-    for pattern in patterns:
-        matches = re.finditer(pattern, html, re.IGNORECASE)
-        for match in matches:
-            try:
-                amount = float(match.group(1).replace(',', ''))
-                if amount >= 10:
-                    return {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "confidence": 0.85,
-                        "source": "html_text",
-                    }
-            except (ValueError, IndexError):
-                continue
+    async def compute() -> Dict[str, Any]:
+        nonlocal queue_wait, fresh
+        response, outcome = await extract_in_pool(functools.partial(extract, profile=True) if profile else extract, *args)
+        observe_outcome(outcome)
+        observe_slow(outcome, extract, args)
+        queue_wait = outcome["queue_wait"]
+        fresh = outcome.get("rules_version", version) == version
+        return response
     
-    return None
+    IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        if profile:
+            response, cache_status = await compute(), CACHE_BYPASS
+        else:
+            response, cache_status = await result_cache.get_or_compute(key, compute, lambda response: fresh and cacheable(response))
+    finally:
+        IN_FLIGHT.dec(endpoint=endpoint)
+    CACHE_REQUESTS.inc(status=cache_status)
+    if lean:
+        return response
+    response = with_cache_status(response, cache_status)
+    response["diagnostics"]["queue_wait_ms"] = round(queue_wait * 1000, 2)
+    return response
 
 
-def extract_from_text_body(text: str) -> Optional[Dict[str, Any]]:
-    """Extract amount from plain text body."""
-    if not text:
-        return None
+def rules_version() -> str:
+    """Version of the loaded bank templates, picking up edits first; results are cached per version."""
+    core.bank_templates.maybe_reload()
+    return core.bank_templates.version
+
+
+def request_cache_key(request: ExtractionRequest) -> str:
+    """Result cache key for a request's email content."""
+    return content_key(request.from_email, request.subject, request.text_body, request.html_body, rules_version())
+
+
+def cacheable(response: Dict[str, Any]) -> bool:
+    """
+    Whether a response may be cached: a success, or a cascade that found no
+    amount. Budget overruns and exceptions can pass on a retry, so they are not.
+    """
+    if response["success"]:
+        return True
+    errors = response.get("errors") or []
+    return bool(errors) and errors[-1] == core.NO_MATCH_ERROR
+
+
+def with_cache_status(response: Dict[str, Any], cache_status: str) -> Dict[str, Any]:
+    """Copy of a (possibly cached) response with the cache status in its diagnostics."""
+    diagnostics = dict(response.get("diagnostics") or {})
+    diagnostics["cache"] = cache_status
+    return {**response, "diagnostics": diagnostics}
+
+
+_batch_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    """Create the extraction worker pool (shared by /extract and /extract/batch) on first use."""
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+        logger.info(f"Started extraction pool with {BATCH_WORKERS} workers")
+    return _batch_pool
+
+
+def discard_batch_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool broken by a dead worker (an OOM kill, a crash) so the next request starts a new one."""
+    global _batch_pool
+    if _batch_pool is pool:
+        _batch_pool = None
+        logger.error("An extraction worker exited unexpectedly; restarting the pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_pool(fn: Callable[..., Any], *args) -> Any:
+    """
+    fn(*args) in the worker pool. When a worker dies the pool is replaced and
+    BrokenProcessPool is raised for the tasks it was running.
+    """
+    pool = get_batch_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        discard_batch_pool(pool)
+        raise
+
+
+WORKER_LOST_ERROR = "Extraction worker exited, retry later"
+
+
+_capture_running = False
+
+
+def observe_slow(outcome: Dict[str, Any], extract: Callable[..., Tuple[Dict[str, Any], Dict[str, Any]]], args: Tuple) -> None:
+    """
+    Count a slow extraction. One that was not profiled is run again under the
+    profiler in the background, at most one at a time, so it reaches the spool
+    without slowing the request down.
+    """
+    global _capture_running
+    if not slow_spool.is_slow(outcome["extract_seconds"]):
+        return
+    if outcome.get("profiled"):
+        SLOW_REQUESTS.inc(capture="profiled")
+        return
+    if _capture_running:
+        SLOW_REQUESTS.inc(capture="skipped")
+        return
+    SLOW_REQUESTS.inc(capture="rerun")
+    _capture_running = True
+
+    def done(future) -> None:
+        global _capture_running
+        _capture_running = False
+        if future.exception() is not None:
+            logger.error(f"Slow request capture failed: {future.exception()}")
+
+    asyncio.ensure_future(run_in_background_slot(functools.partial(extract, profile=True, capture=True), *args)).add_done_callback(done)
+
+
+def _extract_profiled(payload: Dict[str, Any], lean: bool, capture: bool, outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One extraction under cProfile with step timings (in diagnostics["profile"]
+    unless lean), written to the slow-request spool when over the threshold or
+    when `capture` is set.
+    """
+    import cProfile
+
+    request = ExtractionRequest.model_construct(**payload) if lean else ExtractionRequest(**payload)
+    timer = StepTimer()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        response = core.extract(request, outcome, lean=lean, timer=timer)
+    finally:
+        profiler.disable()
+    summary = timer.summary()
+    if not lean:
+        response = ExtractionResponse(**response).model_dump()
+    outcome["profiled"] = True
+    if slow_spool.enabled and (capture or summary["wall_ms"] >= slow_spool.threshold_ms):
+        slow_spool.write(payload, response, summary["wall_ms"] / 1000, summary, profiler)
+    return response
+
+
+def _extract_one(
+    payload: Dict[str, Any], lean: bool = False, profile: bool = False, capture: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    outcome: Dict[str, Any] = {}
+    if profile:
+        return _extract_profiled(payload, lean, capture, outcome), outcome
+    if lean:
+        # The payload was validated by the endpoint (or built by _extract_raw)
+        return run_extraction_lean(ExtractionRequest.model_construct(**payload), outcome), outcome
+    response = run_extraction(ExtractionRequest(**payload), outcome).model_dump()
+    return response, outcome
+
+
+def _extract_raw(
+    raw: bytes, email_id: int, lean: bool = False, profile: bool = False, capture: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    message = decode_message(raw)
+    payload = {
+        "email_id": email_id,
+        "subject": message["subject"],
+        "from_email": message["from_email"],
+        "text_body": message["text_body"],
+        "html_body": message["html_body"],
+        "email_date": message["email_date"],
+    }
+    response, outcome = _extract_one(payload, lean, profile, capture)
+    if not lean:
+        response["diagnostics"]["message_id"] = message["message_id"]
+    return response, outcome
+
+
+def _extract_queued(enqueued_at: float, extract: Callable[..., Tuple[Dict[str, Any], Dict[str, Any]]], *args) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Worker entry point for single extractions; the outcome also says how long the request waited for a worker."""
+    queue_wait = max(0.0, time.time() - enqueued_at)
+    started = time.perf_counter()
+    response, outcome = extract(*args)
+    outcome["queue_wait"] = queue_wait
+    outcome["extract_seconds"] = time.perf_counter() - started
+    return response, outcome
+
+
+class ExtractSlots:
+    """
+    BATCH_WORKERS slots for work in the pool. A freed slot goes to a waiting
+    request before waiting batch chunks and background work, so a large batch
+    shares the pool but does not queue single extractions behind it.
+    """
+
+    def __init__(self, size: int):
+        self.free = size
+        self.urgent: collections.deque = collections.deque()
+        self.background: collections.deque = collections.deque()
+
+    async def acquire(self, urgent: bool = True) -> None:
+        if self.free > 0 and not self.urgent and (urgent or not self.background):
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self.urgent if urgent else self.background
+        queue.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if waiter in queue:
+                    queue.remove(waiter)
+            else:
+                # Handed a slot just as the wait was given up
+                self.release()
+            raise
+
+    def release(self) -> None:
+        for queue in (self.urgent, self.background):
+            while queue:
+                waiter = queue.popleft()
+                # A waiter cancelled by its timeout may not have left the line yet
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.free += 1
+
+
+_extract_slots: Optional[ExtractSlots] = None
+_extract_waiting = 0
+
+
+def extract_slots() -> ExtractSlots:
+    global _extract_slots
+    if _extract_slots is None:
+        _extract_slots = ExtractSlots(BATCH_WORKERS)
+    return _extract_slots
+
+
+def _shed(reason: str, detail: str) -> HTTPException:
+    SHED.inc(reason=reason)
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+async def acquire_extract_slot() -> float:
+    """
+    Wait for one of the BATCH_WORKERS extraction slots; returns when the wait began.
+    
+    Raises a 503 HTTPException when QUEUE_DEPTH requests are already waiting,
+    or when no worker frees up within QUEUE_TIMEOUT seconds. The caller must
+    release_extract_slot() once its pool task is done.
+    """
+    global _extract_waiting
+    if _extract_waiting >= QUEUE_DEPTH:
+        raise _shed("queue_full", "Extraction queue is full, retry later")
+    
+    enqueued_at = time.time()
+    _extract_waiting += 1
+    QUEUE_WAITING.inc()
+    try:
+        await asyncio.wait_for(extract_slots().acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _shed("queue_timeout", f"No extraction worker free within {QUEUE_TIMEOUT:g}s, retry later")
+    finally:
+        _extract_waiting -= 1
+        QUEUE_WAITING.dec()
+    return enqueued_at
+
+
+def release_extract_slot() -> None:
+    extract_slots().release()
+
+
+async def run_in_background_slot(fn: Callable, *args) -> Any:
+    """
+    Run fn(*args) in the worker pool once a slot is free, after any waiting
+    requests. Batch chunks and profiling reruns go through here, so the pool
+    never runs more than BATCH_WORKERS tasks; they are never shed.
+    """
+    await extract_slots().acquire(urgent=False)
+    try:
+        return await run_in_pool(fn, *args)
+    finally:
+        release_extract_slot()
+
+
+async def extract_in_pool(extract: Callable[..., Tuple[Dict[str, Any], Dict[str, Any]]], *args) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Run extract(*args) (a module-level function returning (response, outcome))
+    in the worker pool, keeping the event loop free.
     
-    patterns = [
-        r'(?:amount|sum|value|total|paid|payment|deposit|transfer|credit)[\s:]+(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'(?:ngn|naira|₦)\s*([\d,]+\.?\d*)',
-        r'([\d,]+\.?\d*)\s*(?:naira|ngn|usd|dollar)',
+    Raises a 503 HTTPException when the request is shed (see
+    acquire_extract_slot), or when the worker running it dies (the pool is
+    then replaced).
+    """
+    enqueued_at = await acquire_extract_slot()
+    try:
+        return await run_in_pool(_extract_queued, enqueued_at, extract, *args)
+    except BrokenProcessPool:
+        raise _shed("worker_lost", WORKER_LOST_ERROR)
+    finally:
+        release_extract_slot()
+
+
+def _extract_chunk(payloads: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Worker entry point: extract a chunk of serialized requests, returning (response, outcome) pairs."""
+    return [_extract_one(payload) for payload in payloads]
+
+
+def _chunk_positions(count: int, chunk_count: int) -> List[List[int]]:
+    """Split positions 0..count-1 into contiguous chunks so each worker gets a few of them."""
+    size = max(1, -(-count // chunk_count))
+    return [
+        list(range(start, min(start + size, count)))
+        for start in range(0, count, size)
     ]
+
+
+@app.post("/extract/batch")
+async def extract_batch(requests: List[ExtractionRequest], stream: bool = False):
+    """
+    Extract payment information from many emails in one call.
     
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            try:
-                amount = float(match.group(1).replace(',', ''))
-                if amount >= 10:
-                    return {
-                        "amount": amount,
-                        "currency": "NGN",
-                        "confidence": 0.80,
-                        "source": "text_body",
-                    }
-            except (ValueError, IndexError):
-                continue
+    Cached results are answered directly; the remaining distinct emails are
+    spread over a pool of worker processes. Results are returned in request
+    order, or streamed as NDJSON lines (with their request index) as each chunk
+    finishes when stream=true.
+    """
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(requests)} requests (max {BATCH_MAX_SIZE})",
+        )
     
-    return None
-
-
-def extract_sender_name(html: str, text: str) -> Optional[str]:
-    """Extract sender name from email content."""
-    # Try HTML first
-    if html:
-        soup = BeautifulSoup(html, 'html.parser')
-        patterns = [
-            r'<td[^>]*>[\s]*(?:description|remarks)[\s:]*</td>\s*<td[^>]*>[\s]*from\s+([A-Z][A-Z\s]+?)\s+to',
-            r'from\s+([A-Z][A-Z\s]+?)\s+to',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, html, re.IGNORECASE)
-            if match:
-                name = match.group(1).strip().lower()
-                if len(name) >= 3:
-                    return name
+    keys = [request_cache_key(request) for request in requests]
+    version = core.bank_templates.version
+    results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+    # Index of the first request for each uncached key -> indexes of all its duplicates
+    pending: Dict[int, List[int]] = {}
+    first_index: Dict[str, int] = {}
+    for index, key in enumerate(keys):
+        cached = result_cache.lookup(key)
+        if cached is not None:
+            results[index] = with_cache_status(cached, CACHE_HIT)
+            store_result(requests[index], cached)
+        elif key in first_index:
+            pending[first_index[key]].append(index)
+        else:
+            first_index[key] = index
+            pending[index] = [index]
     
-    # Try text
-    if text:
-        match = re.search(r'from\s+([A-Z][A-Z\s]+?)\s+to', text, re.IGNORECASE)
-        if match:
-            name = match.group(1).strip().lower()
-            if len(name) >= 3:
-                return name
+    unique = list(pending)
+    chunks = [
+        [unique[i] for i in chunk]
+        for chunk in _chunk_positions(len(unique), BATCH_WORKERS * BATCH_CHUNKS_PER_WORKER)
+    ]
     
-    return None
-
-
-def detect_currency(text: str, html: str) -> str:
-    """Detect currency from email content."""
-    content = (text or "") + " " + (html or "")
-    content_lower = content.lower()
+    async def run_chunk(indexes: List[int]) -> List[int]:
+        payloads = [requests[i].model_dump() for i in indexes]
+        try:
+            chunk_results = await run_in_background_slot(_extract_chunk, payloads)
+        except BrokenProcessPool:
+            # Only this chunk's emails fail (uncached); the rest of the batch goes on in a new pool
+            SHED.inc(reason="worker_lost")
+            failed = {
+                "success": False,
+                "data": None,
+                "errors": [WORKER_LOST_ERROR],
+                "diagnostics": {"steps": [], "errors": [WORKER_LOST_ERROR]},
+            }
+            finished = []
+            for index in indexes:
+                for duplicate in pending[index]:
+                    CACHE_REQUESTS.inc(status=CACHE_MISS)
+                    results[duplicate] = with_cache_status(failed, CACHE_MISS)
+                    finished.append(duplicate)
+            return finished
+        finished = []
+        for index, (result, outcome) in zip(indexes, chunk_results):
+            observe_outcome(outcome)
+            if cacheable(result) and outcome.get("rules_version", version) == version:
+                result_cache.set(keys[index], result)
+            for duplicate in pending[index]:
+                status = CACHE_MISS if duplicate == index else CACHE_COALESCED
+                CACHE_REQUESTS.inc(status=status)
+                results[duplicate] = with_cache_status(result, status)
+                store_result(requests[duplicate], result)
+                finished.append(duplicate)
+        return finished
     
-    for currency, keywords in CURRENCIES.items():
-        if any(keyword in content_lower for keyword in keywords):
-            return currency
+    CACHE_REQUESTS.inc(len(requests) - sum(len(indexes) for indexes in pending.values()), status=CACHE_HIT)
+    IN_FLIGHT.inc(endpoint="extract_batch")
     
-    return "NGN"  # Default to Naira
+    if not stream:
+        try:
+            await asyncio.gather(*(run_chunk(indexes) for indexes in chunks))
+        finally:
+            IN_FLIGHT.dec(endpoint="extract_batch")
+        return results
+    
+    async def ndjson_lines():
+        try:
+            for index, result in enumerate(results):
+                if result is not None:
+                    yield json.dumps({"index": index, **result}) + "\n"
+            for finished in asyncio.as_completed([run_chunk(indexes) for indexes in chunks]):
+                for index in await finished:
+                    yield json.dumps({"index": index, **results[index]}) + "\n"
+        finally:
+            IN_FLIGHT.dec(endpoint="extract_batch")
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 
-@app.post("/extract", response_model=ExtractionResponse)
-async def extract_payment_info(request: ExtractionRequest):
+def _statement_rows(payload: Dict[str, Any], channel: Connection, batch_size: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """
-    Extract payment information from email content.
+    Worker entry point for /extract/transactions: sends the transactions of one
+    email over `channel` in lists of up to batch_size as they are parsed, then
+    None. Returns the count and whether the HTML was cut off.
     
-    Returns structured payment data with confidence scoring.
+    A full pipe blocks the send, so a slow client holds at most a pipe buffer of
+    rows; a client that went away closes the pipe and stops the parse.
     """
-    diagnostics = {
-        "steps": [],
-        "errors": [],
-        "text_length": len(request.text_body or ""),
-        "html_length": len(request.html_body or ""),
-    }
+    stats = SkimStats()
+    count = 0
+    batch: List[Dict[str, Any]] = []
+    try:
+        for transaction in statement_transactions(ExtractionRequest.model_construct(**payload), stats):
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                channel.send(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            channel.send(batch)
+            count += len(batch)
+        channel.send(None)
+    except BrokenPipeError:
+        pass
+    finally:
+        channel.close()
+    return {"transactions": count, "truncated": stats.truncated}, {}
+
+
+def _receive_rows(channel: Connection, work: Future) -> Optional[List[Dict[str, Any]]]:
+    """The next list of transactions from a statement worker (run in a thread); None once it is done."""
+    while not channel.poll(0.5):
+        # A worker that died sends nothing more; a finished one may still have a message in the pipe
+        if work.done() and not channel.poll(0):
+            return None
+    try:
+        return channel.recv()
+    except EOFError:
+        return None
+
+
+@app.post("/extract/transactions")
+async def extract_transactions(request: ExtractionRequest):
+    """
+    Every transaction of a statement or digest email, streamed as NDJSON.
     
+    One line per table row (or plain-text line) as the worker parses it:
+    index, amount, amount_minor, currency, direction, sender_name, narration,
+    date and source. An email without statement rows gives the cascade's
+    single result. The last line is {"done": true, "transactions": n,
+    "truncated": bool}; truncated means the HTML was cut off at
+    EXTRACTOR_STATEMENT_MAX_BYTES. A statement whose worker failed ends with
+    {"done": false, "transactions": n, "error": ...} instead. The statement is
+    read in the worker pool, queued and shed like /extract, and holds its slot
+    until the last row is sent. See extractor.statement.
+    """
+    enqueued_at = await acquire_extract_slot()
+    loop = asyncio.get_running_loop()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    pool = get_batch_pool()
     try:
-        # Check for bank template match
-        bank_template = None
-        for domain, template in BANK_TEMPLATES.items():
-            if domain in request.from_email.lower():
-                bank_template = template
-                diagnostics["steps"].append(f"Template found: {template['name']}")
-                break
-        
-        if not bank_template:
-            diagnostics["steps"].append("No matching bank template found")
-        
-        # Strategy 1: Try HTML table extraction (highest confidence)
-        if request.html_body:
-            diagnostics["steps"].append("Attempting HTML table extraction")
-            result = extract_from_html_table(request.html_body)
-            if result:
-                result["sender_name"] = extract_sender_name(request.html_body, request.text_body)
-                result["currency"] = detect_currency(request.text_body, request.html_body)
-                diagnostics["steps"].append(f"Extraction successful: {result['source']}")
-                return ExtractionResponse(
-                    success=True,
-                    data=ExtractionResult(**result),
-                    diagnostics=diagnostics,
-                )
-            else:
-                diagnostics["errors"].append("HTML table extraction failed")
-        
-        # Strategy 2: Try HTML text extraction
-        if request.html_body:
-            diagnostics["steps"].append("Attempting HTML text extraction")
-            result = extract_from_html_text(request.html_body)
-            if result:
-                result["sender_name"] = extract_sender_name(request.html_body, request.text_body)
-                result["currency"] = detect_currency(request.text_body, request.html_body)
-                diagnostics["steps"].append(f"Extraction successful: {result['source']}")
-                return ExtractionResponse(
-                    success=True,
-                    data=ExtractionResult(**result),
-                    diagnostics=diagnostics,
-                )
-            else:
-                diagnostics["errors"].append("HTML text extraction failed")
-        
-        # Strategy 3: Try text body extraction
-        if request.text_body:
-            diagnostics["steps"].append("Attempting text body extraction")
-            result = extract_from_text_body(request.text_body)
-            if result:
-                result["sender_name"] = extract_sender_name(request.html_body, request.text_body)
-                result["currency"] = detect_currency(request.text_body, request.html_body)
-                diagnostics["steps"].append(f"Extraction successful: {result['source']}")
-                return ExtractionResponse(
-                    success=True,
-                    data=ExtractionResult(**result),
-                    diagnostics=diagnostics,
-                )
+        work = pool.submit(_extract_queued, enqueued_at, _statement_rows, request.model_dump(), sender, TRANSACTIONS_BATCH)
+    except BaseException as e:
+        release_extract_slot()
+        receiver.close()
+        sender.close()
+        if isinstance(e, BrokenProcessPool):
+            discard_batch_pool(pool)
+            raise _shed("worker_lost", WORKER_LOST_ERROR)
+        raise
+    
+    def finished(_) -> None:
+        # The task was pickled (with its end of the pipe) long before it finished
+        sender.close()
+        loop.call_soon_threadsafe(release_extract_slot)
+    
+    work.add_done_callback(finished)
+    IN_FLIGHT.inc(endpoint="extract_transactions")
+    
+    async def ndjson_lines():
+        count = 0
+        reading = None
+        try:
+            while True:
+                reading = loop.run_in_executor(None, _receive_rows, receiver, work)
+                batch = await reading
+                if batch is None:
+                    break
+                for transaction in batch:
+                    STATEMENT_TRANSACTIONS.inc(source=transaction["source"])
+                    yield json.dumps(transaction) + "\n"
+                count += len(batch)
+            try:
+                result, outcome = await asyncio.wrap_future(work)
+            except BrokenProcessPool:
+                discard_batch_pool(pool)
+                yield json.dumps({"done": False, "transactions": count, "error": WORKER_LOST_ERROR}) + "\n"
+                return
+            except Exception as e:
+                logger.error(f"Statement extraction failed: {e}")
+                yield json.dumps({"done": False, "transactions": count, "error": f"Extraction exception: {e}"}) + "\n"
+                return
+            QUEUE_WAIT.observe(outcome["queue_wait"])
+            yield json.dumps({"done": True, "transactions": result["transactions"], "truncated": result["truncated"]}) + "\n"
+        finally:
+            IN_FLIGHT.dec(endpoint="extract_transactions")
+            # Closing our end makes the worker's next send fail, which stops the parse;
+            # a read still running in a thread closes it when it returns
+            if reading is not None and not reading.done():
+                reading.add_done_callback(lambda _: receiver.close())
             else:
-                diagnostics["errors"].append("Text body extraction failed")
-        
-        # Strategy 4: Convert HTML to text and try again
-        if request.html_body:
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(request.html_body, 'html.parser')
-            rendered_text = soup.get_text(separator=' ', strip=True)
-            
-            if rendered_text:
-                diagnostics["steps"].append("Attempting HTML-to-text conversion extraction")
-                result = extract_from_text_body(rendered_text)
-                if result:
-                    result["sender_name"] = extract_sender_name(request.html_body, request.text_body)
-                    result["currency"] = detect_currency(request.text_body, request.html_body)
-                    result["source"] = "html_rendered_text"
-                    result["confidence"] = 0.75  # Lower confidence for converted text
-                    diagnostics["steps"].append(f"Extraction successful: {result['source']}")
-                    return ExtractionResponse(
-                        success=True,
-                        data=ExtractionResult(**result),
-                        diagnostics=diagnostics,
-                    )
-                else:
-                    diagnostics["errors"].append("HTML-to-text extraction failed")
-        
-        # All strategies failed
-        diagnostics["errors"].append("All extraction strategies failed")
-        
-        return ExtractionResponse(
-            success=False,
-            errors=diagnostics["errors"],
-            diagnostics=diagnostics,
-        )
+                receiver.close()
     
-    except Exception as e:
-        logger.error(f"Extraction error: {str(e)}", exc_info=True)
-        diagnostics["errors"].append(f"Extraction exception: {str(e)}")
-        return ExtractionResponse(
-            success=False,
-            errors=diagnostics["errors"],
-            diagnostics=diagnostics,
-        )
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@app.on_event("shutdown")
+async def shutdown_batch_pool():
+    """Stop extraction worker processes, and save strategy stats, stored results and cached results, with the server."""
+    global _batch_pool
+    if _batch_pool is not None:
+        _batch_pool.shutdown(wait=False, cancel_futures=True)
+        _batch_pool = None
+    core.strategy_order.save(force=True)
+    result_store.close()
+    result_cache.close()
+
+
+@app.get("/templates")
+async def list_templates():
+    """Bank templates currently loaded."""
+    return {"directory": core.bank_templates.directory, "templates": core.bank_templates.templates()}
+
+
+@app.post("/templates/reload")
+async def reload_templates():
+    """Reload bank templates now instead of waiting for the next periodic check."""
+    core.bank_templates.reload(force=True)
+    return {"directory": core.bank_templates.directory, "templates": core.bank_templates.templates()}
+
+
+@app.get("/strategies")
+async def strategy_stats():
+    """Per-domain strategy stats and the cascade order learned from them."""
+    return core.strategy_order.summary(core.STRATEGY_NAMES)
+
+
+@app.put("/payments")
+async def replace_payments(payments: List[PendingPayment]):
+    """Replace the pending-payment snapshot."""
+    return pending_payments.replace(payment.model_dump() for payment in payments)
+
+
+@app.post("/payments")
+async def upsert_payments(payments: List[PendingPayment]):
+    """Add pending payments, or update them by id."""
+    return pending_payments.upsert(payment.model_dump() for payment in payments)
+
+
+@app.delete("/payments/{payment_id}")
+async def remove_payment(payment_id: str):
+    """Drop a matched or expired payment."""
+    if not pending_payments.remove([payment_id]):
+        raise HTTPException(status_code=404, detail="Payment not pending")
+    return {"removed": payment_id, "pending": len(pending_payments)}
+
+
+@app.post("/payments/reload")
+async def reload_payments():
+    """Re-read EXTRACTOR_PAYMENTS_PATH now instead of waiting for the next periodic check."""
+    if not pending_payments.path:
+        raise HTTPException(status_code=400, detail="EXTRACTOR_PAYMENTS_PATH is not set")
+    pending_payments.reload(force=True)
+    return {"path": pending_payments.path, "pending": len(pending_payments)}
+
+
+@app.post("/match")
+async def match_payment(request: MatchRequest):
+    """
+    Rank the pending payments an extracted email may belong to.
+    
+    Only payments within the amount tolerance (or, without an amount, with a
+    similar name) are scored; see extractor.matching for the scores.
+    """
+    if not request.amount and not request.sender_name:
+        raise HTTPException(status_code=400, detail="amount or sender_name is required")
+    # Scoring runs similar_text over every candidate; keep it off the event loop
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, functools.partial(pending_payments.match, **request.model_dump()))
+    MATCH_CONSIDERED.observe(result["considered"])
+    return result
+
+
+@app.post("/search")
+async def search_results(request: SearchRequest):
+    """
+    Stored extraction results a payment may correspond to, best first.
+    
+    An indexed range query on amount (or sender-name trigrams) and email date
+    over EXTRACTOR_RESULT_STORE_PATH instead of re-extracting stored emails;
+    see extractor.store for the scores.
+    """
+    if not result_store.enabled:
+        raise HTTPException(status_code=400, detail="EXTRACTOR_RESULT_STORE_PATH is not set")
+    if not request.amount and not request.sender_name:
+        raise HTTPException(status_code=400, detail="amount or sender_name is required")
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, functools.partial(result_store.search, **request.model_dump()))
+    SEARCH_CONSIDERED.observe(result["considered"])
+    return result
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics for this worker process."""
+    PENDING_PAYMENTS.set(len(pending_payments))
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "payment-email-extractor"}
+    return {"status": "healthy", "service": "payment-email-extractor", "cache": result_cache.stats()}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import extractor/, main and extract_simple from the project directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+import json
+
+from extractor.adaptive import MIN_RUNS, AdaptiveOrder
+
+DEFAULT = ("html_table", "html_text", "text_body")
+
+
+def outcome(domain="bank.example", hits=("text_body",)):
+    # html_table is slow and never hits; text_body is cheap and always does
+    return {
+        "domain": domain,
+        "strategy_seconds": {"html_table": 0.010, "html_text": 0.005, "text_body": 0.001},
+        "strategy_hits": list(hits),
+        "order_agreed": True,
+    }
+
+
+def recorder(path, **kwargs):
+    order = AdaptiveOrder(path=str(path), mode="on", sample_rate=0.0, **kwargs)
+    order.start_recording()
+    return order
+
+
+def test_modes_need_a_stats_path():
+    assert AdaptiveOrder(mode="on").mode == "off"
+    assert AdaptiveOrder(mode="shadow").mode == "off"
+
+
+def test_learns_cheapest_order_after_min_runs(tmp_path):
+    order = recorder(tmp_path / "stats.json")
+    # MIN_RUNS counts the runs of every strategy of the domain
+    for _ in range(MIN_RUNS // len(DEFAULT)):
+        order.record(outcome())
+    assert order.plan("bank.example", DEFAULT)[0] == DEFAULT
+    order.record(outcome())
+    assert order.plan("bank.example", DEFAULT)[0] == ("text_body", "html_text", "html_table")
+    assert order.plan("other.example", DEFAULT)[0] == DEFAULT
+
+
+def test_workers_read_the_learned_order_from_the_file(tmp_path):
+    path = tmp_path / "stats.json"
+    order = recorder(path)
+    for _ in range(MIN_RUNS):
+        order.record(outcome())
+    order.save(force=True)
+    worker = AdaptiveOrder(path=str(path), mode="on", sample_rate=0.0)
+    assert worker.plan("bank.example", DEFAULT)[0][0] == "text_body"
+
+
+def test_processes_sharing_the_file_add_their_counts(tmp_path):
+    path = tmp_path / "stats.json"
+    first, second = recorder(path), recorder(path)
+    for _ in range(3):
+        first.record(outcome())
+    second.record(outcome())
+    first.save(force=True)
+    second.save(force=True)
+    first.record(outcome())
+    first.save(force=True)
+    domains = json.loads(path.read_text())["domains"]
+    assert domains["bank.example"]["strategies"]["text_body"][:2] == [5, 5]
+    assert domains["bank.example"]["checks"] == 5
+
+
+def test_unreadable_file_is_replaced_on_save(tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text("{not json")
+    order = recorder(path)
+    order.record(outcome())
+    order.save(force=True)
+    assert json.loads(path.read_text())["domains"]["bank.example"]["checks"] == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from extractor import core
+from extractor.amounts import parse_minor, parse_minor_parts, to_major
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("5000", 500000),
+    ("5,000", 500000),
+    ("1,234,567.89", 123456789),
+    ("1000.5", 100050),
+    ("1000.", 100000),
+    ("0.07", 7),
+    ("5,000,", 500000),
+    (",5,000", 500000),
+])
+def test_parse_minor(text, minor):
+    assert parse_minor(text) == minor
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("1,000.504", 100050),
+    ("1,000.505", 100051),
+    ("1,000.509", 100051),
+    ("0.995", 100),
+])
+def test_parse_minor_rounds_half_up(text, minor):
+    assert parse_minor(text) == minor
+
+
+@pytest.mark.parametrize("text", ["1,2,,3", "12,34", "1,0000", "", ",", "1.2.3"])
+def test_parse_minor_rejects_malformed_numbers(text):
+    assert parse_minor(text) is None
+
+
+def test_parse_minor_reads_a_span_in_place():
+    text = "NGN 12,500.50 credited"
+    assert parse_minor(text, 4, 13) == 1250050
+    assert parse_minor(text, 0, 3) is None
+
+
+def test_minimum_is_checked_before_rounding():
+    assert parse_minor_parts("9.999") == (1000, 999)
+    assert parse_minor("9.999", minimum=1000) is None
+    assert parse_minor("10.005", minimum=1000) == 1001
+    assert parse_minor("10", minimum=1000) == 1000
+
+
+def test_parse_minor_is_exact_where_float_is_not():
+    # float("1.15") * 100 == 114.99999999999999
+    assert parse_minor("1.15") == 115
+    assert to_major(115) == 1.15
+    assert to_major(None) is None
+
+
+@pytest.mark.parametrize("body, minor", [
+    ("Credit Amount: NGN 9.999 from JOHN DOE to ACME", None),
+    ("Credit Amount: NGN 10.005 from JOHN DOE to ACME", 1001),
+])
+def test_cascade_minimum_uses_the_unrounded_amount(body, minor):
+    data = core.extract(core.Email(email_id=1, from_email="alerts@bank.example", text_body=body), lean=True)["data"]
+    assert (data["amount_minor"] if data else None) == minor
+
+
+def test_cascade_reports_minor_units():
+    email = core.Email(email_id=1, from_email="alerts@bank.example", text_body="Credit Amount: NGN 1,000.505 from JOHN DOE to ACME")
+    data = core.extract(email, lean=True)["data"]
+    assert (data["amount_minor"], data["amount"]) == (100051, 1000.51)
@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+
+import main
+from extractor import core
+from extractor.cache import CACHE_HIT, CACHE_MISS, ResultCache
+
+
+def response(success, error=None):
+    return {"success": success, "data": {"amount": 10.0} if success else None, "errors": [error] if error else []}
+
+
+def compute_returning(value, calls):
+    async def compute():
+        calls.append(1)
+        return value
+    return compute
+
+
+def test_get_or_compute_caches_successes():
+    cache = ResultCache()
+    calls = []
+    value = response(True)
+    assert asyncio.run(cache.get_or_compute("k", compute_returning(value, calls), main.cacheable)) == (value, CACHE_MISS)
+    assert asyncio.run(cache.get_or_compute("k", compute_returning(value, calls), main.cacheable)) == (value, CACHE_HIT)
+    assert len(calls) == 1
+
+
+def test_get_or_compute_caches_no_match():
+    cache = ResultCache()
+    asyncio.run(cache.get_or_compute("k", compute_returning(response(False, core.NO_MATCH_ERROR), []), main.cacheable))
+    assert cache.get("k") is not None
+
+
+def test_get_or_compute_does_not_cache_budget_or_exception_failures():
+    cache = ResultCache()
+    for key, error in (
+        ("budget", "Regex time budget exceeded (250 ms)"),
+        ("exception", "Extraction exception: boom"),
+    ):
+        calls = []
+        failed = response(False, error)
+        for _ in range(2):
+            value, status = asyncio.run(cache.get_or_compute(key, compute_returning(failed, calls), main.cacheable))
+            assert (value, status) == (failed, CACHE_MISS)
+        assert len(calls) == 2
+        assert cache.get(key) is None
+
+
+def test_set_is_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResultCache(path=path, flush_interval=3600)
+    cache.set("k", response(True))
+    assert cache.get("k") == response(True)
+    rows = sqlite3.connect(path).execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    assert rows == 0
+    assert cache.flush() == 1
+    cache.close()
+
+    reopened = ResultCache(path=path)
+    assert reopened.get("k") == response(True)
+    reopened.close()
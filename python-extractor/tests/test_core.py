@@ -0,0 +1,51 @@
+from extractor import core
+
+
+def email(html=None, text=None, from_email="alerts@gtbank.com"):
+    return core.Email(email_id=1, from_email=from_email, html_body=html, text_body=text)
+
+
+def test_html_table_amount_and_fields():
+    html = (
+        "<table><tr><td>Amount</td><td>NGN 12,500.50</td></tr>"
+        "<tr><td>Account Number</td><td>0123456789</td></tr>"
+        "<tr><td>Description</td><td>FROM ADA OBI TO ACME</td></tr></table>"
+    )
+    data = core.extract(email(html, from_email="alerts@bank.example"), lean=True)["data"]
+    assert (data["amount_minor"], data["source"]) == (1250050, "html_table")
+    assert data["sender_name"] == "ada obi"
+    assert data["account_number"] == "0123456789"
+
+
+def test_template_fields_come_from_the_matched_region():
+    alert = (
+        "<table><tr><td>Amount</td><td>NGN 5,000.00</td></tr>"
+        "<tr><td>Account Number</td><td>0123456789</td></tr></table>"
+    )
+    far = " " * (core.TEMPLATE_FIELD_WINDOW + 100)
+    html = "<p>Account Number: 9999999999</p>" + far + alert + far + "<p>Value Date: 01/02/2024</p>"
+    data = core.extract(email(html), lean=True)["data"]
+    assert data["source"] == "template"
+    assert data["account_number"] == "0123456789"
+    assert data["value_date"] is None
+
+
+def test_no_amount_fails_with_the_no_match_error():
+    response = core.extract(email(text="Your statement is ready."), lean=True)
+    assert response == {"success": False, "data": None, "errors": [core.NO_MATCH_ERROR]}
+
+
+def test_stream_backend_reads_tables_past_two_megabytes():
+    filler = "<tr><td>Reference</td><td>" + "X" * 100 + "</td></tr>"
+    rows = filler * (2 * 1024 * 1024 // len(filler) + 100)
+    html = (
+        f"<table>{rows}<tr><td>Amount</td><td>NGN 12,500.50</td></tr>"
+        "<tr><td>Description</td><td>FROM ADA OBI TO ACME</td></tr></table>"
+    )
+    assert len(html) > 2 * 1024 * 1024
+    results = [
+        core.extract(email(html, from_email="alerts@bank.example"), backend=backend, lean=True)["data"]
+        for backend in ("stream", "html.parser")
+    ]
+    assert results[0] == results[1]
+    assert (results[0]["amount_minor"], results[0]["source"], results[0]["sender_name"]) == (1250050, "html_table", "ada obi")
@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from extractor.matching import PaymentIndex
+
+
+def index():
+    payments = PaymentIndex()
+    payments.replace([
+        {"id": "a", "amount": 5000, "payer_name": "JOHN DOE", "created_at": "2024-01-01T10:00:00Z"},
+        {"id": "b", "amount": 5100, "payer_name": "MARY JANE", "created_at": "2024-01-01T11:00:00Z"},
+        {"id": "c", "amount": 90000, "payer_name": "JOHN DOE", "created_at": "2024-01-01T12:00:00Z"},
+    ])
+    return payments
+
+
+def test_match_ranks_by_name_and_amount():
+    result = index().match(amount=5000.0, sender_name="john doe")
+    assert [c["payment_id"] for c in result["candidates"]] == ["a", "b"]
+    assert result["considered"] == 2
+    assert result["candidates"][0]["amount_difference"] == 0.0
+
+
+def test_match_by_name_alone():
+    result = index().match(sender_name="john doe")
+    assert {c["payment_id"] for c in result["candidates"]} == {"a", "c"}
+
+
+def test_match_skips_payments_created_after_the_email():
+    result = index().match(amount=5000.0, email_date="2024-01-01T10:30:00Z")
+    assert [c["payment_id"] for c in result["candidates"]] == ["a"]
+
+
+@pytest.mark.parametrize("amount", [-5.0, float("nan"), float("inf")])
+def test_match_rejects_non_positive_amounts(amount):
+    with pytest.raises(ValueError):
+        index().match(amount=amount, sender_name="john")
+
+
+@pytest.mark.parametrize("amount", [-5.0, 0])
+def test_match_endpoint_rejects_non_positive_amounts(amount):
+    client = TestClient(main.app)
+    response = client.post("/match", json={"amount": amount, "sender_name": "john"})
+    assert response.status_code == 422
+
+
+def test_match_endpoint_requires_amount_or_name():
+    client = TestClient(main.app)
+    assert client.post("/match", json={}).status_code == 400
+
+
+def test_match_endpoint(monkeypatch):
+    monkeypatch.setattr(main, "pending_payments", index())
+    client = TestClient(main.app)
+    response = client.post("/match", json={"amount": 5000, "sender_name": "JOHN DOE"})
+    assert response.status_code == 200
+    assert response.json()["candidates"][0]["payment_id"] == "a"
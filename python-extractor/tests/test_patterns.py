@@ -0,0 +1,64 @@
+import re
+import time
+
+import pytest
+
+import extract_simple
+from benchmarks.corpus import build_corpus
+from extractor import core
+from extractor.patterns import REGEX_BUDGET_MS, REGEX_BUDGET_MS_PER_MB, RegexBudgetExceeded, budget_for, budget_paused, regex_budget
+
+
+def test_regex_budget_interrupts_backtracking():
+    catastrophic = re.compile(r'(a+)+$')
+    with pytest.raises(RegexBudgetExceeded):
+        with regex_budget(50):
+            catastrophic.match("a" * 40 + "b")
+
+
+def test_budget_paused_stops_the_clock():
+    with regex_budget(100):
+        with budget_paused():
+            time.sleep(0.2)
+    with pytest.raises(RegexBudgetExceeded):
+        with regex_budget(100):
+            with budget_paused():
+                time.sleep(0.05)
+            time.sleep(0.2)
+
+
+def test_budget_paused_outside_a_budget_is_a_no_op():
+    with budget_paused():
+        pass
+
+
+@pytest.mark.parametrize("entry", build_corpus(seed=1234, sizes_kb=[80, 256]), ids=lambda entry: f"{entry['kind']}-{entry['size_kb']}")
+def test_corpus_extracts_within_the_default_budget(entry):
+    if REGEX_BUDGET_MS != 250:
+        pytest.skip("EXTRACTOR_REGEX_BUDGET_MS is overridden")
+    for response in (core.extract(core.email_from_dict(entry["request"])), extract_simple.extract(entry["request"])):
+        errors = response["errors"]
+        if entry["kind"] == "no_amount":
+            assert errors[-1] == core.NO_MATCH_ERROR
+        else:
+            assert response["success"], errors
+
+
+def test_budget_grows_with_the_body():
+    assert budget_for(0) == REGEX_BUDGET_MS
+    assert budget_for(8 * 1024 * 1024) == REGEX_BUDGET_MS + 8 * REGEX_BUDGET_MS_PER_MB
+
+
+@pytest.mark.parametrize(
+    "entry",
+    build_corpus(seed=1234, sizes_kb=[4096, 8192], kinds=("newsletter", "no_amount", "access_table")),
+    ids=lambda entry: f"{entry['kind']}-{entry['size_kb']}",
+)
+def test_large_bodies_extract_within_the_default_budget(entry):
+    if REGEX_BUDGET_MS != 250 or REGEX_BUDGET_MS_PER_MB != 100:
+        pytest.skip("EXTRACTOR_REGEX_BUDGET_MS or EXTRACTOR_REGEX_BUDGET_MS_PER_MB is overridden")
+    response = core.extract(core.email_from_dict(entry["request"]), backend="stream", lean=True)
+    if entry["kind"] == "no_amount":
+        assert response["errors"] == [core.NO_MATCH_ERROR]
+    else:
+        assert response["success"], response["errors"]
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def _answer(value):
+    return {"value": value}, {}
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    # Slot waiters are futures of the event loop that first uses them
+    monkeypatch.setattr(main, "_extract_slots", None)
+    yield
+    if main._batch_pool is not None:
+        main._batch_pool.shutdown(wait=True)
+        main._batch_pool = None
+
+
+def test_dead_worker_sheds_the_request_and_replaces_the_pool(fresh_pool):
+    async def scenario():
+        assert (await main.extract_in_pool(_answer, 1))[0] == {"value": 1}
+        broken = main._batch_pool
+        with pytest.raises(HTTPException) as shed:
+            # A worker killed mid-task, as by the OOM killer
+            await main.extract_in_pool(os._exit, 1)
+        assert shed.value.status_code == 503
+        assert shed.value.headers["Retry-After"] == str(main.RETRY_AFTER_SECONDS)
+        assert main._batch_pool is None
+        assert (await main.extract_in_pool(_answer, 2))[0] == {"value": 2}
+        assert main._batch_pool is not broken
+
+    asyncio.run(scenario())
+
+
+def test_requests_get_freed_slots_before_batch_chunks():
+    async def scenario():
+        slots = main.ExtractSlots(1)
+        await slots.acquire()
+        order = []
+
+        async def take(name, urgent):
+            await slots.acquire(urgent=urgent)
+            order.append(name)
+            slots.release()
+
+        chunk = asyncio.ensure_future(take("chunk", False))
+        await asyncio.sleep(0)
+        request = asyncio.ensure_future(take("request", True))
+        await asyncio.sleep(0)
+        slots.release()
+        await asyncio.gather(chunk, request)
+        assert order == ["request", "chunk"]
+        assert slots.free == 1
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiter_gives_up_its_place():
+    async def scenario():
+        slots = main.ExtractSlots(1)
+        await slots.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(slots.acquire(), 0.01)
+        slots.release()
+        assert slots.free == 1 and not slots.urgent
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+from extractor.scanner import (
+    NAME_TIER_CELL, NAME_TIER_CODE, NAME_TIER_DESCRIPTION, NAME_TIER_FROM, TIER_LABELED, TIER_PREFIXED, TIER_SUFFIXED,
+    LITERAL_WINDOW, lowercased, scan, scan_body, scan_scope,
+)
+
+
+def test_best_amount_prefers_the_labeled_tier():
+    result = scan("Fee NGN 52.50. Amount: NGN 5,000.00 credited")
+    best = result.best_amount()
+    assert (best.tier, best.minor, best.currency) == (TIER_LABELED, 500000, "ngn")
+    assert result.best_amount(tiers=(TIER_PREFIXED,)).minor == 5250
+
+
+def test_best_amount_skips_amounts_under_the_minimum():
+    best = scan("NGN 4.00 charge, NGN 1,200 transfer").best_amount()
+    assert (best.tier, best.minor) == (TIER_PREFIXED, 120000)
+    assert scan("NGN 4.00").best_amount() is None
+    assert scan("NGN 9.999").best_amount() is None
+    assert scan("NGN 10.005").best_amount().minor == 1001
+
+
+def test_suffixed_currencies_are_filtered():
+    result = scan("You received 250 usd")
+    assert result.best_amount() is None
+    best = result.best_amount(suffix_currencies=("naira", "ngn", "usd", "dollar"))
+    assert (best.tier, best.minor, best.currency) == (TIER_SUFFIXED, 25000, "usd")
+
+
+def test_malformed_digits_are_not_amounts():
+    assert scan("NGN 1,2,,3").best_amount() is None
+    assert scan("NGN 1,2,,3 then NGN 700").best_amount().minor == 70000
+
+
+def test_digit_runs_longer_than_the_bounds_are_rejected():
+    assert scan("Amount: NGN " + "1" * 40).best_amount() is None
+    assert scan("NGN 5." + "0" * 40 + " then NGN 700").best_amount().minor == 70000
+    assert scan("1" * 40 + " naira").best_amount() is None
+    assert scan("Amount: NGN 5,000.00.").best_amount().minor == 500000
+
+
+def test_spans_point_into_the_original_body():
+    body = "İ Amount: NGN 5,000.00"
+    assert len(lowercased(body)) == len(body)
+    best = scan(body).best_amount()
+    assert body[best.start:best.end].lower().startswith("amount")
+
+
+def test_names_by_tier():
+    html = "<td>Description</td><td>FROM ADA OBI TO ACME</td>"
+    assert scan(html).first_name(NAME_TIER_CELL).name == "ada obi"
+    assert scan("Transfer from JOHN DOE to ACME").first_name(NAME_TIER_FROM).name == "john doe"
+    assert scan("Description: 000123-MARY JANE TRF FOR X").first_name(NAME_TIER_DESCRIPTION).name == "mary jane"
+    assert scan("Narration 000123-MARY JANE TRF FOR X").first_name(NAME_TIER_CODE).name == "mary jane"
+    assert scan("no names here").first_name(NAME_TIER_FROM) is None
+
+
+def test_candidates_past_the_first_literal_window_are_found():
+    body = "x" * (LITERAL_WINDOW * 5) + " Amount: NGN 7,000"
+    assert scan(body).best_amount().minor == 700000
+
+
+def test_amounts_lists_every_tier_in_position_order():
+    amounts = scan("NGN 100 then 200 naira then Amount: NGN 300").amounts
+    assert [a.start for a in amounts] == sorted(a.start for a in amounts)
+    assert {a.tier for a in amounts} == {TIER_LABELED, TIER_PREFIXED, TIER_SUFFIXED}
+
+
+def test_scan_body_is_shared_only_inside_a_scope():
+    body = "Amount: NGN 5,000"
+    assert scan_body(body) is not scan_body(body)
+    with scan_scope():
+        assert scan_body(body) is scan_body(body)
+    assert scan_body(body) is not scan_body(body)
@@ -0,0 +1,124 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from extractor import core
+from extractor.statement import cell_amount, header_roles, text_transactions, transactions
+
+
+def email(html=None, text=None):
+    return core.Email(email_id=1, from_email="alerts@bank.example", html_body=html, text_body=text)
+
+
+ALERT_TEXT = (
+    "Dear Customer,\n"
+    "Your account has been credited.\n"
+    "Amount: NGN 5,000.00\n"
+    "Fee: NGN 52.50\n"
+    "Description: TRF FROM JOHN DOE TO ACME\n"
+)
+
+DIGEST_TEXT = (
+    "Mini statement\n"
+    "01/03/2024 TRF FROM JOHN DOE NGN 5,000.00 CR\n"
+    "02/03/2024 POS PURCHASE SHOPRITE 2,500.50 DR\n"
+    "03/03/2024 Closing balance NGN 9,000.00\n"
+    "04/03/2024 SMS ALERT CHARGES NGN 52.50\n"
+)
+
+DIGEST_HTML = (
+    "<table><tr><th>Date</th><th>Description</th><th>Debit</th><th>Credit</th><th>Balance</th></tr>"
+    "<tr><td>01/03/2024</td><td>TRF FROM JOHN DOE TO ACME</td><td></td><td>5,000.00</td><td>9,000.00</td></tr>"
+    "<tr><td>02/03/2024</td><td>POS PURCHASE SHOPRITE</td><td>2,500.50</td><td></td><td>6,499.50</td></tr>"
+    "<tr><td>Total</td><td></td><td>2,500.50</td><td>5,000.00</td><td></td></tr></table>"
+)
+
+
+def test_single_text_alert_is_not_a_statement():
+    assert list(text_transactions(ALERT_TEXT)) == []
+    rows = list(transactions(email(text=ALERT_TEXT)))
+    assert len(rows) == 1
+    assert rows[0]["amount_minor"] == 500000
+    assert rows[0]["source"] != "statement_text"
+
+
+def test_dated_text_lines_are_a_statement():
+    rows = list(text_transactions(DIGEST_TEXT))
+    assert [(r["amount_minor"], r["direction"], r["date"]) for r in rows] == [
+        (500000, "credit", "2024-03-01"),
+        (250050, "debit", "2024-03-02"),
+        (5250, None, "2024-03-04"),
+    ]
+    assert rows[0]["narration"] == "TRF FROM JOHN DOE"
+    assert rows[0]["sender_name"] == "john doe"
+
+
+def test_one_dated_line_is_not_a_statement():
+    assert list(text_transactions("01/03/2024 TRF FROM JOHN DOE NGN 5,000.00 CR\n")) == []
+
+
+def test_text_header_line_confirms_the_statement():
+    text = "Description    Amount    Type\nTRF FROM JANE ROE    NGN 1,000.00    CR\n"
+    rows = list(text_transactions(text))
+    assert [(r["amount_minor"], r["direction"]) for r in rows] == [(100000, "credit")]
+
+
+def test_html_digest_rows_through_the_header():
+    rows = list(transactions(email(html=DIGEST_HTML)))
+    assert [(r["index"], r["amount_minor"], r["direction"], r["date"]) for r in rows] == [
+        (0, 500000, "credit", "2024-03-01"),
+        (1, 250050, "debit", "2024-03-02"),
+    ]
+    assert rows[0]["sender_name"] == "john doe"
+
+
+def test_html_key_value_alert_is_not_a_statement():
+    html = (
+        "<table><tr><td>Amount</td><td>NGN 5,000.00</td></tr>"
+        "<tr><td>Fee</td><td>NGN 52.50</td></tr></table>"
+    )
+    rows = list(transactions(email(html=html)))
+    assert [(r["amount_minor"], r["source"]) for r in rows] == [(500000, "html_table")]
+
+
+def test_headerless_rows_without_a_marker_have_no_direction():
+    html = (
+        "<table><tr><td>01/03</td><td>TRF FROM JOHN DOE</td><td>NGN 5,000.00</td></tr>"
+        "<tr><td>02/03</td><td>TRF FROM MARY JANE</td><td>NGN 7,000.00</td></tr></table>"
+    )
+    rows = list(transactions(email(html=html)))
+    assert [(r["amount_minor"], r["direction"]) for r in rows] == [(500000, None), (700000, None)]
+
+
+def test_header_roles_and_cell_amounts():
+    assert header_roles(["Date", "Narration", "Credit (NGN)"]) == {"date": 0, "narration": 1, "credit": 2}
+    assert header_roles(["Transaction Type", "Credit"]) is None
+    assert cell_amount("NGN 1,234.50 CR") == {"minor": 123450, "currency": "NGN", "direction": "credit"}
+    assert cell_amount("-2,000") == {"minor": 200000, "currency": None, "direction": "debit"}
+    assert cell_amount("TRF 2,000") is None
+
+
+def test_transactions_endpoint_reads_the_statement_in_the_pool():
+    client = TestClient(main.app)
+    response = client.post("/extract/transactions", json={"email_id": 1, "subject": "Statement", "from_email": "alerts@bank.example", "html_body": DIGEST_HTML})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("amount_minor") for line in lines[:-1]] == [500000, 250050]
+    assert lines[-1] == {"done": True, "transactions": 2, "truncated": False}
+
+
+def test_transactions_endpoint_is_shed_with_the_extraction_queue(monkeypatch):
+    monkeypatch.setattr(main, "_extract_waiting", main.QUEUE_DEPTH)
+    client = TestClient(main.app)
+    response = client.post("/extract/transactions", json={"email_id": 1, "subject": "Statement", "from_email": "alerts@bank.example", "text_body": DIGEST_TEXT})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(main.RETRY_AFTER_SECONDS)
+
+
+def test_transactions_endpoint_streams_rows_in_batches(monkeypatch):
+    monkeypatch.setattr(main, "TRANSACTIONS_BATCH", 1)
+    client = TestClient(main.app)
+    with client.stream("POST", "/extract/transactions", json={"email_id": 1, "subject": "Statement", "from_email": "alerts@bank.example", "text_body": DIGEST_TEXT}) as response:
+        lines = [json.loads(line) for line in response.iter_lines()]
+    assert [line.get("amount_minor") for line in lines[:-1]] == [500000, 250050, 5250]
+    assert lines[-1] == {"done": True, "transactions": 3, "truncated": False}
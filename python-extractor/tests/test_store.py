@@ -0,0 +1,71 @@
+import main
+from extractor.store import ResultStore
+
+
+def store(tmp_path):
+    results = ResultStore(str(tmp_path / "results.db"), flush_interval=60)
+    results.add(1, "alerts@gtbank.com", "2024-03-01T10:00:00Z", {"amount": 5000.0, "sender_name": "john doe", "source": "template"})
+    results.add(2, "alerts@gtbank.com", "2024-03-02T10:00:00Z", {"amount": 5100.0, "sender_name": "mary jane", "source": "html_table"})
+    results.add(3, "alerts@zenith.com", "2024-03-03T10:00:00Z", {"amount": 90000.0, "sender_name": "john doe", "account_number": "0123456789"})
+    results.add(4, "alerts@zenith.com", "2024-03-03T10:00:00Z", None)
+    return results
+
+
+def test_disabled_without_a_path():
+    results = ResultStore(None)
+    results.add(1, "a@b.c", None, {"amount": 10.0})
+    assert not results.enabled
+    assert len(results) == 0
+    assert results.search(amount=10.0) == {"results": [], "considered": 0}
+
+
+def test_failed_results_are_not_stored(tmp_path):
+    results = store(tmp_path)
+    assert len(results) == 3
+    results.close()
+
+
+def test_search_by_amount_within_tolerance(tmp_path):
+    results = store(tmp_path)
+    found = results.search(amount=5000.0, tolerance=0.03, sender_name="john doe")
+    assert [r["email_id"] for r in found["results"]] == [1, 2]
+    assert found["results"][0]["amount_difference"] == 0.0
+    assert results.search(amount=5000.0)["considered"] == 1
+    results.close()
+
+
+def test_search_by_name_date_and_domain(tmp_path):
+    results = store(tmp_path)
+    assert {r["email_id"] for r in results.search(sender_name="JOHN DOE")["results"]} == {1, 3}
+    assert [r["email_id"] for r in results.search(sender_name="john doe", since="2024-03-02")["results"]] == [3]
+    assert [r["email_id"] for r in results.search(sender_name="john doe", sender_domain="GTBank.com")["results"]] == [1]
+    results.close()
+
+
+def test_account_number_raises_the_score(tmp_path):
+    results = store(tmp_path)
+    found = results.search(sender_name="john doe", account_number="0123456789")["results"]
+    assert found[0]["email_id"] == 3 and found[0]["account_match"]
+    results.close()
+
+
+def test_results_survive_a_restart(tmp_path):
+    store(tmp_path).close()
+    reopened = ResultStore(str(tmp_path / "results.db"))
+    assert len(reopened) == 3
+    reopened.add(1, "alerts@gtbank.com", None, {"amount": 7000.0})
+    assert len(reopened) == 3
+    assert reopened.search(amount=7000.0)["results"][0]["email_id"] == 1
+    reopened.close()
+
+
+def test_raw_results_without_an_email_id_are_not_stored(tmp_path, monkeypatch):
+    results = ResultStore(str(tmp_path / "results.db"), flush_interval=60)
+    monkeypatch.setattr(main, "result_store", results)
+    raw = b"From: alerts@gtbank.com\r\nSubject: Alert\r\n\r\nAmount: NGN 5,000.00\r\n"
+    response = {"success": True, "data": {"amount": 5000.0}}
+    main.store_raw_result(raw, None, response)
+    assert len(results) == 0
+    main.store_raw_result(raw, 7, response)
+    assert len(results) == 1
+    results.close()
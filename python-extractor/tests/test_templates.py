@@ -0,0 +1,72 @@
+import os
+import re
+import time
+
+import pytest
+
+from extractor.cache import content_key, raw_key
+from extractor.templates import TemplateRegistry
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return TemplateRegistry(TEMPLATE_DIR)
+
+
+def test_find_uses_the_closest_parent_domain(registry):
+    assert registry.find("GTBank <alerts@alerts.gtbank.com>").name == "GTBank"
+    assert registry.find("noreply@accessbank.com").name == "Access Bank"
+    assert registry.find("someone@example.com") is None
+
+
+def test_gtbank_table_amount_and_name(registry):
+    template = registry.find("gens@gtbank.com")
+    html = (
+        "<table><tr><td>Amount</td><td>NGN 12,500.50</td></tr>"
+        "<tr><td>Description</td><td>FROM ADA OBI TO ACME</td></tr></table>"
+    )
+    hit = template.extract_amount(html, None)
+    assert hit["amount_minor"] == 1250050
+    assert hit["confidence"] == 0.95
+    assert template.extract_sender_name(html, None) == "ada obi"
+
+
+def test_amounts_below_ten_are_skipped(registry):
+    template = registry.find("alerts@accessbank.com")
+    assert template.extract_amount(None, "Amount: NGN 5.00 ... Sum: NGN 3,000")["amount_minor"] == 300000
+
+
+@pytest.mark.parametrize("filename", sorted(os.listdir(TEMPLATE_DIR)))
+def test_template_repeats_are_bounded(filename):
+    with open(os.path.join(TEMPLATE_DIR, filename), encoding="utf-8") as f:
+        text = f.read()
+    # An unbounded run of digits next to an optional fraction backtracks on long digit runs
+    assert not re.search(r'\[\\\\d,\][+*]', text)
+
+
+def test_long_digit_runs_are_not_truncated(registry):
+    template = registry.find("alerts@accessbank.com")
+    assert template.extract_amount(None, "Amount: NGN " + "9" * 40) is None
+    assert template.extract_amount(None, "Amount: NGN 12,000.50 credited")["amount_minor"] == 1200050
+
+
+def test_long_digit_runs_do_not_backtrack(registry):
+    template = registry.find("alerts@gtbank.com")
+    body = "<td>Amount</td><td>NGN " + "1," * 50000 + "x</td>"
+    started = time.perf_counter()
+    template.extract_amount(body, body)
+    assert time.perf_counter() - started < 1
+
+
+def test_cache_keys_change_when_a_template_is_edited(tmp_path):
+    path = tmp_path / "bank.json"
+    path.write_text('{"name": "Bank", "domains": ["bank.example"], "amount_patterns": ["amount\\\\s+([\\\\d,]{1,32})"]}')
+    registry = TemplateRegistry(str(tmp_path), reload_interval=0)
+    before = content_key("a@bank.example", "Alert", "Amount 5,000", None, registry.version)
+    path.write_text('{"name": "Bank", "domains": ["bank.example"], "amount_patterns": ["sum\\\\s+([\\\\d,]{1,32})"]}')
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1000))
+    registry.maybe_reload()
+    assert content_key("a@bank.example", "Alert", "Amount 5,000", None, registry.version) != before
+    assert raw_key(b"raw", registry.version) != raw_key(b"raw", "")
@@ -0,0 +1,82 @@
+import argparse
+import os
+import sqlite3
+
+import pytest
+
+from extractor import watch
+
+ALERT = b"From: alerts@bank.example\r\nSubject: Credit alert\r\n\r\nAmount: NGN 5,000.00 from JOHN DOE to ACME\r\n"
+NEWSLETTER = b"From: news@bank.example\r\nSubject: Our new app\r\n\r\nDownload the app today.\r\n"
+
+
+def maildir(tmp_path, messages):
+    root = tmp_path / "Maildir"
+    for subdirectory in ("tmp", "new", "cur"):
+        (root / subdirectory).mkdir(parents=True)
+    for name, raw in messages.items():
+        (root / "new" / name).write_bytes(raw)
+    return root
+
+
+def run_once(tmp_path, root, monkeypatch, chunk_size=16, max_chunks=0, poll_interval=0.05):
+    monkeypatch.setattr(watch.signal, "signal", lambda signum, handler: None)
+    args = argparse.Namespace(
+        maildirs=[str(root)], outbox=str(tmp_path / "outbox.sqlite"), workers=2, chunk_size=chunk_size,
+        max_chunks=max_chunks, poll=True, poll_interval=poll_interval, once=True, progress_interval=60.0,
+        quarantine=".Quarantine",
+    )
+    assert watch.watch(args) == 0
+    with sqlite3.connect(args.outbox) as db:
+        return [name for (name,) in db.execute("SELECT file FROM outbox ORDER BY id")]
+
+
+def dying_chunk(messages):
+    # A worker killed mid-task, as by the OOM killer, whenever it gets the poisoned message
+    if any(name.startswith("poison") for _, name in messages):
+        os._exit(1)
+    return [watch.process_message(message) for message in messages]
+
+
+def test_failed_extractions_are_quarantined_not_stored(tmp_path, monkeypatch):
+    root = maildir(tmp_path, {"1.alert": ALERT, "2.newsletter": NEWSLETTER})
+    assert run_once(tmp_path, root, monkeypatch) == ["1.alert"]
+    assert os.listdir(root / "cur") == ["1.alert:2,"]
+    assert os.listdir(root / ".Quarantine" / "new") == ["2.newsletter"]
+    assert os.listdir(root / "new") == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 16])
+def test_dead_worker_replaces_the_pool_and_quarantines_the_culprit(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(watch, "process_chunk", dying_chunk)
+    root = maildir(tmp_path, {"1.alert": ALERT, "2.alert": ALERT, "poison": ALERT})
+    assert sorted(run_once(tmp_path, root, monkeypatch, chunk_size)) == ["1.alert", "2.alert"]
+    assert os.listdir(root / ".Quarantine" / "new") == ["poison"]
+
+
+def test_new_is_scanned_once_not_after_every_chunk(tmp_path, monkeypatch):
+    scans = []
+    scan = watch.new_messages
+
+    def counted(maildirs, skip):
+        scans.append(len(skip))
+        return scan(maildirs, skip)
+
+    monkeypatch.setattr(watch, "new_messages", counted)
+    root = maildir(tmp_path, {f"{i:02d}.alert": ALERT for i in range(12)})
+    assert len(run_once(tmp_path, root, monkeypatch, chunk_size=1, max_chunks=2, poll_interval=60)) == 12
+    assert scans == [0]
+
+
+def test_drained_rows_stay_pending_until_acked(tmp_path):
+    outbox = watch.Outbox(str(tmp_path / "outbox.sqlite"))
+    outbox.append([
+        {"maildir": "/m", "file": name, "message_id": None, "result": {"success": True}, "received_at": None, "extracted_at": 0.0}
+        for name in ("a", "b", "c")
+    ])
+    first = outbox.drain(limit=2)
+    assert [row["file"] for row in first] == ["a", "b"]
+    assert [row["file"] for row in outbox.drain(limit=2)] == ["a", "b"]
+    assert outbox.ack(first[-1]["id"]) == 2
+    assert [row["file"] for row in outbox.drain()] == ["c"]
+    outbox.close()
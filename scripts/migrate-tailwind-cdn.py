@@ -1,16 +1,78 @@
 #!/usr/bin/env python3
-"""Replace Tailwind CDN with compiled CSS partial — safe placement before </head>."""
+"""Replace Tailwind CDN with compiled CSS partial — safe placement before </head>.
+
+Rule-driven: each rule set (tailwind, google-fonts, or sets loaded with
+--rules-file) is a list of regex rules behind byte needles. A file none of
+whose needles occur is never decoded or regex-scanned. A content-hash
+manifest skips files that are unchanged since the last run with the same
+rules, and files that do need work are migrated in a process pool.
+
+Usage:
+  python3 scripts/migrate-tailwind-cdn.py
+  python3 scripts/migrate-tailwind-cdn.py --dry-run --diff
+  python3 scripts/migrate-tailwind-cdn.py --rules tailwind,google-fonts --report
+  python3 scripts/migrate-tailwind-cdn.py --rules-file my_rules.py --rules jsdelivr
+"""
 from __future__ import annotations
 
+import argparse
+import difflib
+import hashlib
+import json
+import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-VIEWS = Path(__file__).resolve().parents[1] / "resources" / "views"
+ROOT = Path(__file__).resolve().parents[1]
+VIEWS = ROOT / "resources" / "views"
+MANIFEST = ROOT / "storage" / "framework" / "cache" / "view-asset-migration.json"
 INCLUDE = "    @include('partials.tailwind-assets')\n"
 
-# tailwind.config = { ... }; (multiline, nested braces)
+# Bump when the engine itself changes in a way that should re-process every file
+ENGINE_VERSION = 1
+# Below this many files to migrate, a process pool costs more than it saves
+POOL_MIN_FILES = 64
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One substitution; runs only when one of its needles occurs in the file (lowercased)."""
+
+    name: str
+    pattern: re.Pattern
+    replacement: str
+    needles: Tuple[bytes, ...]
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """
+    Rules applied in order to files containing one of `needles` (case-sensitive),
+    once every string in `requires` is present, then `finish` on the result.
+    """
+
+    name: str
+    needles: Tuple[bytes, ...]
+    rules: Tuple[Rule, ...]
+    requires: Tuple[str, ...] = ()
+    finish: Optional[Callable[[str], str]] = field(default=None, compare=False)
+
+    def fingerprint(self) -> str:
+        parts = [self.name, repr(self.needles), repr(self.requires), getattr(self.finish, "__name__", "")]
+        for rule in self.rules:
+            parts += [rule.name, rule.pattern.pattern, str(rule.pattern.flags), rule.replacement, repr(rule.needles)]
+        return "\x00".join(parts)
+
+
+# tailwind.config = { ... }; (multiline, nested braces). The body stops at the
+# first </script>, so a config without a closing brace cannot eat later scripts.
 CONFIG_RE = re.compile(
-    r"\n?\s*<script>\s*\n?\s*tailwind\.config\s*=\s*\{[\s\S]*?\}\s*\n?\s*</script>",
+    r"\n?\s*<script>\s*\n?\s*tailwind\.config\s*=\s*\{(?:[^<]|<(?!/script>))*?\}\s*\n?\s*</script>",
     re.IGNORECASE,
 )
 # inline one-liner config
@@ -33,49 +95,252 @@ FA_RE = re.compile(
 COMMENT_TAILWIND_RE = re.compile(
     r"\n?\s*<!--[^>]*[Tt]ailwind[^>]*-->\s*",
 )
+# Google Fonts links the partial already loads (Hanken Grotesk only, and the preconnects)
+GOOGLE_PRECONNECT_RE = re.compile(
+    r'\n?[ \t]*<link\s+rel="preconnect"\s+href="https://fonts\.(?:googleapis|gstatic)\.com"[^>]*>',
+    re.IGNORECASE,
+)
+GOOGLE_HANKEN_RE = re.compile(
+    r'\n?[ \t]*<link\s+href="https://fonts\.googleapis\.com/css2\?family=Hanken\+Grotesk:[^"&]*&(?:amp;)?display=swap"[^>]*>',
+    re.IGNORECASE,
+)
 
 
-def migrate(content: str) -> str:
-    if "cdn.tailwindcss.com" not in content and "partials.tailwind-assets" not in content:
-        return content
-
-    original = content
-    content = CDN_SCRIPT_RE.sub("\n", content)
-    content = CONFIG_RE.sub("", content)
-    content = CONFIG_INLINE_RE.sub("", content)
-    content = PRECONNECT_RE.sub("", content)
-    content = COMMENT_TAILWIND_RE.sub("\n", content)
-    content = FA_RE.sub("\n", content)
-
+def include_tailwind_assets(content: str) -> str:
     if "partials.tailwind-assets" not in content and "</head>" in content:
         content = content.replace("</head>", INCLUDE + "</head>", 1)
+    return content
+
+
+RULE_SETS: Dict[str, RuleSet] = {}
+
+
+def register(rule_set: RuleSet) -> None:
+    RULE_SETS[rule_set.name] = rule_set
+
+
+register(RuleSet(
+    name="tailwind",
+    needles=(b"cdn.tailwindcss.com", b"partials.tailwind-assets"),
+    rules=(
+        Rule("tailwind_cdn_script", CDN_SCRIPT_RE, "\n", (b"cdn.tailwindcss.com",)),
+        Rule("tailwind_config", CONFIG_RE, "", (b"tailwind.config",)),
+        Rule("tailwind_config_inline", CONFIG_INLINE_RE, "", (b"tailwind.config",)),
+        Rule("tailwind_preconnect", PRECONNECT_RE, "", (b"cdn.tailwindcss.com",)),
+        Rule("tailwind_comment", COMMENT_TAILWIND_RE, "\n", (b"tailwind",)),
+        Rule("font_awesome_cdn", FA_RE, "\n", (b"/ajax/libs/font-awesome/",)),
+    ),
+    finish=include_tailwind_assets,
+))
+register(RuleSet(
+    name="google-fonts",
+    needles=(b"fonts.googleapis.com", b"fonts.gstatic.com"),
+    requires=("partials.tailwind-assets",),
+    rules=(
+        Rule("google_fonts_preconnect", GOOGLE_PRECONNECT_RE, "", (b"rel=\"preconnect\"",)),
+        Rule("google_fonts_hanken", GOOGLE_HANKEN_RE, "", (b"family=hanken+grotesk",)),
+    ),
+))
+DEFAULT_RULE_SETS = ("tailwind",)
+
+
+def load_rules_file(path: str) -> None:
+    """Run a Python file that calls register(RuleSet(...)); Rule, RuleSet and re are in scope."""
+    source = Path(path).read_text(encoding="utf-8")
+    exec(compile(source, path, "exec"), {"Rule": Rule, "RuleSet": RuleSet, "register": register, "re": re})
+
+
+def select(names: Iterable[str]) -> List[RuleSet]:
+    unknown = [name for name in names if name not in RULE_SETS]
+    if unknown:
+        raise SystemExit(f"Unknown rule set(s): {', '.join(unknown)} (available: {', '.join(RULE_SETS)})")
+    return [RULE_SETS[name] for name in names]
+
+
+def fingerprint(rule_sets: List[RuleSet]) -> str:
+    digest = hashlib.sha256(str(ENGINE_VERSION).encode())
+    for rule_set in rule_sets:
+        digest.update(rule_set.fingerprint().encode("utf-8"))
+    return digest.hexdigest()
+
 
-    if content == original and "partials.tailwind-assets" in content:
-        return content
+# rule name -> [seconds, runs, files changed]
+Timings = Dict[str, List[float]]
+
+
+def _time(timings: Optional[Timings], name: str, started: float, changed: bool) -> None:
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0, 0])
+        entry[0] += time.perf_counter() - started
+        entry[1] += 1
+        entry[2] += changed
+
+
+def prefilter(data: bytes, rule_sets: List[RuleSet]) -> bool:
+    """True when any rule set's needle occurs in the raw bytes."""
+    return any(needle in data for rule_set in rule_sets for needle in rule_set.needles)
+
+
+def migrate(content: str, rule_sets: Optional[List[RuleSet]] = None, timings: Optional[Timings] = None) -> str:
+    rule_sets = select(DEFAULT_RULE_SETS) if rule_sets is None else rule_sets
+    lowered = content.encode("utf-8").lower()
+    for rule_set in rule_sets:
+        if not any(needle.decode() in content for needle in rule_set.needles):
+            continue
+        if not all(required in content for required in rule_set.requires):
+            continue
+        for rule in rule_set.rules:
+            if not any(needle in lowered for needle in rule.needles):
+                continue
+            started = time.perf_counter()
+            new = rule.pattern.sub(rule.replacement, content)
+            _time(timings, rule.name, started, new != content)
+            content = new
+        if rule_set.finish is not None:
+            started = time.perf_counter()
+            new = rule_set.finish(content)
+            _time(timings, f"{rule_set.name}:{rule_set.finish.__name__}", started, new != content)
+            content = new
     return content
 
 
-def main() -> None:
-    changed = 0
-    for path in sorted(VIEWS.rglob("*.blade.php")):
-        text = path.read_text(encoding="utf-8")
-        new = migrate(text)
-        if new != text:
-            path.write_text(new, encoding="utf-8")
-            changed += 1
-            print(path.relative_to(VIEWS.parents[1]))
+_worker_rule_sets: List[RuleSet] = []
+
+
+def _init_worker(rules_files: List[str], names: List[str]) -> None:
+    for path in rules_files:
+        load_rules_file(path)
+    _worker_rule_sets[:] = select(names)
+
 
+def migrate_file(path: str, dry_run: bool, want_diff: bool) -> Tuple[str, str, bool, str, Timings]:
+    """(path, sha256 of the migrated content, changed, unified diff, rule timings) for one file."""
+    timings: Timings = {}
+    data = Path(path).read_bytes()
+    if not prefilter(data, _worker_rule_sets):
+        return path, hashlib.sha256(data).hexdigest(), False, "", timings
+    text = data.decode("utf-8")
+    new = migrate(text, _worker_rule_sets, timings)
+    if new == text:
+        return path, hashlib.sha256(data).hexdigest(), False, "", timings
+    diff = ""
+    if want_diff:
+        diff = "".join(difflib.unified_diff(
+            text.splitlines(keepends=True), new.splitlines(keepends=True), fromfile=path, tofile=path,
+        ))
+    if not dry_run:
+        Path(path).write_text(new, encoding="utf-8")
+    return path, hashlib.sha256(new.encode("utf-8")).hexdigest(), True, diff, timings
+
+
+def view_files(views: Path) -> List[Path]:
+    files = sorted(views.rglob("*.blade.php"))
     # sample-payment-page.html if present
-    html = VIEWS / "sample-payment-page.html"
+    html = views / "sample-payment-page.html"
     if html.exists():
-        text = html.read_text(encoding="utf-8")
-        new = migrate(text)
-        if new != text:
-            html.write_text(new, encoding="utf-8")
+        files.append(html)
+    return files
+
+
+def load_manifest(path: Path, rules: str) -> Dict[str, Dict]:
+    """relative path -> {"mtime_ns", "size", "sha256"}, empty when missing or written for other rules."""
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("files", {}) if manifest.get("rules") == rules else {}
+
+
+def save_manifest(path: Path, rules: str, files: Dict[str, Dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(json.dumps({"rules": rules, "files": files}, sort_keys=True), encoding="utf-8")
+    os.replace(temporary, path)
+
+
+def pending_files(files: List[Path], views: Path, manifest: Dict[str, Dict]) -> Tuple[List[str], Dict[str, Dict]]:
+    """
+    Files to migrate, and manifest entries for the rest. A file whose size and
+    mtime match the manifest is skipped unread; one whose content hash matches
+    is skipped after a read (e.g. touched by git checkout).
+    """
+    todo = []
+    entries = {}
+    for path in files:
+        relative = str(path.relative_to(views))
+        stat = path.stat()
+        entry = manifest.get(relative)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            entries[relative] = entry
+            continue
+        if entry and hashlib.sha256(path.read_bytes()).hexdigest() == entry["sha256"]:
+            entries[relative] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": entry["sha256"]}
+            continue
+        todo.append(str(path))
+    return todo, entries
+
+
+def print_report(timings: Timings) -> None:
+    print(f"\n{'rule':<40} {'ms':>9} {'runs':>6} {'changed':>8}")
+    for name, (seconds, runs, changed) in sorted(timings.items(), key=lambda item: item[1][0], reverse=True):
+        print(f"{name:<40} {seconds * 1000:>9.2f} {runs:>6} {changed:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--views", type=Path, default=VIEWS, help="Views directory")
+    parser.add_argument("--rules", default=",".join(DEFAULT_RULE_SETS), help="Comma-separated rule sets, applied in order")
+    parser.add_argument("--rules-file", action="append", default=[], help="Python file registering more rule sets")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing files or the manifest")
+    parser.add_argument("--diff", action="store_true", help="Print a unified diff of every change")
+    parser.add_argument("--report", action="store_true", help="Print time spent per rule")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--manifest", type=Path, default=MANIFEST, help="Manifest of already migrated files")
+    parser.add_argument("--no-manifest", action="store_true", help="Process every file, ignoring the manifest")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for path in args.rules_file:
+        load_rules_file(path)
+    names = [name.strip() for name in args.rules.split(",") if name.strip()]
+    rule_sets = select(names)
+    rules = fingerprint(rule_sets)
+
+    views = args.views.resolve()
+    files = view_files(views)
+    manifest = {} if args.no_manifest else load_manifest(args.manifest, rules)
+    todo, entries = pending_files(files, views, manifest)
+
+    worker_args = (args.rules_file, names)
+    if args.jobs > 1 and len(todo) >= POOL_MIN_FILES:
+        with ProcessPoolExecutor(args.jobs, initializer=_init_worker, initargs=worker_args) as pool:
+            results = list(pool.map(migrate_file, todo, [args.dry_run] * len(todo), [args.diff] * len(todo), chunksize=16))
+    else:
+        _init_worker(*worker_args)
+        results = [migrate_file(path, args.dry_run, args.diff) for path in todo]
+
+    changed = 0
+    timings: Timings = {}
+    for path, sha256, file_changed, diff, file_timings in results:
+        if file_changed:
             changed += 1
-            print(html.relative_to(VIEWS.parents[1]))
+            print(Path(path).relative_to(views.parents[1]))
+            sys.stdout.write(diff)
+        stat = os.stat(path)
+        entries[str(Path(path).relative_to(views))] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256}
+        for name, (seconds, runs, rule_changed) in file_timings.items():
+            total = timings.setdefault(name, [0.0, 0, 0])
+            total[0] += seconds
+            total[1] += runs
+            total[2] += rule_changed
+
+    if not args.dry_run and not args.no_manifest:
+        save_manifest(args.manifest, rules, entries)
 
-    print(f"Updated {changed} file(s)")
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"{verb} {changed} file(s); {len(todo)} of {len(files)} read, {time.perf_counter() - started:.3f}s")
+    if args.report:
+        print_report(timings)
 
 
 if __name__ == "__main__":